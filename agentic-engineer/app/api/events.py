@@ -1,35 +1,248 @@
 import asyncio
-from typing import Any, AsyncIterator, Dict
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
 
 from sse_starlette.sse import EventSourceResponse
 
+from app.telemetry.metrics import metrics
+
+
+# Events after which a topic gets no more publications.
+CLOSING_EVENTS = frozenset({"task_finished", "index_job_finished"})
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+class _Topic:
+    __slots__ = ("events", "next_id", "waiters", "closed_at")
+
+    def __init__(self, size: int) -> None:
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self.next_id = 1
+        self.waiters: List[asyncio.Future] = []
+        self.closed_at: Optional[float] = None
+
+    def since(self, after: int) -> List[Dict[str, Any]]:
+        oldest = self.next_id - len(self.events)
+        return list(islice(self.events, max(0, after + 1 - oldest), None))
+
+    def wake(self) -> None:
+        for waiter in self.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self.waiters.clear()
+
 
 class EventBus:
-    def __init__(self) -> None:
-        self._queues: Dict[str, asyncio.Queue] = {}
+    """Per-topic pub/sub with bounded replay buffers.
+
+    Each topic keeps its last ``buffer_size`` events in a ring buffer with
+    increasing ids; every subscriber reads the buffer from its own cursor, so
+    any number of SSE clients see the full stream and a reconnecting client
+    resumes after its ``Last-Event-ID``. A closing event (``task_finished``)
+    ends the subscribers' streams; the topic is then kept ``retention_sec``
+    for late replays, at most ``max_closed`` closed topics are retained, and
+    older ones are collected. A topic that never closes (its publisher died)
+    is collected once nothing was published to it for ``idle_ttl_sec``. All
+    methods must run on the server loop.
+    """
+
+    def __init__(
+        self,
+        buffer_size: Optional[int] = None,
+        retention_sec: Optional[float] = None,
+        max_closed: Optional[int] = None,
+        idle_ttl_sec: Optional[float] = None,
+    ) -> None:
+        self.buffer_size = buffer_size or _env_int("EVENT_BUFFER_SIZE", 1000)
+        self.retention_sec = retention_sec if retention_sec is not None else _env_int("EVENT_RETENTION_SEC", 300)
+        self.max_closed = max_closed or _env_int("EVENT_MAX_CLOSED_TOPICS", 1000)
+        self.idle_ttl_sec = idle_ttl_sec if idle_ttl_sec is not None else _env_int("EVENT_IDLE_TTL_SEC", 3600)
+        self._topics: Dict[str, _Topic] = {}
+        self._closed: "OrderedDict[str, float]" = OrderedDict()
+        # Open topics by time of their last event, least recent first.
+        self._open: "OrderedDict[str, float]" = OrderedDict()
 
-    def get_queue(self, task_id: str) -> asyncio.Queue:
-        if task_id not in self._queues:
-            self._queues[task_id] = asyncio.Queue()
-        return self._queues[task_id]
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    def _topic(self, topic: str) -> _Topic:
+        state = self._topics.get(topic)
+        if state is None:
+            state = self._topics[topic] = _Topic(self.buffer_size)
+        return state
 
     async def publish(self, task_id: str, event_type: str, payload: Dict[str, Any]) -> None:
-        queue = self.get_queue(task_id)
-        await queue.put({"event": event_type, "data": payload})
+        self.publish_nowait(task_id, event_type, payload)
 
-    async def stream(self, task_id: str) -> AsyncIterator[Dict[str, Any]]:
-        queue = self.get_queue(task_id)
-        while True:
-            message = await queue.get()
-            yield message
+    def publish_nowait(self, task_id: str, event_type: str, payload: Dict[str, Any]) -> None:
+        state = self._topic(task_id)
+        if state.closed_at is not None:
+            # A topic id reused after it finished (e.g. a recovered task) starts a new stream.
+            self._closed.pop(task_id, None)
+            state.closed_at = None
+        state.events.append({"id": str(state.next_id), "event": event_type, "data": payload})
+        state.next_id += 1
+        now = time.monotonic()
+        if event_type in CLOSING_EVENTS:
+            state.closed_at = now
+            self._closed[task_id] = now
+            self._open.pop(task_id, None)
+        else:
+            self._open[task_id] = now
+            self._open.move_to_end(task_id)
+        state.wake()
+        self.collect()
+
+    def replay(self, task_id: str, last_event_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Buffered events after ``last_event_id`` (all buffered events when None)."""
+        state = self._topics.get(task_id)
+        if state is None:
+            return []
+        return state.since(_parse_event_id(last_event_id))
+
+    async def stream(self, task_id: str, last_event_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield events after ``last_event_id`` until the topic is closed or collected."""
+        after = _parse_event_id(last_event_id)
+        state = self._topic(task_id)
+        try:
+            while True:
+                pending = state.since(after)
+                if pending:
+                    missed = int(pending[0]["id"]) - after - 1
+                    if missed > 0 and after:
+                        metrics.incr("events.replay_gap", missed)
+                    for message in pending:
+                        yield message
+                    after = int(pending[-1]["id"])
+                    continue
+                if state.closed_at is not None or self._topics.get(task_id) is not state:
+                    return
+                waiter = asyncio.get_running_loop().create_future()
+                state.waiters.append(waiter)
+                try:
+                    # Without publications nothing else collects, so a quiet
+                    # wait checks whether this topic has gone idle.
+                    await asyncio.wait([waiter], timeout=self.idle_ttl_sec)
+                    if not waiter.done():
+                        self.collect()
+                finally:
+                    if waiter in state.waiters:
+                        state.waiters.remove(waiter)
+        finally:
+            # Don't keep topics that were only ever subscribed to (unknown ids).
+            if not state.events and not state.waiters and self._topics.get(task_id) is state:
+                del self._topics[task_id]
+
+    def collect(self, now: Optional[float] = None) -> int:
+        """Drop closed topics past their retention and idle open ones; returns how many were dropped."""
+        now = time.monotonic() if now is None else now
+        dropped = 0
+        while self._closed:
+            task_id, closed_at = next(iter(self._closed.items()))
+            if len(self._closed) <= self.max_closed and now - closed_at < self.retention_sec:
+                break
+            del self._closed[task_id]
+            self._drop(task_id)
+            dropped += 1
+        expired = 0
+        while self._open:
+            task_id, active_at = next(iter(self._open.items()))
+            if now - active_at < self.idle_ttl_sec:
+                break
+            del self._open[task_id]
+            self._drop(task_id)
+            expired += 1
+        if expired:
+            metrics.incr("events.topics_expired", expired)
+        dropped += expired
+        if dropped:
+            metrics.incr("events.topics_collected", dropped)
+        metrics.set("events.topics", len(self._topics))
+        return dropped
+
+    def _drop(self, task_id: str) -> None:
+        state = self._topics.pop(task_id, None)
+        if state is not None:
+            # Subscribers see the topic is gone and end their streams.
+            state.wake()
+
+
+def _parse_event_id(value: Optional[str]) -> int:
+    try:
+        return max(0, int(value)) if value else 0
+    except ValueError:
+        return 0
 
 
 bus = EventBus()
 
 
-def sse_events(task_id: str) -> EventSourceResponse:
+class LoopEmitter:
+    """Hands events from worker threads to the bus on the server's event loop.
+
+    ``emit`` only appends to a deque and, when no flush is pending, schedules
+    one with ``loop.call_soon_threadsafe``; the flush drains everything queued
+    by then in a single callback. A burst of events therefore costs one loop
+    wakeup, and the caller never blocks on the loop. Events emitted before
+    ``bind`` or after the loop has closed are dropped and counted.
+    """
+
+    def __init__(self, target: EventBus) -> None:
+        self.target = target
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Deque[Tuple[str, str, Dict[str, Any]]] = deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def emit(self, topic: str, event_type: str, payload: Dict[str, Any]) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            metrics.incr("events.dropped")
+            return
+        self._pending.append((topic, event_type, payload))
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        try:
+            loop.call_soon_threadsafe(self._flush)
+        except RuntimeError:
+            # The loop closed between the check above and scheduling.
+            with self._lock:
+                self._scheduled = False
+            metrics.incr("events.dropped", len(self._pending))
+            self._pending.clear()
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._scheduled = False
+        started = time.perf_counter()
+        count = 0
+        while self._pending:
+            topic, event_type, payload = self._pending.popleft()
+            self.target.publish_nowait(topic, event_type, payload)
+            count += 1
+        metrics.incr("events.emitted", count)
+        metrics.observe("events.batch_size", count)
+        metrics.observe("events.flush_ms", (time.perf_counter() - started) * 1000)
+
+
+emitter = LoopEmitter(bus)
+
+
+def sse_events(task_id: str, last_event_id: Optional[str] = None) -> EventSourceResponse:
     async def event_generator() -> AsyncIterator[Dict[str, Any]]:
-        async for message in bus.stream(task_id):
+        async for message in bus.stream(task_id, last_event_id):
             yield message
 
     return EventSourceResponse(event_generator())
@@ -1,7 +1,14 @@
-from fastapi import APIRouter
+from typing import Optional
 
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.api.events import emitter, sse_events
 from app.core.schemas import IndexQuery, IndexRebuild
-from app.tools.rag_tools import rag_query, rag_rebuild
+from app.rag.jobs import index_jobs
+from app.rag.namespaces import resolve_namespace
+from app.rag.retriever import ann_recall
+from app.tools.rag_tools import rag_fetch, rag_query, rag_rebuild, rag_stats
 
 router = APIRouter()
 
@@ -9,9 +16,78 @@ router = APIRouter()
 @router.post("/index/rebuild")
 async def rebuild_index(payload: IndexRebuild):
     root = payload.path or "/workspace"
-    return rag_rebuild(root, payload.include_glob, payload.exclude_glob)
+    try:
+        namespace = resolve_namespace(payload.namespace, payload.workspace)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if not payload.background:
+        return await run_in_threadpool(
+            rag_rebuild, root, payload.include_glob, payload.exclude_glob, payload.incremental, namespace
+        )
+    job = index_jobs.submit(
+        root,
+        payload.include_glob,
+        payload.exclude_glob,
+        incremental=payload.incremental,
+        publish=emitter.emit,
+        namespace=namespace,
+    )
+    return job.to_dict()
+
+
+@router.get("/index/jobs/{job_id}")
+async def get_index_job(job_id: str):
+    job = index_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Index job not found")
+    return job.to_dict()
+
+
+@router.delete("/index/jobs/{job_id}")
+async def cancel_index_job(job_id: str):
+    job = index_jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Index job not found")
+    return job.to_dict()
+
+
+@router.get("/index/jobs/{job_id}/events")
+async def index_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    return sse_events(job_id, last_event_id)
 
 
 @router.post("/index/query")
-async def query_index(payload: IndexQuery):
-    return rag_query(payload.query, payload.top_k)
+def query_index(payload: IndexQuery):
+    try:
+        namespace = resolve_namespace(payload.namespace, payload.workspace)
+        return rag_query(
+            payload.query, payload.top_k, payload.nprobe, payload.mode, namespace, payload.cursor, payload.snippet_lines
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get("/index/chunks/{chunk_id}")
+def fetch_index_chunk(chunk_id: str, namespace: Optional[str] = None, workspace: Optional[str] = None):
+    try:
+        return rag_fetch(chunk_id, resolve_namespace(namespace, workspace))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+@router.get("/index/stats")
+async def index_stats():
+    return rag_stats()
+
+
+@router.get("/index/ann/recall")
+def index_ann_recall(
+    top_k: int = 10, samples: int = 100, namespace: Optional[str] = None, workspace: Optional[str] = None
+):
+    try:
+        namespace = resolve_namespace(namespace, workspace)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return ann_recall(top_k=top_k, samples=samples, namespace=namespace)
@@ -1,19 +1,19 @@
-import asyncio
-import threading
-from typing import Dict
+from functools import partial
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 
-from app.api.events import bus, sse_events
-from app.core.orchestrator import run_task
+from app.api.events import emitter, sse_events
+from app.core.scheduler import TaskScheduler
 from app.core.schemas import ArtifactInfo, TaskCreate, TaskResponse, TaskStatus
 from app.storage import models
+from app.storage.db import WriteBehindTimeout
 
 router = APIRouter()
 
 
-def _emit_sync(task_id: str, event_type: str, payload: Dict) -> None:
-    asyncio.run(bus.publish(task_id, event_type, payload))
+scheduler = TaskScheduler(emitter=lambda task_id: partial(emitter.emit, task_id))
 
 
 @router.post("/tasks", response_model=TaskResponse)
@@ -24,13 +24,36 @@ async def create_task(payload: TaskCreate) -> TaskResponse:
         workspace_path=payload.workspace_path,
         max_iters=payload.max_iters,
         timeout_sec=payload.timeout_sec,
+        priority=payload.priority,
+        submitter=payload.submitter,
+        fast_verify=payload.fast_verify,
+        speculative=payload.speculative,
     )
+    scheduler.notify()
+    return TaskResponse(id=task_id, status="queued")
 
-    thread = threading.Thread(target=run_task, args=(task_id, lambda et, pl: _emit_sync(task_id, et, pl)))
-    thread.daemon = True
-    thread.start()
 
-    return TaskResponse(id=task_id, status="queued")
+def _split(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+@router.get("/tasks")
+def list_tasks(
+    status: Optional[str] = None,
+    submitter: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    fields: Optional[str] = None,
+) -> Dict:
+    try:
+        return models.list_tasks(status, submitter, cursor, limit, _split(fields) if fields else None)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get("/scheduler/stats")
+async def scheduler_stats() -> Dict:
+    return await run_in_threadpool(scheduler.stats)
 
 
 @router.get("/tasks/{task_id}", response_model=TaskStatus)
@@ -46,11 +69,56 @@ async def get_task(task_id: str) -> TaskStatus:
     )
 
 
+@router.get("/tasks/{task_id}/runs")
+def get_runs(
+    task_id: str,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> Dict:
+    """Runs of a task; ``include=tool_calls[,input_json,output_json]`` embeds their tool calls.
+
+    ``fields`` selects the run columns (``summary`` is left out by default).
+    """
+    include_fields = set(_split(include))
+    embed = "tool_calls" in include_fields
+    include_fields.discard("tool_calls")
+    if not models.get_task(task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
+    try:
+        page = models.list_runs(task_id, cursor, limit, _split(fields) if fields else None)
+        if embed:
+            calls = models.tool_calls_for_runs([run["id"] for run in page["items"]], include_fields)
+            for run in page["items"]:
+                run["tool_calls"] = calls[run["id"]]
+        elif include_fields:
+            raise ValueError("input_json/output_json need include=tool_calls")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except WriteBehindTimeout as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    return page
+
+
+@router.get("/runs/{run_id}/tool_calls")
+def get_tool_calls(run_id: str, cursor: Optional[str] = None, limit: int = 100, include: Optional[str] = None) -> Dict:
+    try:
+        return models.list_tool_calls(run_id, cursor, limit, _split(include))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except WriteBehindTimeout as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+
+
 @router.get("/tasks/{task_id}/artifacts", response_model=list[ArtifactInfo])
-async def get_artifacts(task_id: str) -> list[ArtifactInfo]:
-    return [ArtifactInfo(**artifact) for artifact in models.list_artifacts(task_id)]
+def get_artifacts(task_id: str) -> list[ArtifactInfo]:
+    try:
+        return [ArtifactInfo(**artifact) for artifact in models.list_artifacts(task_id)]
+    except WriteBehindTimeout as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
 
 
 @router.get("/tasks/{task_id}/events")
-async def events(task_id: str):
-    return sse_events(task_id)
+async def events(task_id: str, last_event_id: Optional[str] = Header(None)):
+    return sse_events(task_id, last_event_id)
@@ -3,6 +3,9 @@ from datetime import datetime
 from typing import Any, Callable, Dict, List, Optional
 
 from app.core.schemas import LLMPlan
+from app.rag.namespaces import workspace_namespace
+from app.tools.policy import Confinement
+from app.tools.rag_tools import WORKSPACE_SCOPED_TOOLS
 from app.tools.registry import get_tool
 
 
@@ -10,9 +13,18 @@ def build_context(task: Dict[str, Any], workspace: str) -> Dict[str, Any]:
     return {
         "task": task,
         "workspace": workspace,
+        "rag_namespace": workspace_namespace(workspace),
     }
 
 
+def _scoped_args(tool: str, args: Dict[str, Any], workspace: Optional[str]) -> Dict[str, Any]:
+    # Index tools called without a namespace use the task workspace's index,
+    # not the shared default one.
+    if workspace and tool in WORKSPACE_SCOPED_TOOLS and not args.get("namespace") and not args.get("workspace"):
+        return {**args, "workspace": workspace}
+    return args
+
+
 def extract_evidence(verify_result: Dict[str, Any], max_lines: int = 40) -> str:
     stdout = (verify_result.get("stdout") or "").splitlines()
     stderr = (verify_result.get("stderr") or "").splitlines()
@@ -25,19 +37,29 @@ def exec_plan(
     plan: LLMPlan,
     run_id: str,
     tool_recorder: Callable[[str, Dict[str, Any], Dict[str, Any], bool, str, str], None],
+    workspace: Optional[str] = None,
+    confinement: Optional[Confinement] = None,
 ) -> List[Dict[str, Any]]:
+    """Run the plan's steps in order, recording each call.
+
+    With ``confinement`` every step is checked against it first; a step it
+    rejects fails without running.
+    """
     results = []
     for step in plan.steps:
         tool = get_tool(step.tool)
+        args = _scoped_args(step.tool, step.args, workspace)
         started_at = datetime.utcnow().isoformat()
         try:
-            output = tool(**step.args)
+            if confinement is not None:
+                args = confinement.apply(step.tool, args)
+            output = tool(**args)
             ok = True
         except Exception as exc:  # pragma: no cover - defensive
             output = {"error": str(exc)}
             ok = False
         ended_at = datetime.utcnow().isoformat()
-        tool_recorder(step.tool, step.args, output, ok, started_at, ended_at)
+        tool_recorder(step.tool, args, output, ok, started_at, ended_at)
         results.append({"tool": step.tool, "output": output, "ok": ok})
     return results
 
@@ -0,0 +1,205 @@
+import ast
+import os
+import shlex
+import subprocess
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from app.tools.walker import walk_files
+
+EXCLUDE_GLOB = ["**/node_modules/**", "**/.venv/**", "**/venv/**", "**/__pycache__/**", "**/dist/**", "**/build/**"]
+# pytest options whose value is the next argument, not a test path.
+PYTEST_VALUE_OPTIONS = frozenset(
+    {
+        "-k", "-m", "-p", "-c", "-o", "-W", "-n", "--maxfail", "--deselect", "--ignore", "--ignore-glob",
+        "--rootdir", "--confcutdir", "--basetemp", "--tb", "--junitxml", "--junit-xml", "--durations",
+        "--import-mode", "--log-level", "--override-ini", "--cov-report", "--cov-config", "--dist",
+    }
+)
+# Changes to these can affect any test, so they always mean a full run.
+GLOBAL_FILES = frozenset({"conftest.py", "pytest.ini", "setup.cfg", "tox.ini", "pyproject.toml", "setup.py"})
+
+
+def is_test_file(rel_path: str) -> bool:
+    name = os.path.basename(rel_path)
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def _module_names(rel_path: str) -> List[str]:
+    """Every dotted name ``rel_path`` may be imported as, shortest first.
+
+    Tests often put ``src/`` or their own directory on ``sys.path``, so
+    ``src/pkg/mod.py`` answers to ``pkg.mod`` and ``mod`` as well as
+    ``src.pkg.mod``.
+    """
+    parts = rel_path[:-3].split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return [".".join(parts[i:]) for i in range(len(parts) - 1, -1, -1)] if parts else []
+
+
+def _imports(rel_path: str, source: str) -> Set[str]:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return set()
+    package = rel_path[:-3].split("/")[:-1]
+    names: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[: len(package) - node.level + 1] if node.level <= len(package) + 1 else []
+                module = ".".join(base + ([node.module] if node.module else []))
+            else:
+                module = node.module or ""
+            if module:
+                names.add(module)
+            names.update(f"{module}.{alias.name}" if module else alias.name for alias in node.names)
+    return names
+
+
+class ImportGraph:
+    """Which Python files import which, for one workspace.
+
+    Files are re-parsed only when their size or mtime changed since the last
+    ``refresh``, so keeping the graph current between iterations costs one
+    directory walk.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._files: Dict[str, Tuple[int, int, Set[str]]] = {}
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        with self._lock:
+            seen = set()
+            for entry in walk_files(self.root, ["**/*.py"], EXCLUDE_GLOB):
+                seen.add(entry.rel_path)
+                cached = self._files.get(entry.rel_path)
+                if cached and cached[:2] == (entry.size, entry.mtime_ns):
+                    continue
+                try:
+                    with open(entry.path, "r", encoding="utf-8", errors="replace") as handle:
+                        imports = _imports(entry.rel_path, handle.read())
+                except OSError:
+                    continue
+                self._files[entry.rel_path] = (entry.size, entry.mtime_ns, imports)
+            for rel_path in set(self._files) - seen:
+                del self._files[rel_path]
+
+    def dependents(self) -> Dict[str, Set[str]]:
+        """Reverse edges: file -> files that import it."""
+        with self._lock:
+            files = dict(self._files)
+        by_name: Dict[str, Set[str]] = defaultdict(set)
+        for rel_path in files:
+            for name in _module_names(rel_path):
+                by_name[name].add(rel_path)
+        reverse: Dict[str, Set[str]] = defaultdict(set)
+        for rel_path, (_, _, imports) in files.items():
+            for name in imports:
+                for target in by_name.get(name, ()):
+                    if target != rel_path:
+                        reverse[target].add(rel_path)
+        return reverse
+
+    def impacted_tests(self, changed: Sequence[str]) -> Optional[List[str]]:
+        """Test files that import any of ``changed``, directly or transitively.
+
+        None means the impact cannot be bounded (a non-Python or global
+        configuration file changed, or a module was deleted) and the full
+        suite has to run.
+        """
+        for path in changed:
+            if not path.endswith(".py") or os.path.basename(path) in GLOBAL_FILES:
+                return None
+            if not os.path.exists(os.path.join(self.root, path)):
+                # The graph has no node for a deleted module, so its importers can't be found.
+                return None
+        self.refresh()
+        reverse = self.dependents()
+        seen = set(changed)
+        stack = list(changed)
+        while stack:
+            for dependent in reverse.get(stack.pop(), ()):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    stack.append(dependent)
+        return sorted(path for path in seen if is_test_file(path))
+
+
+_graphs: Dict[str, ImportGraph] = {}
+_graphs_lock = threading.Lock()
+
+
+def import_graph(root: str) -> ImportGraph:
+    root = os.path.abspath(root)
+    with _graphs_lock:
+        graph = _graphs.get(root)
+        if graph is None:
+            graph = _graphs[root] = ImportGraph(root)
+        return graph
+
+
+def changed_files(cwd: str) -> Optional[List[str]]:
+    """Modified and untracked files relative to ``cwd``; None outside a git work tree."""
+    modified = subprocess.run(["git", "diff", "HEAD", "--name-only", "--relative", "-z"], cwd=cwd, capture_output=True)
+    untracked = subprocess.run(["git", "ls-files", "--others", "--exclude-standard", "-z"], cwd=cwd, capture_output=True)
+    if modified.returncode != 0 or untracked.returncode != 0:
+        return None
+    paths = (modified.stdout + untracked.stdout).decode("utf-8", errors="surrogateescape").split("\0")
+    return sorted({path for path in paths if path})
+
+
+def _covers(target: str, test: str) -> bool:
+    target = os.path.normpath(target)
+    return target == "." or test == target or test.startswith(target + "/")
+
+
+def targeted_command(dod_command: str, tests: Sequence[str]) -> Optional[str]:
+    """``dod_command``'s pytest invocation narrowed to ``tests`` and stopping at the first failure.
+
+    Options (``-k``, ``-m``, ``--cov`` and the like) are kept and only the
+    positional test paths are replaced, by those of ``tests`` they cover.
+    Only plain pytest DoDs qualify; anything else (make targets, chained
+    commands, other runners, DoDs naming single test ids) returns None, as
+    does a DoD covering none of ``tests``.
+    """
+    try:
+        tokens = shlex.split(dod_command)
+    except ValueError:
+        return None
+    if any(token in {"&&", "||", ";", "|"} for token in tokens):
+        return None
+    for i, token in enumerate(tokens):
+        if token == "pytest" or (token == "-m" and i + 1 < len(tokens) and tokens[i + 1] == "pytest"):
+            end = i + 1 if token == "pytest" else i + 2
+            break
+    else:
+        return None
+    options: List[str] = []
+    targets: List[str] = []
+    args = iter(tokens[end:])
+    for arg in args:
+        if arg == "--":
+            targets.extend(args)
+        elif arg.startswith("-"):
+            options.append(arg)
+            if arg in PYTEST_VALUE_OPTIONS:
+                options.append(next(args, ""))
+        else:
+            targets.append(arg)
+    if any("::" in target for target in targets):
+        return None
+    selected = [test for test in tests if not targets or any(_covers(target, test) for target in targets)]
+    if not selected:
+        return None
+    if not any(option in {"-x", "--exitfirst"} or option.startswith("--maxfail") for option in options):
+        options.append("-x")
+    if not any(option.startswith(("-q", "-v", "--quiet", "--verbose")) for option in options):
+        options.append("-q")
+    return shlex.join(tokens[:end] + options + selected)
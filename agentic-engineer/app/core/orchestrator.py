@@ -4,12 +4,16 @@ from datetime import datetime
 from typing import Any, Callable, Dict, Optional
 
 from app.core.agent import build_context, exec_plan, extract_evidence
+from app.core.impact import changed_files, import_graph, targeted_command
 from app.core.schemas import LLMPlan
+from app.core.speculative import speculate
+from app.core.verify_cache import VERIFY_ENV, cache_enabled, verify_cache
 from app.llm.gateway import make_plan
 from app.storage import models
 from app.tools.cmd_tools import run_cmd
 from app.tools.git_tools import git_diff
 from app.telemetry.logger import log_event
+from app.telemetry.metrics import metrics
 
 EventEmitter = Optional[Callable[[str, Dict[str, Any]], None]]
 
@@ -25,7 +29,6 @@ def run_task(task_id: str, emit: EventEmitter = None, planner: Optional[Callable
 
     workspace = task["workspace_path"]
     max_iters = task["max_iters"]
-    timeout_sec = task["timeout_sec"]
     dod_cmd = task["dod_command"]
     planner = planner or make_plan
 
@@ -34,7 +37,11 @@ def run_task(task_id: str, emit: EventEmitter = None, planner: Optional[Callable
         if emit:
             emit("iter_started", {"task_id": task_id, "iter": iteration})
         run_id = models.create_run(task_id, iteration)
-        verify = run_cmd(dod_cmd, cwd=workspace, timeout_sec=timeout_sec, env={"PYTHONUNBUFFERED": "1"})
+        verify = None
+        if task.get("fast_verify") and iteration > 0:
+            verify = _fast_verify(task, emit, iteration)
+        if verify is None:
+            verify = _verify(task, dod_cmd, emit, iteration)
         last_verify = verify
         if verify["exit_code"] == 0:
             models.finish_run(run_id, "ok", "DoD passed")
@@ -46,15 +53,18 @@ def run_task(task_id: str, emit: EventEmitter = None, planner: Optional[Callable
 
         evidence = extract_evidence(verify)
         context = build_context(task, workspace)
-        plan = planner(context, evidence)
-        tool_results = exec_plan(
-            plan,
-            run_id,
-            lambda name, args, output, ok, started_at, ended_at: models.record_tool_call(
-                run_id, name, args, output, ok, started_at, ended_at
-            ),
+        recorder = lambda name, args, output, ok, started_at, ended_at, candidate=None: models.record_tool_call(  # noqa: E731
+            run_id, name, args, output, ok, started_at, ended_at, candidate
         )
-        summary = json.dumps({"plan": plan.model_dump(), "results": tool_results}, ensure_ascii=False)
+        speculation = None
+        if (task.get("speculative") or 0) > 1:
+            speculation = speculate(task, run_id, iteration, context, evidence, planner, recorder, emit)
+        if speculation is None:
+            plan = planner(context, evidence)
+            tool_results = exec_plan(plan, run_id, recorder, workspace)
+            summary = json.dumps({"plan": plan.model_dump(), "results": tool_results}, ensure_ascii=False)
+        else:
+            summary = json.dumps(speculation, ensure_ascii=False)
         models.finish_run(run_id, "fail", summary)
         if emit:
             emit("iter_finished", {"task_id": task_id, "iter": iteration, "status": "fail"})
@@ -66,15 +76,81 @@ def run_task(task_id: str, emit: EventEmitter = None, planner: Optional[Callable
         emit("task_finished", {"task_id": task_id, "status": "failed"})
 
 
-def _write_artifacts(task_id: str, workspace: str, verify: Dict[str, Any]) -> None:
+def _verify(task: Dict[str, Any], command: str, emit: EventEmitter, iteration: int) -> Dict[str, Any]:
+    """Run a verification command, or reuse its result if nothing it depends on changed."""
+    key = verify_cache.key(task["workspace_path"], command, VERIFY_ENV) if cache_enabled() else None
+    cached = verify_cache.get(key) if key else None
+    if cached is not None:
+        if emit:
+            emit("verify_cached", {"task_id": task["id"], "iter": iteration, "command": command, "exit_code": cached["exit_code"]})
+        return cached
+    verify = run_cmd(
+        command,
+        cwd=task["workspace_path"],
+        timeout_sec=task["timeout_sec"],
+        env=VERIFY_ENV,
+        on_output=_output_emitter(emit, task["id"], iteration),
+        log_path=os.path.join(_artifact_dir(task["id"]), "verify.log"),
+    )
+    if key:
+        verify_cache.put(key, verify)
+    return verify
+
+
+def _fast_verify(task: Dict[str, Any], emit: EventEmitter, iteration: int) -> Optional[Dict[str, Any]]:
+    """Run just the tests impacted by the workspace changes, stopping at the first failure.
+
+    Returns the failing result, which stands in for the full DoD this
+    iteration; None when the targeted tests pass or cannot be determined, so
+    the full DoD runs.
+    """
+    workspace = task["workspace_path"]
+    changed = changed_files(workspace)
+    tests = import_graph(workspace).impacted_tests(changed) if changed else None
+    command = targeted_command(task["dod_command"], tests) if tests else None
+    if not command:
+        metrics.incr("verify.fast_skipped")
+        return None
+    verify = _verify(task, command, emit, iteration)
+    metrics.incr("verify.fast_runs")
+    if emit:
+        emit(
+            "fast_verify",
+            {
+                "task_id": task["id"],
+                "iter": iteration,
+                "tests": tests,
+                "exit_code": verify["exit_code"],
+                "duration_ms": verify["duration_ms"],
+            },
+        )
+    if verify["exit_code"] == 0:
+        return None
+    metrics.incr("verify.fast_failures")
+    return verify
+
+
+def _artifact_dir(task_id: str) -> str:
     base_dir = os.path.join(os.getenv("AGENT_DATA_DIR", "/agent_data"), "artifacts", task_id)
     os.makedirs(base_dir, exist_ok=True)
+    return base_dir
+
+
+def _output_emitter(emit: EventEmitter, task_id: str, iteration: int) -> Optional[Callable[[str, str], None]]:
+    if not emit:
+        return None
+    return lambda stream, text: emit("cmd_output", {"task_id": task_id, "iter": iteration, "stream": stream, "text": text})
+
+
+def _write_artifacts(task_id: str, workspace: str, verify: Dict[str, Any]) -> None:
+    base_dir = _artifact_dir(task_id)
 
     verify_path = os.path.join(base_dir, "verify.log")
-    with open(verify_path, "w", encoding="utf-8") as handle:
-        handle.write(verify.get("stdout", ""))
-        handle.write("\n")
-        handle.write(verify.get("stderr", ""))
+    if verify.get("log_path") != verify_path:
+        with open(verify_path, "w", encoding="utf-8") as handle:
+            handle.write(verify.get("stdout", ""))
+            handle.write("\n")
+            handle.write(verify.get("stderr", ""))
     models.record_artifact(task_id, "log", verify_path)
 
     diff = git_diff(workspace).get("diff", "")
@@ -0,0 +1,211 @@
+import os
+import socket
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.core.orchestrator import EventEmitter, run_task
+from app.storage import models
+from app.telemetry.logger import log_event
+from app.telemetry.metrics import metrics
+
+TaskRunner = Callable[[str, EventEmitter], None]
+EmitterFactory = Callable[[str], EventEmitter]
+
+# Workers re-check the table this often, so tasks queued by another process
+# (or before a lost wakeup) are picked up without a notify() call.
+POLL_INTERVAL_SEC = 1.0
+
+
+def default_heartbeat_sec() -> float:
+    return float(os.getenv("TASK_HEARTBEAT_SEC", "10"))
+
+
+def default_stale_sec() -> float:
+    return float(os.getenv("TASK_STALE_SEC", "60"))
+
+
+def default_task_workers() -> int:
+    configured = os.getenv("TASK_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class TaskScheduler:
+    """Runs queued tasks from the ``tasks`` table on a fixed pool of worker threads.
+
+    The table is the queue: a task is ``queued`` until a worker claims it with
+    a conditional UPDATE that records this scheduler as its owner, so nothing
+    is lost when the process dies. Owners heartbeat their running tasks every
+    ``TASK_HEARTBEAT_SEC``; a running task whose heartbeat is older than
+    ``TASK_STALE_SEC`` lost its owner and is re-queued, while tasks of live
+    schedulers in other processes are left alone. Among queued tasks a worker
+    takes the highest priority first, then the submitter with the fewest tasks
+    running, then the oldest; a task whose workspace is busy waits, so two
+    tasks never edit or test the same checkout at once. Busy workspaces are
+    tracked in memory to skip doomed claims, and the claim itself refuses a
+    workspace with a running task, so the rule holds across processes. DoD
+    commands already run as subprocesses, so workers are threads; the pool
+    size caps how many of them run together (``TASK_WORKERS``, default:
+    available CPUs).
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        runner: TaskRunner = run_task,
+        emitter: Optional[EmitterFactory] = None,
+        heartbeat_sec: Optional[float] = None,
+        stale_sec: Optional[float] = None,
+    ) -> None:
+        self.workers = workers or default_task_workers()
+        self.runner = runner
+        self.emitter = emitter
+        self.heartbeat_sec = heartbeat_sec or default_heartbeat_sec()
+        self.stale_sec = stale_sec or default_stale_sec()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._stopping = False
+        self._busy_workspaces: Set[str] = set()
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._running_by_submitter: Counter = Counter()
+
+    def start(self) -> List[str]:
+        """Re-queue orphaned tasks and start the workers; returns the recovered ids."""
+        recovered = self._recover()
+        with self._cond:
+            self._stopping = False
+            self._stopped.clear()
+            if self._heartbeat_thread is None or not self._heartbeat_thread.is_alive():
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat, name="task-heartbeat", daemon=True)
+                self._heartbeat_thread.start()
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"task-worker-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        return recovered
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop claiming tasks and wait for the running ones to finish."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        # Tasks still running keep their heartbeat, or another scheduler would take them over.
+        if not self._threads and self._heartbeat_thread is not None:
+            self._stopped.set()
+            self._heartbeat_thread.join(timeout)
+
+    def notify(self) -> None:
+        """Wake a worker after a task was queued."""
+        with self._cond:
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            running = list(self._running.values())
+        return {
+            "workers": self.workers,
+            "running": running,
+            "busy_workspaces": sorted({task["workspace_key"] for task in running}),
+            "tasks_by_status": models.count_tasks_by_status(),
+        }
+
+    def _recover(self) -> List[str]:
+        recovered = models.requeue_stale_tasks(self.stale_sec)
+        for task_id in recovered:
+            log_event("task_recovered", {"task_id": task_id})
+        metrics.incr("scheduler.recovered", len(recovered))
+        return recovered
+
+    def _heartbeat(self) -> None:
+        while not self._stopped.wait(self.heartbeat_sec):
+            with self._cond:
+                running = list(self._running)
+            try:
+                models.heartbeat_tasks(running, self.owner)
+                if self._recover():
+                    self.notify()
+            except Exception as exc:
+                log_event("scheduler_heartbeat_failed", {"owner": self.owner, "error": str(exc)})
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+            task = self._claim_next()
+            if task is None:
+                with self._cond:
+                    if not self._stopping:
+                        self._cond.wait(POLL_INTERVAL_SEC)
+                continue
+            emit = None
+            try:
+                emit = self.emitter(task["id"]) if self.emitter else None
+                self.runner(task["id"], emit)
+            except Exception as exc:
+                log_event("task_crashed", {"task_id": task["id"], "error": str(exc)})
+                if emit:
+                    # Subscribers wait for task_finished to end their streams.
+                    emit("task_finished", {"task_id": task["id"], "status": "failed", "error": str(exc)})
+            finally:
+                models.finish_task(task["id"])
+                with self._cond:
+                    self._release(task)
+                    self._cond.notify_all()
+
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        # The queries run without the condition held, so a slow database
+        # doesn't stall the other workers. A workspace is reserved under the
+        # condition before its task is claimed, and claim_task() arbitrates
+        # between processes, busy workspaces included.
+        queued = models.list_queued_tasks()
+        metrics.set("scheduler.queue_depth", len(queued))
+        for task in queued:
+            task["workspace_key"] = os.path.normpath(task["workspace_path"])
+        with self._cond:
+            running_by_submitter = Counter(self._running_by_submitter)
+        queued.sort(key=lambda task: (-task["priority"], running_by_submitter[task["submitter"]], task["created_at"]))
+        for task in queued:
+            with self._cond:
+                if task["workspace_key"] in self._busy_workspaces:
+                    continue
+                self._reserve(task)
+            if not models.claim_task(task["id"], self.owner):
+                with self._cond:
+                    self._release(task)
+                continue
+            # Re-queued tasks wait from their latest queuing, not their creation.
+            queued_at = datetime.fromisoformat(task["queued_at"] or task["created_at"])
+            waited_ms = (datetime.utcnow() - queued_at).total_seconds() * 1000
+            metrics.observe("scheduler.wait_ms", waited_ms)
+            metrics.set("scheduler.queue_depth", len(queued) - 1)
+            with self._cond:
+                self._running[task["id"]]["waited_ms"] = round(waited_ms)
+            return task
+        return None
+
+    def _reserve(self, task: Dict[str, Any]) -> None:
+        self._busy_workspaces.add(task["workspace_key"])
+        self._running_by_submitter[task["submitter"]] += 1
+        self._running[task["id"]] = dict(task)
+        metrics.set("scheduler.running", len(self._running))
+
+    def _release(self, task: Dict[str, Any]) -> None:
+        self._busy_workspaces.discard(task["workspace_key"])
+        self._running_by_submitter[task["submitter"]] -= 1
+        if self._running_by_submitter[task["submitter"]] <= 0:
+            del self._running_by_submitter[task["submitter"]]
+        self._running.pop(task["id"], None)
+        metrics.set("scheduler.running", len(self._running))
@@ -9,6 +9,10 @@ class TaskCreate(BaseModel):
     workspace_path: str = "/workspace"
     max_iters: int = 8
     timeout_sec: int = 1800
+    priority: int = 0
+    submitter: str = "anonymous"
+    fast_verify: bool = False
+    speculative: int = 0
 
 
 class TaskResponse(BaseModel):
@@ -47,9 +51,19 @@ class ArtifactInfo(BaseModel):
 class IndexQuery(BaseModel):
     query: str
     top_k: int = 8
+    nprobe: Optional[int] = None
+    mode: str = "hybrid"
+    namespace: Optional[str] = None
+    workspace: Optional[str] = None
+    cursor: Optional[str] = None
+    snippet_lines: Optional[int] = None
 
 
 class IndexRebuild(BaseModel):
     path: Optional[str] = None
     include_glob: List[str] = ["**/*.py", "**/*.md", "**/*.txt"]
-    exclude_glob: List[str] = ["**/.git/**", "**/dist/**"]
+    exclude_glob: List[str] = ["**/.git/**", "**/dist/**", "**/node_modules/**", "**/.venv/**", "**/venv/**"]
+    incremental: bool = True
+    background: bool = True
+    namespace: Optional[str] = None
+    workspace: Optional[str] = None
@@ -0,0 +1,230 @@
+import functools
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.agent import exec_plan
+from app.core.schemas import LLMPlan
+from app.core.verify_cache import CACHE_DIRS, VERIFY_ENV, cache_enabled, verify_cache
+from app.telemetry.logger import log_event
+from app.telemetry.metrics import metrics
+from app.tools.cmd_tools import run_cmd
+from app.tools.policy import Confinement
+from app.tools.git_tools import (
+    add_worktree,
+    apply_diff,
+    diff_trees,
+    git_toplevel,
+    ignored_paths,
+    remove_worktree,
+    snapshot_commit,
+    snapshot_tree,
+)
+
+Planner = Callable[[Dict[str, Any], str], LLMPlan]
+# Called as (tool, args, output, ok, started_at, ended_at, candidate=index).
+ToolRecorder = Callable[..., None]
+EventEmitter = Optional[Callable[[str, Dict[str, Any]], None]]
+
+
+def default_speculative_workers(candidates: int) -> int:
+    configured = os.getenv("SPECULATIVE_WORKERS")
+    if configured:
+        return max(1, min(candidates, int(configured)))
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    return max(1, min(candidates, cpus))
+
+
+@dataclass
+class Candidate:
+    index: int
+    worktree: str
+    workspace: str
+    plan: Optional[LLMPlan] = None
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    verify: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "candidate": self.index,
+            "plan": self.plan.model_dump() if self.plan else None,
+            "results": self.results,
+            "exit_code": self.verify["exit_code"] if self.verify else None,
+            "error": self.error,
+        }
+
+
+def _retarget(value: Any, source: str, target: str) -> Any:
+    """``value`` with every path under ``source`` moved under ``target``."""
+    if isinstance(value, str):
+        if value == source or value.startswith(source + os.sep):
+            return target + value[len(source):]
+        return value
+    if isinstance(value, dict):
+        return {key: _retarget(item, source, target) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_retarget(item, source, target) for item in value]
+    return value
+
+
+def speculate(
+    task: Dict[str, Any],
+    run_id: str,
+    iteration: int,
+    context: Dict[str, Any],
+    evidence: str,
+    planner: Planner,
+    recorder: ToolRecorder,
+    emit: EventEmitter = None,
+) -> Optional[Dict[str, Any]]:
+    """Try ``task["speculative"]`` plans at once, each in its own git worktree.
+
+    Every candidate plans, applies its plan to a worktree checked out from a
+    snapshot of the workspace and runs the DoD there; its tool calls are
+    confined to that worktree and recorded with its index. Up to
+    ``SPECULATIVE_WORKERS`` candidates run concurrently. The first candidate
+    whose DoD passes wins and the rest are cancelled; if none passes the
+    first candidate stands in, as it would have in a serial iteration. The
+    winner's changes are applied to the workspace as a diff. Returns the run
+    summary, or None when the workspace is not in a git repository and the
+    caller should fall back to a single plan.
+
+    Worktrees hold the snapshot, which leaves out ignored files, so ignored
+    paths of the repository (``.venv``, ``node_modules``, ``.env``, build
+    outputs) are symlinked into each worktree for the DoD to find. They are
+    shared, not copied: a DoD that writes to them writes to the workspace's
+    copy, and concurrent candidates see each other's writes there.
+    """
+    workspace = os.path.abspath(task["workspace_path"])
+    top = git_toplevel(workspace)
+    base_tree = snapshot_tree(workspace, CACHE_DIRS) if top else None
+    commit = snapshot_commit(top, base_tree) if base_tree else None
+    if commit is None:
+        log_event("speculative_skipped", {"task_id": task["id"], "reason": "workspace is not a git work tree"})
+        return None
+
+    shared = [path.rstrip("/") for path in ignored_paths(top, CACHE_DIRS) or []]
+    count = int(task["speculative"])
+    base_dir = os.path.join(os.getenv("AGENT_DATA_DIR", "/agent_data"), "speculative", task["id"], str(iteration))
+    candidates: List[Candidate] = []
+    cancel = threading.Event()
+    try:
+        for index in range(count):
+            worktree = os.path.join(base_dir, str(index))
+            if not add_worktree(top, worktree, commit):
+                break
+            _link_shared(top, worktree, shared)
+            candidates.append(Candidate(index, worktree, os.path.join(worktree, os.path.relpath(os.path.realpath(workspace), top))))
+        if not candidates:
+            return None
+        if emit:
+            emit("speculative_started", {"task_id": task["id"], "iter": iteration, "candidates": len(candidates)})
+        metrics.incr("speculative.candidates", len(candidates))
+
+        def attempt(candidate: Candidate) -> Candidate:
+            if cancel.is_set():
+                return candidate
+            try:
+                candidate_context = _retarget(context, workspace, candidate.workspace)
+                plan = planner({**candidate_context, "candidate": candidate.index, "candidates": len(candidates)}, evidence)
+                candidate.plan = LLMPlan(**_retarget(plan.model_dump(), workspace, candidate.workspace))
+                if cancel.is_set():
+                    return candidate
+                candidate.results = exec_plan(
+                    candidate.plan,
+                    run_id,
+                    functools.partial(recorder, candidate=candidate.index),
+                    workspace,
+                    Confinement(candidate.worktree, candidate.workspace),
+                )
+                candidate.verify = run_cmd(
+                    task["dod_command"],
+                    cwd=candidate.workspace,
+                    timeout_sec=task["timeout_sec"],
+                    env=VERIFY_ENV,
+                    log_path=os.path.join(base_dir, f"verify-{candidate.index}.log"),
+                    cancel=cancel,
+                )
+                if candidate.verify["exit_code"] == 0:
+                    # Stop the rest before the pool hands this thread the next candidate.
+                    cancel.set()
+            except Exception as exc:
+                candidate.error = str(exc)
+            return candidate
+
+        winner = None
+        with ThreadPoolExecutor(max_workers=default_speculative_workers(len(candidates))) as pool:
+            for future in as_completed([pool.submit(attempt, candidate) for candidate in candidates]):
+                candidate = future.result()
+                if emit and candidate.verify:
+                    emit(
+                        "candidate_finished",
+                        {
+                            "task_id": task["id"],
+                            "iter": iteration,
+                            "candidate": candidate.index,
+                            "exit_code": candidate.verify["exit_code"],
+                        },
+                    )
+                if winner is None and candidate.verify and candidate.verify["exit_code"] == 0:
+                    winner = candidate
+                    cancel.set()
+
+        passed = winner is not None
+        winner = winner or candidates[0]
+        _unlink_shared(winner.worktree, shared)
+        promoted = _promote(task["dod_command"], workspace, top, base_tree, winner, passed)
+        metrics.incr("speculative.wins" if passed else "speculative.misses")
+        if emit:
+            emit(
+                "candidate_promoted",
+                {"task_id": task["id"], "iter": iteration, "candidate": winner.index, "passed": passed, "applied": promoted},
+            )
+        return {
+            "speculative": True,
+            "promoted": winner.index,
+            "passed": passed,
+            "applied": promoted,
+            "candidates": [candidate.to_dict() for candidate in candidates],
+        }
+    finally:
+        cancel.set()
+        for candidate in candidates:
+            remove_worktree(top, candidate.worktree)
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def _link_shared(top: str, worktree: str, paths: List[str]) -> None:
+    for path in paths:
+        link = os.path.join(worktree, path)
+        if os.path.lexists(link):
+            continue
+        os.makedirs(os.path.dirname(link), exist_ok=True)
+        os.symlink(os.path.join(top, path), link)
+
+
+def _unlink_shared(worktree: str, paths: List[str]) -> None:
+    # The links must not end up in the winner's snapshot and so in its diff.
+    for path in paths:
+        link = os.path.join(worktree, path)
+        if os.path.islink(link):
+            os.unlink(link)
+
+
+def _promote(command: str, workspace: str, top: str, base_tree: str, winner: Candidate, passed: bool) -> bool:
+    tree = snapshot_tree(winner.workspace, CACHE_DIRS)
+    if tree is None:
+        return False
+    diff = diff_trees(top, base_tree, tree)
+    if diff and not apply_diff(workspace, diff):
+        log_event("speculative_promote_failed", {"workspace": workspace, "candidate": winner.index})
+        return False
+    # The workspace now holds exactly what the winner verified, so its
+    # passing result stands for the next iteration's DoD run.
+    if passed and cache_enabled() and snapshot_tree(workspace, CACHE_DIRS) == tree:
+        verify_cache.put(verify_cache.key(workspace, command, VERIFY_ENV), winner.verify)
+    return True
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.telemetry.metrics import metrics
+from app.tools.git_tools import worktree_fingerprint
+from app.tools.walker import walk_files
+
+# Written by test runs themselves; left out of the tree hash so a run does
+# not invalidate its own result.
+CACHE_DIRS = ("__pycache__", ".pytest_cache", ".mypy_cache", ".ruff_cache", ".tox")
+# Added to the environment of every verification command.
+VERIFY_ENV = {"PYTHONUNBUFFERED": "1"}
+
+
+def cache_enabled() -> bool:
+    return os.getenv("VERIFY_CACHE", "1").lower() not in {"0", "false", "off", "no"}
+
+
+def default_max_entries() -> int:
+    return int(os.getenv("VERIFY_CACHE_ENTRIES", "256"))
+
+
+def _manifest_hash(workspace: str) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    for entry in walk_files(workspace, exclude_glob=[f"**/{name}/**" for name in CACHE_DIRS], gitignore=False):
+        digest.update(f"{entry.rel_path}\0{entry.size}\0{entry.mtime_ns}\n".encode("utf-8", errors="surrogateescape"))
+    return f"stat:{digest.hexdigest()}"
+
+
+def tree_hash(workspace: str) -> str:
+    """Fingerprint of ``workspace`` including ignored files; a stat manifest outside git."""
+    fingerprint = worktree_fingerprint(workspace, CACHE_DIRS)
+    return f"git:{fingerprint}" if fingerprint else _manifest_hash(workspace)
+
+
+class VerifyCache:
+    """Results of verification commands, keyed by what they ran against.
+
+    The key covers the command, the workspace and its tree hash, the extra
+    environment and the process environment, so a hit means the very same
+    command would run on the very same files. Results of commands that timed
+    out or were cancelled are not stored. Entries are kept in LRU order up to
+    ``max_entries``.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None) -> None:
+        self.max_entries = max_entries or default_max_entries()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def key(self, workspace: str, command: str, env: Optional[Dict[str, str]] = None) -> str:
+        material = {
+            "workspace": os.path.abspath(workspace),
+            "command": command,
+            "env": sorted((env or {}).items()),
+            "process_env": hashlib.blake2b(json.dumps(sorted(os.environ.items())).encode("utf-8")).hexdigest(),
+            "tree": tree_hash(workspace),
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+        metrics.incr("verify.cache_hits" if result is not None else "verify.cache_misses")
+        return dict(result, cached=True) if result is not None else None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        if result.get("timed_out") or result.get("cancelled"):
+            return
+        # The log file belongs to the run that produced it and may be overwritten.
+        stored = {name: value for name, value in result.items() if name != "log_path"}
+        with self._lock:
+            self._entries[key] = stored
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+verify_cache = VerifyCache()
@@ -42,7 +42,8 @@ def make_plan(context: Dict[str, Any], evidence: str) -> LLMPlan:
                 "content": json.dumps({"context": context, "evidence": evidence}, ensure_ascii=False),
             },
         ],
-        "temperature": 0.2,
+        # Speculative candidates after the first sample more freely so they differ.
+        "temperature": float(os.getenv("LLM_SPECULATIVE_TEMPERATURE", "0.8")) if context.get("candidate") else 0.2,
     }
     headers = {
         "Authorization": f"Bearer {os.getenv('LLM_API_KEY')}",
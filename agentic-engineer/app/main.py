@@ -1,7 +1,11 @@
+import asyncio
+
 from fastapi import FastAPI
 
 from app.api import index, tasks
+from app.api.events import emitter
 from app.storage.db import init_db
+from app.telemetry.metrics import metrics
 
 app = FastAPI(title="Agentic Engineer MVP")
 
@@ -9,7 +13,20 @@ app = FastAPI(title="Agentic Engineer MVP")
 @app.on_event("startup")
 async def on_startup() -> None:
     init_db()
+    emitter.bind(asyncio.get_running_loop())
+    tasks.scheduler.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    # Workers are daemons; tasks cut short are re-queued on the next start.
+    tasks.scheduler.stop(timeout=0)
 
 
 app.include_router(tasks.router)
 app.include_router(index.router)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
@@ -0,0 +1,200 @@
+import json
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+META_FILE = "ivf.json"
+CENTROIDS_FILE = "ivf_centroids.npy"
+IDS_FILE = "ivf_ids.npy"
+OFFSETS_FILE = "ivf_offsets.npy"
+
+# Retrain from scratch once the corpus has grown this much past the sample
+# the centroids were trained on; until then new rows are just assigned.
+RETRAIN_GROWTH = 2.0
+
+
+def ann_min_chunks() -> int:
+    return int(os.getenv("RAG_ANN_MIN_CHUNKS", "50000"))
+
+
+def default_nprobe() -> int:
+    return int(os.getenv("RAG_ANN_NPROBE", "8"))
+
+
+def default_nlist(count: int) -> int:
+    configured = os.getenv("RAG_ANN_NLIST")
+    if configured:
+        return max(1, int(configured))
+    return max(1, min(count, int(4 * math.sqrt(count))))
+
+
+class IVFIndex:
+    """Inverted-file index with a spherical k-means coarse quantizer.
+
+    Row ids are grouped into ``nlist`` lists by their nearest centroid and
+    stored CSR-style (``ids`` + ``offsets``). A query scans only the rows of
+    its ``nprobe`` closest lists, trading recall for latency.
+    """
+
+    def __init__(self, centroids: np.ndarray, ids: np.ndarray, offsets: np.ndarray, trained_count: int):
+        self.centroids = centroids
+        self.ids = ids
+        self.offsets = offsets
+        self.trained_count = trained_count
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int, iterations: int = 8, max_sample: int = 50_000, seed: int = 0) -> "IVFIndex":
+        rng = np.random.default_rng(seed)
+        count = len(vectors)
+        nlist = max(1, min(nlist, count))
+        sample_ids = np.sort(rng.choice(count, size=min(count, max(max_sample, nlist), 256 * nlist), replace=False))
+        sample = np.asarray(vectors[sample_ids], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(labels, kind="stable")
+            present, starts = np.unique(labels[order], return_index=True)
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+                norms[empty] = np.linalg.norm(sums[empty], axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+        empty_ids = np.zeros(0, dtype=np.int64)
+        return cls(centroids.astype(np.float32), empty_ids, np.zeros(nlist + 1, dtype=np.int64), trained_count=count)
+
+    def assign(self, vectors: np.ndarray, batch: int = 65536) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch):
+            block = np.asarray(vectors[start:start + batch], dtype=np.float32)
+            labels[start:start + batch] = np.argmax(block @ self.centroids.T, axis=1)
+        return labels
+
+    def _labels(self) -> np.ndarray:
+        return np.repeat(np.arange(self.nlist), np.diff(self.offsets))
+
+    def _rebuild(self, ids: np.ndarray, labels: np.ndarray) -> None:
+        order = np.lexsort((ids, labels))
+        self.ids = np.ascontiguousarray(ids[order], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=self.nlist))]).astype(np.int64)
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        if not len(ids):
+            return
+        labels = np.concatenate([self._labels(), self.assign(vectors)])
+        self._rebuild(np.concatenate([np.asarray(self.ids), np.asarray(ids, dtype=np.int64)]), labels)
+
+    def remap(self, old_to_new: np.ndarray) -> None:
+        """Renumber rows after a rebuild; rows mapped to -1 are deleted."""
+        mapped = old_to_new[np.asarray(self.ids)]
+        keep = mapped >= 0
+        self._rebuild(mapped[keep], self._labels()[keep])
+
+    def needs_retrain(self, count: int) -> bool:
+        return count > self.trained_count * RETRAIN_GROWTH
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        scores = self.centroids @ query
+        nprobe = min(max(1, nprobe), self.nlist)
+        probe = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        return np.concatenate([self.ids[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+
+    def save(self, path: str) -> None:
+        np.save(os.path.join(path, CENTROIDS_FILE), self.centroids)
+        np.save(os.path.join(path, IDS_FILE), np.asarray(self.ids))
+        np.save(os.path.join(path, OFFSETS_FILE), np.asarray(self.offsets))
+        with open(os.path.join(path, META_FILE), "w", encoding="utf-8") as handle:
+            json.dump({"nlist": self.nlist, "count": len(self), "trained_count": self.trained_count}, handle)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> Optional["IVFIndex"]:
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as handle:
+            meta = json.load(handle)
+        mode = "r" if mmap else None
+        return cls(
+            np.load(os.path.join(path, CENTROIDS_FILE)),
+            np.load(os.path.join(path, IDS_FILE), mmap_mode=mode),
+            np.load(os.path.join(path, OFFSETS_FILE)),
+            trained_count=meta["trained_count"],
+        )
+
+
+def build_ivf(
+    vectors: np.ndarray,
+    previous: Optional[IVFIndex] = None,
+    old_to_new: Optional[np.ndarray] = None,
+) -> IVFIndex:
+    """Build the IVF lists for ``vectors``.
+
+    When a ``previous`` index and the row mapping from the previous build are
+    given, surviving rows keep their lists and only new rows are assigned.
+    """
+    count = len(vectors)
+    if previous is not None and old_to_new is not None and not previous.needs_retrain(count):
+        index = IVFIndex(previous.centroids, np.asarray(previous.ids), np.asarray(previous.offsets), previous.trained_count)
+        index.remap(old_to_new)
+        present = np.zeros(count, dtype=bool)
+        present[index.ids] = True
+        new_ids = np.flatnonzero(~present)
+        index.add(new_ids, vectors[new_ids])
+        return index
+    index = IVFIndex.train(vectors, default_nlist(count))
+    index.add(np.arange(count), vectors)
+    return index
+
+
+def recall_report(store: Any, nprobes: Sequence[int] = (1, 2, 4, 8, 16, 32), top_k: int = 10, samples: int = 100) -> Dict[str, Any]:
+    """Measure recall@k and latency of the ANN index against brute force.
+
+    Queries are stored vectors sampled from the index itself.
+    """
+    if store.ann is None or not store.count:
+        return {"available": False, "chunks": store.count}
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(store.count, size=min(samples, store.count), replace=False)
+    queries = np.asarray(store.vectors[np.sort(query_ids)], dtype=np.float32)
+
+    started = time.perf_counter()
+    exact = [set(ids.tolist()) for ids in store.search_ids(queries, top_k)]
+    flat_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    settings: List[Dict[str, Any]] = []
+    for nprobe in nprobes:
+        started = time.perf_counter()
+        approx = store.search_ids(queries, top_k, nprobe=nprobe)
+        latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = np.mean([len(truth & set(ids.tolist())) / max(len(truth), 1) for truth, ids in zip(exact, approx)])
+        settings.append({"nprobe": nprobe, "recall": round(float(recall), 4), "latency_ms": round(latency_ms, 3)})
+    return {
+        "available": True,
+        "chunks": store.count,
+        "nlist": store.ann.nlist,
+        "top_k": top_k,
+        "queries": len(queries),
+        "flat_latency_ms": round(flat_ms, 3),
+        "settings": settings,
+    }
+
+
+def remap_from_copies(old_count: int, copies: List[Tuple[int, int, int]]) -> np.ndarray:
+    """Old row -> new row mapping from ``(old_start, new_start, rows)`` copy spans."""
+    old_to_new = np.full(old_count, -1, dtype=np.int64)
+    for old_start, new_start, rows in copies:
+        old_to_new[old_start:old_start + rows] = np.arange(new_start, new_start + rows)
+    return old_to_new
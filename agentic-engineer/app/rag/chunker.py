@@ -1,23 +1,167 @@
-from dataclasses import dataclass
-from typing import List
+import ast
+import hashlib
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
 
+# Bumped whenever chunk boundaries change so existing indexes are rebuilt.
+CHUNKER_VERSION = 3
 
-@dataclass
+Span = Tuple[int, int, List[str]]
+
+_JS_BOUNDARY = re.compile(
+    r"^(?:export\s+(?:default\s+)?)?(?:async\s+)?"
+    r"(?:function\*?\s+([A-Za-z_$][\w$]*)"
+    r"|class\s+([A-Za-z_$][\w$]*)"
+    r"|(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>))"
+)
+_GO_BOUNDARY = re.compile(r"^(?:func\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)|type\s+([A-Za-z_]\w*))")
+_RUST_BOUNDARY = re.compile(r"^(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?(?:fn|struct|enum|trait|impl|mod)\s+([A-Za-z_]\w*)")
+
+BOUNDARY_PATTERNS = {
+    "js": _JS_BOUNDARY,
+    "jsx": _JS_BOUNDARY,
+    "mjs": _JS_BOUNDARY,
+    "cjs": _JS_BOUNDARY,
+    "ts": _JS_BOUNDARY,
+    "tsx": _JS_BOUNDARY,
+    "go": _GO_BOUNDARY,
+    "rs": _RUST_BOUNDARY,
+}
+# Lines that belong to the definition below them (comments, decorators, attributes).
+_LEADING_LINE = re.compile(r"^\s*(?:#|//|/\*|\*|@)")
+
+
+@dataclass(slots=True)
 class Chunk:
     path: str
     start_line: int
     end_line: int
     text: str
     language: str
+    symbols: List[str] = field(default_factory=list)
+    content_hash: str = ""
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def default_overlap() -> int:
+    return int(os.getenv("RAG_CHUNK_OVERLAP", "0"))
+
+
+def _windows(start: int, end: int, max_lines: int, symbols: List[str]) -> List[Span]:
+    return [(i, min(i + max_lines - 1, end), list(symbols)) for i in range(start, end + 1, max_lines)]
+
 
+def _is_blank(lines: List[str], start: int, end: int) -> bool:
+    return all(not lines[i - 1].strip() for i in range(start, end + 1))
 
-def chunk_text(path: str, text: str, max_lines: int = 200) -> List[Chunk]:
+
+def _attach_leading(lines: List[str], start: int, floor: int) -> int:
+    while start - 1 >= floor and _LEADING_LINE.match(lines[start - 2]):
+        start -= 1
+    return start
+
+
+def _python_spans(text: str, lines: List[str], max_lines: int) -> Optional[List[Span]]:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+    spans: List[Span] = []
+    _split_python_body(tree.body, 1, len(lines), "", lines, max_lines, spans)
+    return spans
+
+
+def _split_python_body(
+    nodes: List[ast.stmt], start: int, end: int, prefix: str, lines: List[str], max_lines: int, spans: List[Span]
+) -> None:
+    cursor = start
+    residual_symbols: List[str] = [prefix.rstrip(".")] if prefix else []
+    for node in nodes:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        node_start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+        node_start = _attach_leading(lines, node_start, cursor)
+        node_end = node.end_lineno or node.lineno
+        if node_start > cursor and not _is_blank(lines, cursor, node_start - 1):
+            spans.extend(_windows(cursor, node_start - 1, max_lines, residual_symbols))
+        name = prefix + node.name
+        if node_end - node_start + 1 <= max_lines:
+            spans.append((node_start, node_end, [name]))
+        elif any(isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) for child in node.body):
+            _split_python_body(node.body, node_start, node_end, name + ".", lines, max_lines, spans)
+        else:
+            spans.extend(_windows(node_start, node_end, max_lines, [name]))
+        cursor = node_end + 1
+    if cursor <= end and not _is_blank(lines, cursor, end):
+        spans.extend(_windows(cursor, end, max_lines, residual_symbols))
+
+
+def _pattern_spans(pattern: "re.Pattern[str]", lines: List[str], max_lines: int) -> List[Span]:
+    boundaries: List[Tuple[int, List[str]]] = []
+    for number, line in enumerate(lines, 1):
+        match = pattern.match(line)
+        if match:
+            boundaries.append((number, [name for name in match.groups() if name]))
+    spans: List[Span] = []
+    cursor = 1
+    for index, (number, symbols) in enumerate(boundaries):
+        start = _attach_leading(lines, number, cursor)
+        if start > cursor and not _is_blank(lines, cursor, start - 1):
+            spans.extend(_windows(cursor, start - 1, max_lines, []))
+        end = boundaries[index + 1][0] - 1 if index + 1 < len(boundaries) else len(lines)
+        next_start = _attach_leading(lines, end + 1, start + 1) if end < len(lines) else end + 1
+        end = next_start - 1
+        spans.extend(_windows(start, end, max_lines, symbols))
+        cursor = end + 1
+    if cursor <= len(lines) and not _is_blank(lines, cursor, len(lines)):
+        spans.extend(_windows(cursor, len(lines), max_lines, []))
+    return spans
+
+
+def chunk_text(path: str, text: str, max_lines: int = 200, overlap: Optional[int] = None) -> List[Chunk]:
+    """Split a file into chunks along definitions where the language allows it.
+
+    Python is split on (nested) ``def``/``class`` boundaries via ``ast``;
+    JS/TS, Go and Rust on top-level definitions matched line by line; other
+    files, or sources that fail to parse, fall back to fixed windows. Each
+    chunk after the first is extended backwards by ``overlap`` lines of
+    context; spans are cut ``overlap`` lines shorter to make room, so no
+    chunk exceeds ``max_lines``.
+    """
     lines = text.splitlines()
+    if not lines:
+        return []
+    language = path.rsplit(".", 1)[-1] if "." in path else "text"
+    max_lines = max(1, max_lines)
+    overlap = min(default_overlap() if overlap is None else overlap, max_lines - 1)
+    span_lines = max_lines - overlap
+    spans: Optional[List[Span]] = None
+    if language == "py":
+        spans = _python_spans(text, lines, span_lines)
+    elif language in BOUNDARY_PATTERNS:
+        spans = _pattern_spans(BOUNDARY_PATTERNS[language], lines, span_lines)
+    if spans is None:
+        spans = _windows(1, len(lines), span_lines, [])
+
     chunks = []
-    for i in range(0, len(lines), max_lines):
-        start = i + 1
-        end = min(i + max_lines, len(lines))
-        chunk_text = "\n".join(lines[i:end])
-        language = path.rsplit(".", 1)[-1] if "." in path else "text"
-        chunks.append(Chunk(path=path, start_line=start, end_line=end, text=chunk_text, language=language))
+    for index, (start, end, symbols) in enumerate(spans):
+        if index and overlap:
+            start = max(1, start - overlap)
+        chunk_text = "\n".join(lines[start - 1:end])
+        chunks.append(
+            Chunk(
+                path=path,
+                start_line=start,
+                end_line=end,
+                text=chunk_text,
+                language=language,
+                symbols=symbols,
+                content_hash=content_hash(chunk_text),
+            )
+        )
     return chunks
@@ -1,6 +1,17 @@
-import math
+import os
 import re
-from typing import List
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app.rag.chunker import content_hash
+from app.telemetry.metrics import metrics
 
 VECTOR_SIZE = 256
 TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]+")
@@ -10,13 +21,161 @@ def _tokenize(text: str) -> List[str]:
     return [token.lower() for token in TOKEN_RE.findall(text)]
 
 
-def embed(texts: List[str]) -> List[List[float]]:
-    vectors = []
-    for text in texts:
-        counts = [0.0] * VECTOR_SIZE
-        for token in _tokenize(text):
-            idx = hash(token) % VECTOR_SIZE
-            counts[idx] += 1.0
-        norm = math.sqrt(sum(value * value for value in counts)) or 1.0
-        vectors.append([value / norm for value in counts])
+@lru_cache(maxsize=1 << 16)
+def _bucket(token: str) -> int:
+    # crc32 is stable across processes, unlike the salted builtin hash().
+    return zlib.crc32(token.encode("utf-8")) % VECTOR_SIZE
+
+
+class Embedder(ABC):
+    """Turns texts into an ``(n, dim)`` float32 matrix of L2-normalized rows."""
+
+    name = "base"
+    dim = VECTOR_SIZE
+    # Whether vectors are worth persisting in the embedding cache.
+    cacheable = True
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder(Embedder):
+    """Hashed bag-of-words over identifier tokens."""
+
+    name = "hashing-crc32-256"
+    dim = VECTOR_SIZE
+    cacheable = False
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        flat: List[int] = []
+        for row, text in enumerate(texts):
+            base = row * self.dim
+            flat.extend(base + _bucket(token) for token in _tokenize(text))
+        counts = np.bincount(np.asarray(flat, dtype=np.int64), minlength=len(texts) * self.dim)
+        matrix = counts.astype(np.float32).reshape(len(texts), self.dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Local sentence-transformers model; needs the optional package installed."""
+
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as exc:
+            raise RuntimeError("sentence-transformers is not installed") from exc
+        self._model = SentenceTransformer(model_name)
+        self.name = f"sentence-transformers:{model_name}"
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self._model.encode(list(texts), batch_size=64, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+
+
+class EmbeddingCache:
+    """SQLite table of vectors keyed by (embedder, content hash).
+
+    Lives directly under ``AGENT_DATA_DIR`` so it is shared by every rebuild
+    and workspace.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (embedder TEXT, content_hash TEXT, vector BLOB, "
+            "PRIMARY KEY (embedder, content_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, embedder: str, hashes: Sequence[str], dim: int) -> dict:
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                batch = list(hashes[start:start + 500])
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings WHERE embedder = ? AND content_hash IN ({placeholders})",
+                    [embedder, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    if vector.shape == (dim,):
+                        found[key] = vector
+        return found
+
+    def put_many(self, embedder: str, hashes: Sequence[str], vectors: np.ndarray) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (embedder, content_hash, vector) VALUES (?, ?, ?)",
+                [(embedder, key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in zip(hashes, vectors)],
+            )
+            self._conn.commit()
+
+
+def _create_embedder(spec: str) -> Embedder:
+    if spec in {"", "hashing"}:
+        return HashingEmbedder()
+    if spec.startswith("sentence-transformers:"):
+        return SentenceTransformerEmbedder(spec.split(":", 1)[1])
+    raise ValueError(f"Unknown embedder: {spec}")
+
+
+_embedders: dict = {}
+_caches: dict = {}
+_registry_lock = threading.Lock()
+
+
+def get_embedder() -> Embedder:
+    spec = os.getenv("RAG_EMBEDDER", "hashing")
+    with _registry_lock:
+        if spec not in _embedders:
+            _embedders[spec] = _create_embedder(spec)
+        return _embedders[spec]
+
+
+def _get_cache(embedder: Embedder) -> Optional[EmbeddingCache]:
+    setting = os.getenv("RAG_EMBED_CACHE", "auto").lower()
+    if setting in {"0", "false", "off", "no"} or (setting == "auto" and not embedder.cacheable):
+        return None
+    path = os.path.join(os.getenv("AGENT_DATA_DIR", "/agent_data"), "embedding_cache.db")
+    with _registry_lock:
+        if path not in _caches:
+            _caches[path] = EmbeddingCache(path)
+        return _caches[path]
+
+
+def embed(texts: Sequence[str], hashes: Optional[Sequence[str]] = None) -> np.ndarray:
+    """Embed a batch with the configured backend, reusing cached vectors.
+
+    ``hashes`` are content hashes of ``texts`` when the caller already has
+    them; otherwise they are computed on demand for the cache lookup.
+    """
+    embedder = get_embedder()
+    started = time.perf_counter()
+    cache = _get_cache(embedder) if texts else None
+    if cache is None:
+        vectors = embedder.embed(texts)
+    else:
+        keys = list(hashes) if hashes is not None else [content_hash(text) for text in texts]
+        cached = cache.get_many(embedder.name, keys, embedder.dim)
+        missing = [idx for idx, key in enumerate(keys) if key not in cached]
+        vectors = np.empty((len(texts), embedder.dim), dtype=np.float32)
+        if missing:
+            fresh = embedder.embed([texts[idx] for idx in missing])
+            vectors[missing] = fresh
+            cache.put_many(embedder.name, [keys[idx] for idx in missing], fresh)
+        for idx, key in enumerate(keys):
+            if key in cached:
+                vectors[idx] = cached[key]
+        metrics.incr("embed.cache_hits", len(texts) - len(missing))
+        metrics.incr("embed.cache_misses", len(missing))
+    metrics.observe("embed.batch_size", len(texts))
+    metrics.observe("embed.latency_ms", (time.perf_counter() - started) * 1000)
     return vectors
@@ -0,0 +1,98 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.rag.vector_store import CURRENT_FILE, VectorStore
+
+Stamp = Tuple[int, int, int]
+
+
+def default_budget_bytes() -> int:
+    return int(os.getenv("RAG_INDEX_CACHE_MB", "2048")) * 1024 * 1024
+
+
+class IndexCache:
+    """Registry of loaded ``VectorStore``s, one per index directory.
+
+    A cached store is reused until the ``CURRENT`` generation pointer on disk
+    changes (new inode or mtime after a rebuild) or ``invalidate()`` drops it.
+    Stores are kept in LRU order and the least recently used ones are evicted
+    once their combined ``nbytes`` exceed ``budget_bytes``; the most recently
+    used store always stays. Loaded stores are read-only, so concurrent
+    queries share them without locking and an evicted store stays valid for
+    readers still holding it; the lock only guards the registry itself.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None) -> None:
+        self._lock = threading.Lock()
+        self._stores: "OrderedDict[str, Tuple[Stamp, VectorStore]]" = OrderedDict()
+        self.budget_bytes = budget_bytes
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def get(self, path: str) -> VectorStore:
+        stamp = self._read_stamp(path)
+        with self._lock:
+            cached = self._stores.get(path)
+            if cached is not None and cached[0] == stamp:
+                self.hits += 1
+                self._stores.move_to_end(path)
+                return cached[1]
+            if cached is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+            store = VectorStore(path)
+            store.load()
+            self._stores[path] = (stamp, store)
+            self._stores.move_to_end(path)
+            self._evict()
+            return store
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Forget ``path``, or every cached store when no path is given."""
+        with self._lock:
+            if path is None:
+                self.generation += 1
+            else:
+                self._stores.pop(path, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stores = {path: store for path, (_, store) in self._stores.items()}
+        return {
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "evictions": self.evictions,
+            "budget_bytes": self._budget(),
+            "chunks": sum(len(store) for store in stores.values()),
+            "bytes": sum(store.nbytes for store in stores.values()),
+            "indexes": {path: {"chunks": len(store), "bytes": store.nbytes} for path, store in stores.items()},
+        }
+
+    def _budget(self) -> int:
+        return self.budget_bytes if self.budget_bytes is not None else default_budget_bytes()
+
+    def _evict(self) -> None:
+        budget = self._budget()
+        total = sum(store.nbytes for _, store in self._stores.values())
+        while total > budget and len(self._stores) > 1:
+            _, (_, store) = self._stores.popitem(last=False)
+            total -= store.nbytes
+            self.evictions += 1
+
+    def _read_stamp(self, path: str) -> Stamp:
+        try:
+            stat = os.stat(os.path.join(path, CURRENT_FILE))
+        except FileNotFoundError:
+            return (self.generation, 0, 0)
+        return (self.generation, stat.st_ino, stat.st_mtime_ns)
+
+
+index_cache = IndexCache()
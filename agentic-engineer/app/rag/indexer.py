@@ -1,50 +1,350 @@
-import fnmatch
+import json
 import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Tuple
+from typing import Any, Callable, Dict, List, Optional
 
-from app.rag.chunker import chunk_text
-from app.rag.embedder import embed
-from app.rag.vector_store import VectorEntry, VectorStore
+from app.rag.ann import ann_min_chunks, build_ivf, remap_from_copies
+from app.rag.chunker import CHUNKER_VERSION, Chunk, default_overlap
+from app.rag.embedder import embed, get_embedder
+from app.rag.index_cache import index_cache
+from app.rag.lexical import LexicalBuilder
+from app.rag.namespaces import index_path
+from app.rag.pipeline import blob_hash, chunk_files, default_batch_size, default_workers
+from app.rag.vector_store import IndexWriter, VectorEntry, VectorStore
+from app.tools.git_tools import clean_blob_hashes
+from app.tools.walker import walk_files
 
+MANIFEST_FILE = "manifest.json"
+# Below this many files a process pool costs more to start than it saves.
+MIN_PARALLEL_FILES = 64
+PROGRESS_INTERVAL_SEC = 0.5
+# How often a build waiting for another build of its namespace checks for cancellation.
+LOCK_POLL_SEC = 0.1
+# Batches of chunks waiting for the embedding stage; chunking blocks beyond this.
+EMBED_QUEUE_BATCHES = 2
 
-def _index_path() -> str:
-    base = os.getenv("AGENT_DATA_DIR", "/agent_data")
-    return os.path.join(base, "rag_index.json")
+ProgressCallback = Callable[[Dict[str, Any]], None]
 
+_build_locks: Dict[str, threading.Lock] = {}
+_build_locks_guard = threading.Lock()
 
-def build_index(root: str, include_glob: List[str], exclude_glob: List[str]) -> Tuple[int, int]:
+
+class IndexBuildCancelled(Exception):
+    pass
+
+
+@dataclass
+class BuildResult:
+    indexed_files: int
+    chunks: int
+    changed_files: int
+    removed_files: int
+    duration_ms: int = 0
+    files_per_sec: float = 0.0
+    chunks_per_sec: float = 0.0
+
+
+def _load_manifest(store: VectorStore, settings: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    if store.build_id is None or store.embedder != settings["embedder"] or (store.count and store.lexical is None):
+        return {}
+    path = os.path.join(store.generation_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as handle:
+        manifest = json.load(handle)
+    if manifest.get("build_id") != store.build_id or manifest.get("settings") != settings:
+        return {}
+    return manifest["files"]
+
+
+def _write_manifest(store: VectorStore, payload: Dict[str, Any]) -> None:
+    path = os.path.join(store.generation_path, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as handle:
+        json.dump({"build_id": store.build_id, **payload}, handle, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+class _ProgressReporter:
+    def __init__(self, callback: Optional[ProgressCallback], cancel: Optional[threading.Event]):
+        self.callback = callback
+        self.cancel = cancel
+        self._last = 0.0
+
+    def update(self, force: bool = False, **fields: Any) -> None:
+        if self.cancel is not None and self.cancel.is_set():
+            raise IndexBuildCancelled()
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last >= PROGRESS_INTERVAL_SEC:
+            self._last = now
+            self.callback(fields)
+
+
+def _write_entries(writer: IndexWriter, lexical: LexicalBuilder, chunks: List[Chunk]) -> None:
+    vectors = embed([chunk.text for chunk in chunks], [chunk.content_hash for chunk in chunks])
+    for chunk, vector in zip(chunks, vectors):
+        lexical.add(writer.count, chunk.text)
+        writer.add(
+            VectorEntry(
+                path=chunk.path,
+                start_line=chunk.start_line,
+                end_line=chunk.end_line,
+                language=chunk.language,
+                text=chunk.text,
+                vector=vector,
+                symbols=chunk.symbols,
+            )
+        )
+
+
+class _EmbedStage:
+    """Embeds and appends batches of chunks on its own thread, in order.
+
+    Chunking keeps going while a batch is being embedded; at most
+    ``EMBED_QUEUE_BATCHES`` batches wait, so memory stays bounded when the
+    embedder is the slower side. An error in the stage is raised from the
+    next ``put`` or from ``close``.
+    """
+
+    def __init__(self, writer: IndexWriter, lexical: LexicalBuilder) -> None:
+        self.writer = writer
+        self.lexical = lexical
+        self._queue: "queue.Queue[Optional[List[Chunk]]]" = queue.Queue(maxsize=EMBED_QUEUE_BATCHES)
+        self._error: Optional[BaseException] = None
+        self._aborted = False
+        self._thread = threading.Thread(target=self._run, name="index-embed", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            chunks = self._queue.get()
+            if chunks is None:
+                return
+            if self._error is None and not self._aborted:
+                try:
+                    _write_entries(self.writer, self.lexical, chunks)
+                except BaseException as exc:
+                    self._error = exc
+
+    def put(self, chunks: List[Chunk]) -> None:
+        self._raise()
+        if chunks:
+            self._queue.put(chunks)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self._raise()
+
+    def abort(self) -> None:
+        """Stop without embedding the batches still queued."""
+        self._aborted = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _raise(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+
+def build_index(
+    root: str,
+    include_glob: List[str],
+    exclude_glob: List[str],
+    incremental: bool = True,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    progress: Optional[ProgressCallback] = None,
+    cancel: Optional[threading.Event] = None,
+    namespace: Optional[str] = None,
+    on_start: Optional[Callable[[], None]] = None,
+) -> BuildResult:
+    """Index ``root`` into the RAG store of ``namespace``.
+
+    In incremental mode a per-file manifest (size, mtime, content hash and row
+    range) from the previous build is reused: unchanged files have their rows
+    copied over verbatim and only added or modified files are re-embedded.
+    Changed files are read and chunked by a pool of ``workers`` processes,
+    embedded in batches of ``batch_size`` chunks and appended by this thread.
+
+    ``progress`` receives throttled snapshots (phase, files scanned, chunks
+    embedded, ETA). Setting ``cancel`` aborts the build with
+    ``IndexBuildCancelled`` and leaves the published index untouched. Builds
+    of one namespace are serialized, different namespaces build concurrently;
+    ``on_start`` is called once this build holds its namespace, and ``cancel``
+    is honoured while waiting. Queries keep using the previous generation
+    until the new one is committed.
+    """
+    path = index_path(namespace)
+    lock = _build_lock(path)
+    while not lock.acquire(timeout=LOCK_POLL_SEC):
+        if cancel is not None and cancel.is_set():
+            raise IndexBuildCancelled()
+    try:
+        if on_start:
+            on_start()
+        reporter = _ProgressReporter(progress, cancel)
+        return _build_index(path, root, include_glob, exclude_glob, incremental, workers, batch_size, reporter)
+    finally:
+        lock.release()
+
+
+def _build_lock(path: str) -> threading.Lock:
+    with _build_locks_guard:
+        return _build_locks.setdefault(path, threading.Lock())
+
+
+def _build_index(
+    path: str,
+    root: str,
+    include_glob: List[str],
+    exclude_glob: List[str],
+    incremental: bool,
+    workers: Optional[int],
+    batch_size: Optional[int],
+    reporter: _ProgressReporter,
+) -> BuildResult:
+    started = time.monotonic()
+    workers = workers or default_workers()
+    batch_size = batch_size or default_batch_size()
     root_path = Path(root)
-    files: List[Path] = []
-    for path in root_path.rglob("*"):
-        if not path.is_file():
-            continue
-        rel = str(path.relative_to(root_path))
-        if exclude_glob and any(fnmatch.fnmatch(rel, pattern) for pattern in exclude_glob):
-            continue
-        if include_glob and not any(fnmatch.fnmatch(rel, pattern) for pattern in include_glob):
-            continue
-        files.append(path)
-
-    entries: List[VectorEntry] = []
-    for file_path in files:
-        try:
-            content = file_path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            continue
-        chunks = chunk_text(str(file_path), content)
-        vectors = embed([chunk.text for chunk in chunks])
-        for chunk, vector in zip(chunks, vectors):
-            entries.append(
-                VectorEntry(
-                    path=chunk.path,
-                    start_line=chunk.start_line,
-                    end_line=chunk.end_line,
-                    language=chunk.language,
-                    text=chunk.text,
-                    vector=vector,
-                )
+    embedder = get_embedder()
+    settings = {
+        "root": str(root_path.resolve()),
+        "include_glob": include_glob,
+        "exclude_glob": exclude_glob,
+        "embedder": embedder.name,
+        "chunker": CHUNKER_VERSION,
+        "chunk_overlap": default_overlap(),
+    }
+    files = []
+    for entry in walk_files(root, include_glob, exclude_glob):
+        files.append(entry)
+        reporter.update(phase="scanning", files_scanned=len(files))
+    reporter.update(force=True, phase="scanning", files_scanned=len(files))
+    old_store = VectorStore(path)
+    try:
+        old_store.load()
+    except ValueError:
+        # Index written in an older on-disk format: rebuild it from scratch.
+        old_store = VectorStore(path)
+    old_files = _load_manifest(old_store, settings) if incremental else {}
+    git_hashes = clean_blob_hashes(root) if old_files else {}
+
+    # Only metadata is kept per file: contents read for hashing are dropped
+    # and read again by the chunking workers, so memory does not grow with
+    # the size of the change.
+    plan: List[tuple[Path, str, Dict[str, Any]]] = []
+    changed = 0
+    for entry in files:
+        file_path, rel = root_path / entry.rel_path, entry.rel_path
+        previous = old_files.get(rel)
+        content_hash = None
+        if previous and previous["size"] == entry.size and previous["mtime_ns"] == entry.mtime_ns:
+            content_hash = previous["hash"]
+        elif previous:
+            content_hash = git_hashes.get(rel)
+            if content_hash is None:
+                content_hash = blob_hash(file_path.read_bytes())
+        if not previous or previous["hash"] != content_hash:
+            changed += 1
+        plan.append((file_path, rel, {"size": entry.size, "mtime_ns": entry.mtime_ns, "hash": content_hash}))
+        reporter.update(phase="planning", files_scanned=len(files), files_planned=len(plan))
+    removed = len(set(old_files) - {rel for _, rel, _ in plan})
+
+    if old_files and not changed and not removed:
+        if any(old_files[rel]["mtime_ns"] != record["mtime_ns"] for _, rel, record in plan):
+            manifest = {rel: {**old_files[rel], **record} for _, rel, record in plan}
+            _write_manifest(old_store, {"settings": settings, "files": manifest})
+        return BuildResult(
+            indexed_files=len(files),
+            chunks=len(old_store),
+            changed_files=0,
+            removed_files=0,
+            duration_ms=int((time.monotonic() - started) * 1000),
+        )
+
+    writer = IndexWriter(path, embedder.dim, embedder=embedder.name)
+    manifest: Dict[str, Dict[str, Any]] = {}
+    to_embed: List[tuple[Path, str, Dict[str, Any]]] = []
+    copies: List[tuple[int, int, int]] = []
+    lexical = LexicalBuilder()
+    embedded_chunks = 0
+    stage: Optional[_EmbedStage] = None
+    try:
+        for file_path, rel, record in plan:
+            previous = old_files.get(rel)
+            if previous and previous["hash"] == record["hash"]:
+                start = writer.count
+                writer.copy_rows(old_store, previous["row"], previous["row"] + previous["rows"])
+                copies.append((previous["row"], start, previous["rows"]))
+                manifest[rel] = {**record, "row": start, "rows": writer.count - start}
+            else:
+                to_embed.append((file_path, rel, record))
+        del plan
+
+        pending: List[Chunk] = []
+        # The stage owns the writer from here on, so rows are numbered here.
+        next_row = writer.count
+        stage = _EmbedStage(writer, lexical)
+        pool_size = workers if len(to_embed) >= MIN_PARALLEL_FILES else 1
+        jobs = ((str(file_path), None) for file_path, _, _ in to_embed)
+        embed_started = time.monotonic()
+        for done, ((_, rel, record), (content_hash, chunks)) in enumerate(zip(to_embed, chunk_files(jobs, pool_size)), 1):
+            manifest[rel] = {**record, "hash": content_hash, "row": next_row, "rows": len(chunks)}
+            next_row += len(chunks)
+            pending.extend(chunks)
+            embedded_chunks += len(chunks)
+            if len(pending) >= batch_size:
+                stage.put(pending)
+                pending = []
+            rate = done / max(time.monotonic() - embed_started, 1e-9)
+            reporter.update(
+                phase="embedding",
+                files_scanned=len(files),
+                files_embedded=done,
+                files_to_embed=len(to_embed),
+                chunks_embedded=embedded_chunks,
+                eta_sec=round((len(to_embed) - done) / rate, 1),
             )
-    store = VectorStore(_index_path())
-    store.upsert(entries)
-    return len(files), len(entries)
+        stage.put(pending)
+        stage.close()
+        stage = None
+        reporter.update(
+            force=True,
+            phase="committing",
+            files_scanned=len(files),
+            files_embedded=len(to_embed),
+            files_to_embed=len(to_embed),
+            chunks_embedded=embedded_chunks,
+            eta_sec=0.0,
+        )
+        old_to_new = remap_from_copies(old_store.count, copies) if old_files else None
+        if old_to_new is not None and old_store.lexical is not None:
+            lexical.reuse(old_store.lexical, old_to_new)
+        lexical.save(writer.generation_path, writer.count)
+        if writer.count >= ann_min_chunks():
+            previous_ann = old_store.ann if old_to_new is not None else None
+            build_ivf(writer.written_vectors(), previous_ann, old_to_new).save(writer.generation_path)
+    except BaseException:
+        if stage is not None:
+            stage.abort()
+        writer.abort()
+        raise
+    writer.commit({MANIFEST_FILE: {"settings": settings, "files": manifest}})
+    index_cache.invalidate(path)
+    elapsed = max(time.monotonic() - started, 1e-9)
+    return BuildResult(
+        indexed_files=len(files),
+        chunks=writer.count,
+        changed_files=changed,
+        removed_files=removed,
+        duration_ms=int(elapsed * 1000),
+        files_per_sec=round(len(files) / elapsed, 1),
+        chunks_per_sec=round(embedded_chunks / elapsed, 1),
+    )
@@ -0,0 +1,126 @@
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.rag.indexer import IndexBuildCancelled, build_index
+from app.rag.namespaces import resolve_namespace
+from app.telemetry.logger import log_event
+
+JobPublisher = Optional[Callable[[str, str, Dict[str, Any]], None]]
+
+MAX_TRACKED_JOBS = 100
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+@dataclass
+class IndexJob:
+    id: str
+    root: str
+    namespace: str
+    status: str = "queued"
+    progress: Dict[str, Any] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str = field(default_factory=_now)
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__dataclass_fields__ if name != "cancel_event"}
+
+
+class IndexJobManager:
+    """Runs index rebuilds on background threads and tracks recent jobs.
+
+    A job is ``waiting`` while another build of its namespace holds it and
+    ``running`` once its own build starts.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, IndexJob]" = OrderedDict()
+
+    def submit(
+        self,
+        root: str,
+        include_glob: List[str],
+        exclude_glob: List[str],
+        incremental: bool = True,
+        publish: JobPublisher = None,
+        namespace: Optional[str] = None,
+    ) -> IndexJob:
+        """Start a rebuild; ``publish(job_id, event_type, payload)`` receives its events."""
+        job = IndexJob(id=str(uuid.uuid4()), root=root, namespace=resolve_namespace(namespace))
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > MAX_TRACKED_JOBS:
+                self._jobs.popitem(last=False)
+        thread = threading.Thread(target=self._run, args=(job, include_glob, exclude_glob, incremental, publish))
+        thread.daemon = True
+        thread.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IndexJob]:
+        job = self.get(job_id)
+        if job and job.status in {"queued", "waiting", "running"}:
+            job.cancel_event.set()
+        return job
+
+    def _run(
+        self,
+        job: IndexJob,
+        include_glob: List[str],
+        exclude_glob: List[str],
+        incremental: bool,
+        publish: JobPublisher,
+    ) -> None:
+        def emit(event_type: str, payload: Dict[str, Any]) -> None:
+            if publish:
+                publish(job.id, event_type, payload)
+
+        def on_progress(snapshot: Dict[str, Any]) -> None:
+            job.progress = snapshot
+            emit("index_progress", {"job_id": job.id, **snapshot})
+
+        def on_start() -> None:
+            job.status = "running"
+            job.started_at = _now()
+            emit("index_job_started", {"job_id": job.id, "root": job.root, "namespace": job.namespace})
+
+        job.status = "waiting"
+        try:
+            result = build_index(
+                job.root,
+                include_glob,
+                exclude_glob,
+                incremental=incremental,
+                progress=on_progress,
+                cancel=job.cancel_event,
+                namespace=job.namespace,
+                on_start=on_start,
+            )
+            status, result_dict, error = "succeeded", asdict(result), None
+        except IndexBuildCancelled:
+            status, result_dict, error = "cancelled", None, None
+        except Exception as exc:
+            status, result_dict, error = "failed", None, str(exc)
+        log_event("index_job_finished", {"job_id": job.id, "status": status, "error": error})
+        emit("index_job_finished", {"job_id": job.id, "status": status, "result": result_dict, "error": error})
+        # Publish the final state only after the event, so a poller that sees
+        # the job finished has also seen its last event.
+        job.result, job.error, job.finished_at = result_dict, error, _now()
+        job.status = status
+
+
+index_jobs = IndexJobManager()
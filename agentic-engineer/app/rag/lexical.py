@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.rag.embedder import TOKEN_RE
+
+META_FILE = "lex.json"
+TERMS_FILE = "lex_terms.u64"
+OFFSETS_FILE = "lex_offsets.i64"
+DOCS_FILE = "lex_docs.i32"
+TFS_FILE = "lex_tfs.u16"
+DOCLEN_FILE = "lex_doclen.u32"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_SUBWORD_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Identifier tokens, lowercased, plus their snake/camel-case parts."""
+    terms = []
+    for token in TOKEN_RE.findall(text):
+        terms.append(token.lower())
+        parts = [part.lower() for piece in token.split("_") for part in _SUBWORD_RE.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if len(part) > 1)
+    return terms
+
+
+@lru_cache(maxsize=1 << 17)
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _memmap(path: str, dtype: np.dtype) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class LexicalIndex:
+    """BM25 over an inverted index of memory-mapped, term-hash-sorted postings.
+
+    A term is located with a binary search over ``lex_terms.u64``; its
+    postings are the ``[offsets[i], offsets[i + 1])`` slice of the doc-id and
+    term-frequency arrays, so a lookup never scans the corpus.
+    """
+
+    def __init__(
+        self,
+        terms: np.ndarray,
+        offsets: np.ndarray,
+        docs: np.ndarray,
+        tfs: np.ndarray,
+        doclen: np.ndarray,
+        avgdl: float,
+    ):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doclen = doclen
+        self.count = len(doclen)
+        self.avgdl = avgdl
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LexicalIndex"]:
+        """Map the index files; None if there is no index or it predates the stored ``avgdl``."""
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as handle:
+            meta = json.load(handle)
+        if "avgdl" not in meta:
+            return None
+        return cls(
+            _memmap(os.path.join(path, TERMS_FILE), np.uint64),
+            _memmap(os.path.join(path, OFFSETS_FILE), np.int64),
+            _memmap(os.path.join(path, DOCS_FILE), np.int32),
+            _memmap(os.path.join(path, TFS_FILE), np.uint16),
+            _memmap(os.path.join(path, DOCLEN_FILE), np.uint32),
+            meta["avgdl"],
+        )
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        key = np.uint64(term_hash(term))
+        pos = int(np.searchsorted(self.terms, key))
+        if pos >= len(self.terms) or self.terms[pos] != key:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16)
+        start, end = int(self.offsets[pos]), int(self.offsets[pos + 1])
+        return self.docs[start:end], self.tfs[start:end]
+
+    def search(self, query: str, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        doc_parts, score_parts = [], []
+        for term, query_tf in Counter(tokenize(query)).items():
+            docs, tfs = self.postings(term)
+            if not len(docs):
+                continue
+            idf = np.log(1.0 + (self.count - len(docs) + 0.5) / (len(docs) + 0.5))
+            tf = tfs.astype(np.float32)
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doclen[docs] / (self.avgdl or 1.0))
+            doc_parts.append(np.asarray(docs, dtype=np.int64))
+            score_parts.append(query_tf * idf * tf * (BM25_K1 + 1.0) / (tf + norm))
+        if not doc_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+        top_k = min(top_k, len(docs))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.lexsort((docs[best], -scores[best]))]
+        return docs[best], scores[best]
+
+
+class LexicalBuilder:
+    """Collects postings for a new generation, reusing the previous one's."""
+
+    def __init__(self) -> None:
+        self._terms: List[np.ndarray] = []
+        self._docs: List[np.ndarray] = []
+        self._tfs: List[np.ndarray] = []
+        self._doclen: Dict[int, int] = {}
+        self._previous: Optional[Tuple[LexicalIndex, np.ndarray]] = None
+
+    def add(self, row: int, text: str) -> None:
+        counts = Counter(tokenize(text))
+        self._doclen[row] = sum(counts.values())
+        if not counts:
+            return
+        self._terms.append(np.fromiter((term_hash(term) for term in counts), dtype=np.uint64, count=len(counts)))
+        self._docs.append(np.full(len(counts), row, dtype=np.int32))
+        self._tfs.append(np.minimum(np.fromiter(counts.values(), dtype=np.int64, count=len(counts)), 65535).astype(np.uint16))
+
+    def reuse(self, previous: LexicalIndex, old_to_new: np.ndarray) -> None:
+        """Carry postings of surviving rows over; rows mapped to -1 are dropped."""
+        self._previous = (previous, old_to_new)
+
+    def save(self, path: str, count: int) -> None:
+        doclen = np.zeros(count, dtype=np.uint32)
+        terms, docs, tfs = list(self._terms), list(self._docs), list(self._tfs)
+        if self._previous is not None:
+            previous, old_to_new = self._previous
+            mapped = old_to_new[np.asarray(previous.docs, dtype=np.int64)]
+            keep = mapped >= 0
+            terms.append(np.repeat(np.asarray(previous.terms), np.diff(previous.offsets))[keep])
+            docs.append(mapped[keep].astype(np.int32))
+            tfs.append(np.asarray(previous.tfs)[keep])
+            survivors = old_to_new >= 0
+            doclen[old_to_new[survivors]] = np.asarray(previous.doclen)[survivors]
+        for row, length in self._doclen.items():
+            doclen[row] = length
+        all_terms = np.concatenate(terms) if terms else np.zeros(0, dtype=np.uint64)
+        all_docs = np.concatenate(docs) if docs else np.zeros(0, dtype=np.int32)
+        all_tfs = np.concatenate(tfs) if tfs else np.zeros(0, dtype=np.uint16)
+        order = np.lexsort((all_docs, all_terms))
+        all_terms, all_docs, all_tfs = all_terms[order], all_docs[order], all_tfs[order]
+        unique_terms, starts = np.unique(all_terms, return_index=True)
+        offsets = np.append(starts, len(all_terms)).astype(np.int64)
+        unique_terms.astype(np.uint64).tofile(os.path.join(path, TERMS_FILE))
+        offsets.tofile(os.path.join(path, OFFSETS_FILE))
+        all_docs.astype(np.int32).tofile(os.path.join(path, DOCS_FILE))
+        all_tfs.astype(np.uint16).tofile(os.path.join(path, TFS_FILE))
+        doclen.tofile(os.path.join(path, DOCLEN_FILE))
+        # Stored so loading an index never has to read every document length.
+        avgdl = float(doclen.mean()) if count else 0.0
+        with open(os.path.join(path, META_FILE), "w", encoding="utf-8") as handle:
+            json.dump({"count": count, "terms": len(unique_terms), "postings": len(all_terms), "avgdl": avgdl}, handle)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            scores[doc] = scores.get(doc, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import re
+import subprocess
+from typing import List, Optional
+
+DEFAULT_NAMESPACE = "default"
+# Workspace names, optionally pinned to a commit: ``my-repo`` or ``my-repo@3f2c1ab``.
+NAMESPACE_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9._@-]{0,127}")
+
+
+def _data_dir() -> str:
+    return os.getenv("AGENT_DATA_DIR", "/agent_data")
+
+
+def pin_commit_default() -> bool:
+    return os.getenv("RAG_PIN_COMMIT", "0").lower() in {"1", "true", "on", "yes"}
+
+
+def workspace_namespace(root: str, pin_commit: Optional[bool] = None) -> str:
+    """Namespace owned by the workspace at ``root``.
+
+    The directory name plus a hash of its resolved path, so two checkouts
+    with the same name stay apart; with ``pin_commit`` (``RAG_PIN_COMMIT``)
+    the short HEAD id is appended when ``root`` is in a git repository.
+    """
+    real = os.path.realpath(root)
+    name = re.sub(r"[^A-Za-z0-9._-]", "-", os.path.basename(real) or "root")[:96].lstrip(".-_") or "workspace"
+    namespace = f"{name}-{hashlib.blake2b(real.encode('utf-8', errors='surrogateescape'), digest_size=5).hexdigest()}"
+    if pin_commit_default() if pin_commit is None else pin_commit:
+        head = subprocess.run(["git", "rev-parse", "--short=12", "HEAD"], cwd=real, capture_output=True, text=True)
+        if head.returncode == 0 and head.stdout.strip():
+            namespace += "@" + head.stdout.strip()
+    return namespace
+
+
+def resolve_namespace(namespace: Optional[str] = None, workspace: Optional[str] = None) -> str:
+    """An explicit ``namespace``, else the one derived from ``workspace``, else the default."""
+    if not namespace:
+        namespace = workspace_namespace(workspace) if workspace else DEFAULT_NAMESPACE
+    if not NAMESPACE_RE.fullmatch(namespace):
+        raise ValueError(f"Invalid index namespace: {namespace!r}")
+    return namespace
+
+
+def index_path(namespace: Optional[str] = None) -> str:
+    """Directory of a namespace's index.
+
+    The default namespace keeps the historical ``rag_index`` location; every
+    other namespace lives under ``rag_indexes/<namespace>``.
+    """
+    namespace = resolve_namespace(namespace)
+    if namespace == DEFAULT_NAMESPACE:
+        return os.path.join(_data_dir(), "rag_index")
+    return os.path.join(_data_dir(), "rag_indexes", namespace)
+
+
+def list_namespaces() -> List[str]:
+    names = []
+    if os.path.isdir(index_path(DEFAULT_NAMESPACE)):
+        names.append(DEFAULT_NAMESPACE)
+    try:
+        names.extend(sorted(name for name in os.listdir(os.path.join(_data_dir(), "rag_indexes")) if NAMESPACE_RE.fullmatch(name)))
+    except FileNotFoundError:
+        pass
+    return names
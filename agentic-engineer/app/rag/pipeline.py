@@ -0,0 +1,64 @@
+import hashlib
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple
+
+from app.rag.chunker import Chunk, chunk_text
+
+FileJob = Tuple[str, Optional[bytes]]
+FileChunks = Tuple[str, List[Chunk]]
+
+
+def default_workers() -> int:
+    configured = os.getenv("RAG_INDEX_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def default_batch_size() -> int:
+    return max(1, int(os.getenv("RAG_EMBED_BATCH", "512")))
+
+
+def blob_hash(data: bytes) -> str:
+    # Same id git assigns to the blob, so clean tracked files can reuse it.
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def load_file(path: str, data: Optional[bytes] = None) -> FileChunks:
+    if data is None:
+        with open(path, "rb") as handle:
+            data = handle.read()
+    try:
+        content = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return blob_hash(data), []
+    return blob_hash(data), chunk_text(path, content)
+
+
+def chunk_files(jobs: Iterable[FileJob], workers: int) -> Iterator[FileChunks]:
+    """Read, hash and chunk files, yielding results in submission order.
+
+    With more than one worker the files are fanned out to a process pool.
+    At most ``2 * workers`` files are in flight, so a slow consumer (the
+    embedder/writer) applies backpressure instead of letting results pile up.
+    """
+    if workers <= 1:
+        for path, data in jobs:
+            yield load_file(path, data)
+        return
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    pending: Deque[Future] = deque()
+    try:
+        for path, data in jobs:
+            pending.append(pool.submit(load_file, path, data))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
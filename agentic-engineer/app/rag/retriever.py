@@ -1,28 +1,280 @@
+import base64
+import hashlib
+import json
 import os
-from typing import List
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
-from app.rag.embedder import embed
+from app.rag.ann import ann_min_chunks, default_nprobe, recall_report
+from app.rag.embedder import embed, get_embedder
+from app.rag.index_cache import index_cache
+from app.rag.lexical import reciprocal_rank_fusion, tokenize
+from app.rag.namespaces import index_path
 from app.rag.vector_store import VectorStore
 
+SEARCH_MODES = {"hybrid", "vector", "lexical"}
+# Each ranker contributes this many candidates per requested hit to fusion.
+FUSION_DEPTH = 4
+SNIPPET_LINE_CHARS = 240
 
-def _index_path() -> str:
-    base = os.getenv("AGENT_DATA_DIR", "/agent_data")
-    return os.path.join(base, "rag_index.json")
 
+def default_snippet_lines() -> int:
+    return int(os.getenv("RAG_SNIPPET_LINES", "12"))
 
-def query_index(query: str, top_k: int) -> List[dict]:
-    store = VectorStore(_index_path())
-    store.load()
-    vector = embed([query])[0]
+
+def snippet_window(text: str, start_line: int, query: str, max_lines: int) -> Dict[str, Any]:
+    """The ``max_lines`` window of ``text`` holding the most query terms.
+
+    Falls back to the head of the chunk when no line matches; long lines are
+    clipped to ``SNIPPET_LINE_CHARS``.
+    """
+    lines = text.splitlines()
+    max_lines = max(1, max_lines)
+    best = 0
+    if len(lines) > max_lines:
+        terms = set(tokenize(query))
+        weights = [len(terms.intersection(tokenize(line))) for line in lines]
+        score = best_score = sum(weights[:max_lines])
+        for offset in range(1, len(lines) - max_lines + 1):
+            score += weights[offset + max_lines - 1] - weights[offset - 1]
+            if score > best_score:
+                best, best_score = offset, score
+    window = lines[best:best + max_lines]
+    clipped = any(len(line) > SNIPPET_LINE_CHARS for line in window)
+    return {
+        "snippet": "\n".join(line[:SNIPPET_LINE_CHARS] for line in window),
+        "snippet_start_line": start_line + best,
+        "snippet_end_line": start_line + best + max(len(window), 1) - 1,
+        "truncated": clipped or len(window) < len(lines),
+    }
+
+
+def default_cursor_entries() -> int:
+    return int(os.getenv("RAG_CURSOR_ENTRIES", "256"))
+
+
+# (row, score, vector_score, lexical_score), best first.
+RankedRow = Tuple[int, float, Optional[float], Optional[float]]
+
+
+@dataclass
+class Ranking:
+    rows: List[RankedRow]
+    complete: bool
+
+
+class RankingCache:
+    """Rankings behind live query cursors, in LRU order up to ``max_entries``.
+
+    Later pages are sliced from the ranking the first page was cut from, so
+    paging neither repeats nor skips hits even though fusion and ANN probing
+    rank differently at different depths.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Ranking]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Ranking]:
+        with self._lock:
+            ranking = self._entries.get(key)
+            if ranking is not None:
+                self._entries.move_to_end(key)
+            return ranking
+
+    def put(self, key: str, ranking: Ranking) -> None:
+        max_entries = self.max_entries or default_cursor_entries()
+        with self._lock:
+            self._entries[key] = ranking
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+ranking_cache = RankingCache()
+
+
+def _query_key(store: VectorStore, query: str, mode: str, nprobe: Optional[int]) -> str:
+    material = json.dumps([store.path, store.generation, query, mode, nprobe])
+    return hashlib.blake2b(material.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _encode_cursor(generation: int, key: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{generation}:{key}:{offset}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, generation: int, key: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        cursor_generation, cursor_key, offset = raw.split(":")
+        cursor_generation, offset = int(cursor_generation), int(offset)
+    except ValueError as exc:
+        raise ValueError("Invalid cursor") from exc
+    if cursor_generation != generation:
+        raise ValueError("Cursor belongs to an older index generation; repeat the query")
+    if cursor_key != key:
+        raise ValueError("Cursor belongs to a different query, mode or namespace")
+    return offset
+
+
+def query_index(
+    query: str, top_k: int, nprobe: Optional[int] = None, mode: str = "hybrid", namespace: Optional[str] = None
+) -> List[dict]:
+    return query_page(query, top_k, nprobe=nprobe, mode=mode, namespace=namespace)["hits"]
+
+
+def query_page(
+    query: str,
+    top_k: int,
+    nprobe: Optional[int] = None,
+    mode: str = "hybrid",
+    namespace: Optional[str] = None,
+    cursor: Optional[str] = None,
+    snippet_lines: Optional[int] = None,
+) -> Dict[str, Any]:
+    """One page of hits plus ``next_cursor`` for the following page, if any.
+
+    A cursor only continues the query, mode, nprobe and namespace it came
+    from, and only while its ranking is still cached (``RAG_CURSOR_ENTRIES``);
+    otherwise it is rejected with ValueError.
+    """
+    store = index_cache.get(index_path(namespace))
+    mode, nprobe = _resolve_mode(store, mode, nprobe)
+    if top_k <= 0:
+        return {"hits": [], "next_cursor": None}
+    key = _query_key(store, query, mode, nprobe)
+    offset = 0
+    ranking = None
+    if cursor:
+        offset = _decode_cursor(cursor, store.generation, key)
+        ranking = ranking_cache.get(key)
+        if ranking is None or offset > len(ranking.rows):
+            raise ValueError("Cursor has expired; repeat the query")
+    # One extra candidate tells whether another page exists.
+    wanted = offset + top_k + 1
+    if ranking is None or (len(ranking.rows) < wanted and not ranking.complete):
+        rows = _rank(store, [query], wanted, nprobe, mode)[0]
+        if ranking is not None:
+            # Hits already served keep their places; the deeper ranking only
+            # decides what follows them.
+            served = {row for row, *_ in ranking.rows[:offset]}
+            rows = ranking.rows[:offset] + [ranked for ranked in rows if ranked[0] not in served]
+        ranking = Ranking(rows, len(rows) < wanted)
+        ranking_cache.put(key, ranking)
+    hits = _hits(store, query, ranking.rows[offset:offset + top_k], mode, snippet_lines)
+    more = len(ranking.rows) > offset + top_k
+    return {"hits": hits, "next_cursor": _encode_cursor(store.generation, key, offset + len(hits)) if more else None}
+
+
+def query_index_batch(
+    queries: List[str],
+    top_k: int,
+    nprobe: Optional[int] = None,
+    mode: str = "hybrid",
+    namespace: Optional[str] = None,
+    snippet_lines: Optional[int] = None,
+) -> List[List[dict]]:
+    store = index_cache.get(index_path(namespace))
+    mode, nprobe = _resolve_mode(store, mode, nprobe)
+    rankings = _rank(store, queries, top_k, nprobe, mode)
+    return [_hits(store, query, rows, mode, snippet_lines) for query, rows in zip(queries, rankings)]
+
+
+def _resolve_mode(store: VectorStore, mode: str, nprobe: Optional[int]) -> Tuple[str, Optional[int]]:
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    if store.lexical is None:
+        mode = "vector"
+    if mode != "lexical" and nprobe is None and store.ann is not None and store.count >= ann_min_chunks():
+        nprobe = default_nprobe()
+    return mode, nprobe
+
+
+def _rank(store: VectorStore, queries: List[str], wanted: int, nprobe: Optional[int], mode: str) -> List[List[RankedRow]]:
+    """The best ``wanted`` rows of ``store`` for each query.
+
+    ``mode`` selects ``hybrid`` (BM25 and vector rankings fused with
+    reciprocal rank fusion), ``vector`` or ``lexical`` ranking.
+    """
+    if not store.count or wanted <= 0:
+        return [[] for _ in queries]
+    depth = wanted * FUSION_DEPTH if mode == "hybrid" else wanted
+
+    vector_results = [None] * len(queries)
+    if mode != "lexical":
+        embedder = get_embedder()
+        if store.embedder != embedder.name:
+            raise ValueError(f"Index was built with embedder {store.embedder!r}, not {embedder.name!r}; rebuild it")
+        vector_results = store.search(embed(queries), depth, nprobe=nprobe)
+
+    rankings = []
+    for query, vector_result in zip(queries, vector_results):
+        vector_scores = dict(zip(vector_result[0].tolist(), vector_result[1].tolist())) if vector_result else {}
+        lexical_scores = {}
+        if mode != "vector":
+            docs, scores = store.lexical.search(query, depth)
+            lexical_scores = dict(zip(docs.tolist(), scores.tolist()))
+        if mode == "hybrid":
+            ranked = reciprocal_rank_fusion([list(vector_scores), list(lexical_scores)])[:wanted]
+            rankings.append([(row, score, vector_scores.get(row), lexical_scores.get(row)) for row, score in ranked])
+        else:
+            ranked = list((vector_scores or lexical_scores).items())[:wanted]
+            rankings.append([(row, score, None, None) for row, score in ranked])
+    return rankings
+
+
+def _hits(store: VectorStore, query: str, rows: List[RankedRow], mode: str, snippet_lines: Optional[int]) -> List[dict]:
+    """Hits for ranked ``rows``, each with a snippet window rather than the whole chunk.
+
+    The full text is available from ``fetch_chunk(hit["chunk_id"])``.
+    """
+    snippet_lines = snippet_lines or default_snippet_lines()
     hits = []
-    for score, entry in store.query(vector, top_k):
-        hits.append(
-            {
-                "path": entry.path,
-                "start_line": entry.start_line,
-                "end_line": entry.end_line,
-                "score": score,
-                "snippet": entry.text,
-            }
-        )
+    for row, score, vector_score, lexical_score in rows:
+        entry = store.entry(row)
+        hit = {
+            "chunk_id": f"{store.generation}:{row}",
+            "path": entry.path,
+            "start_line": entry.start_line,
+            "end_line": entry.end_line,
+            "score": score,
+            "symbols": entry.symbols,
+            **snippet_window(entry.text, entry.start_line, query, snippet_lines),
+        }
+        if mode == "hybrid":
+            hit["vector_score"] = vector_score
+            hit["lexical_score"] = lexical_score
+        hits.append(hit)
     return hits
+
+
+def fetch_chunk(chunk_id: str, namespace: Optional[str] = None) -> Dict[str, Any]:
+    """Full text of a hit, by the ``chunk_id`` a query returned."""
+    store = index_cache.get(index_path(namespace))
+    try:
+        generation, row = (int(part) for part in chunk_id.split(":"))
+    except ValueError as exc:
+        raise ValueError(f"Invalid chunk id: {chunk_id!r}") from exc
+    if generation != store.generation or not 0 <= row < store.count:
+        raise LookupError(f"Chunk {chunk_id} is not in the current index; repeat the query")
+    entry = store.entry(row)
+    return {
+        "chunk_id": chunk_id,
+        "path": entry.path,
+        "start_line": entry.start_line,
+        "end_line": entry.end_line,
+        "language": entry.language,
+        "symbols": entry.symbols,
+        "text": entry.text,
+    }
+
+
+def ann_recall(top_k: int = 10, samples: int = 100, namespace: Optional[str] = None) -> Dict[str, Any]:
+    return recall_report(index_cache.get(index_path(namespace)), top_k=top_k, samples=samples)
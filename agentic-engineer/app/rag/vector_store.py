@@ -1,49 +1,352 @@
 import json
-import math
+import mmap
 import os
-from dataclasses import asdict, dataclass
-from typing import List
+import shutil
+import uuid
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 
-@dataclass
+from app.rag.ann import IVFIndex
+from app.rag.lexical import LexicalIndex
+
+FORMAT_VERSION = 2
+CURRENT_FILE = "CURRENT"
+HEADER_FILE = "header.json"
+VECTORS_FILE = "vectors.f32"
+LINES_FILE = "lines.i32"
+PATH_IDS_FILE = "path_ids.i32"
+PATHS_FILE = "paths.json"
+TEXT_FILE = "text.dat"
+TEXT_OFFSETS_FILE = "text.idx"
+SYMBOLS_FILE = "symbols.dat"
+SYMBOLS_OFFSETS_FILE = "symbols.idx"
+
+
+@dataclass(slots=True)
 class VectorEntry:
     path: str
     start_line: int
     end_line: int
     language: str
     text: str
-    vector: List[float]
+    vector: Sequence[float]
+    symbols: List[str] = field(default_factory=list)
+
+
+def _generation_name(generation: int) -> str:
+    return f"gen-{generation:06d}"
+
+
+def _read_current(path: str) -> Optional[str]:
+    try:
+        with open(os.path.join(path, CURRENT_FILE), "r", encoding="utf-8") as handle:
+            return handle.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _map_bytes(path: str) -> bytes:
+    with open(path, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
 
 
 class VectorStore:
+    """On-disk index directory.
+
+    Each build is written to its own ``gen-NNNNNN`` subdirectory and published
+    by atomically replacing the ``CURRENT`` pointer file, so readers always
+    see a complete generation. A generation is stored column by column:
+    ``vectors.f32`` is a row-major float32 matrix with one row per chunk,
+    ``lines.i32`` the (start, end) line pairs, ``path_ids.i32`` indexes into
+    the interned ``paths.json`` table, and chunk texts and symbol names are
+    concatenated into ``text.dat``/``symbols.dat`` with int64 row offsets in
+    the matching ``.idx`` files. Everything but the path table is
+    memory-mapped, so a loaded store costs little more than its pages on disk
+    and ``VectorEntry`` objects are only built for returned hits. Rows are
+    L2-normalized on write, so cosine similarity is a plain dot product.
+    """
+
     def __init__(self, path: str):
         self.path = path
-        self.entries: List[VectorEntry] = []
+        self.generation_path: Optional[str] = None
+        self.generation = 0
+        self.dim = 0
+        self.count = 0
+        self.build_id: Optional[str] = None
+        self.embedder: Optional[str] = None
+        self.ann: Optional[IVFIndex] = None
+        self.lexical: Optional[LexicalIndex] = None
+        self.paths: List[str] = []
+        self.languages: List[str] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._lines: Optional[np.ndarray] = None
+        self._path_ids: Optional[np.ndarray] = None
+        self._text_offsets: Optional[np.ndarray] = None
+        self._text: bytes = b""
+        self._symbol_offsets: Optional[np.ndarray] = None
+        self._symbols: bytes = b""
+
+    def __len__(self) -> int:
+        return self.count
 
     def load(self) -> None:
-        if not os.path.exists(self.path):
+        current = _read_current(self.path)
+        if current is None:
+            return
+        generation_path = os.path.join(self.path, current)
+        with open(os.path.join(generation_path, HEADER_FILE), "r", encoding="utf-8") as handle:
+            header = json.load(handle)
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported index version: {header.get('version')}")
+        self.generation_path = generation_path
+        self.generation = header["generation"]
+        self.dim = header["dim"]
+        self.count = header["count"]
+        self.build_id = header.get("build_id")
+        self.embedder = header.get("embedder")
+        if not self.count:
             return
-        with open(self.path, "r", encoding="utf-8") as handle:
-            raw = json.load(handle)
-        self.entries = [VectorEntry(**item) for item in raw]
 
-    def save(self) -> None:
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        with open(self.path, "w", encoding="utf-8") as handle:
-            json.dump([asdict(entry) for entry in self.entries], handle, ensure_ascii=False)
+        def column(name: str, dtype: Any, shape: Tuple[int, ...]) -> np.ndarray:
+            return np.memmap(os.path.join(generation_path, name), dtype=dtype, mode="r", shape=shape)
+
+        self._vectors = column(VECTORS_FILE, np.float32, (self.count, self.dim))
+        self._lines = column(LINES_FILE, np.int32, (self.count, 2))
+        self._path_ids = column(PATH_IDS_FILE, np.int32, (self.count,))
+        self._text_offsets = column(TEXT_OFFSETS_FILE, np.int64, (self.count + 1,))
+        self._symbol_offsets = column(SYMBOLS_OFFSETS_FILE, np.int64, (self.count + 1,))
+        self._text = _map_bytes(os.path.join(generation_path, TEXT_FILE))
+        self._symbols = _map_bytes(os.path.join(generation_path, SYMBOLS_FILE))
+        with open(os.path.join(generation_path, PATHS_FILE), "r", encoding="utf-8") as handle:
+            table = json.load(handle)
+        self.paths, self.languages = table["paths"], table["languages"]
+        self.ann = IVFIndex.load(generation_path)
+        self.lexical = LexicalIndex.load(generation_path)
+
+    @property
+    def vectors(self) -> Optional[np.ndarray]:
+        return self._vectors
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the loaded columns, i.e. what the index keeps resident when fully paged in."""
+        columns = [self._vectors, self._lines, self._path_ids, self._text_offsets, self._symbol_offsets]
+        size = sum(column.nbytes for column in columns if column is not None)
+        return size + len(self._text) + len(self._symbols) + sum(len(path) for path in self.paths)
+
+    def text(self, idx: int) -> str:
+        return self._text[int(self._text_offsets[idx]):int(self._text_offsets[idx + 1])].decode("utf-8")
+
+    def symbols(self, idx: int) -> List[str]:
+        raw = self._symbols[int(self._symbol_offsets[idx]):int(self._symbol_offsets[idx + 1])]
+        return raw.decode("utf-8").split("\n") if raw else []
+
+    def entry(self, idx: int) -> VectorEntry:
+        path_id = int(self._path_ids[idx])
+        start_line, end_line = self._lines[idx].tolist()
+        return VectorEntry(
+            path=self.paths[path_id],
+            start_line=start_line,
+            end_line=end_line,
+            language=self.languages[path_id],
+            text=self.text(idx),
+            vector=self._vectors[idx],
+            symbols=self.symbols(idx),
+        )
 
     def upsert(self, entries: List[VectorEntry]) -> None:
-        self.entries = entries
-        self.save()
-
-    def query(self, vector: List[float], top_k: int) -> List[tuple[float, VectorEntry]]:
-        scored = []
-        for entry in self.entries:
-            score = self._cosine(vector, entry.vector)
-            scored.append((score, entry))
-        scored.sort(key=lambda item: item[0], reverse=True)
-        return scored[:top_k]
-
-    @staticmethod
-    def _cosine(a: List[float], b: List[float]) -> float:
-        return sum(x * y for x, y in zip(a, b)) / ((math.sqrt(sum(x * x for x in a)) or 1.0) * (math.sqrt(sum(y * y for y in b)) or 1.0))
+        dim = len(entries[0].vector) if entries else 0
+        writer = IndexWriter(self.path, dim)
+        try:
+            for entry in entries:
+                writer.add(entry)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+        self.load()
+
+    def query(self, vector: Sequence[float], top_k: int, nprobe: Optional[int] = None) -> List[tuple[float, VectorEntry]]:
+        return self.query_batch([vector], top_k, nprobe=nprobe)[0]
+
+    def query_batch(
+        self, vectors: Sequence[Sequence[float]], top_k: int, nprobe: Optional[int] = None
+    ) -> List[List[tuple[float, VectorEntry]]]:
+        return [
+            [(float(score), self.entry(int(idx))) for idx, score in zip(ids, scores)]
+            for ids, scores in self.search(vectors, top_k, nprobe=nprobe)
+        ]
+
+    def search(
+        self, vectors: Sequence[Sequence[float]], top_k: int, nprobe: Optional[int] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Row ids and scores of the best ``top_k`` rows per query, best first.
+
+        With ``nprobe`` and an ANN index available only the rows in the
+        ``nprobe`` nearest IVF lists are scored; otherwise the scan is exact.
+        """
+        if not self.count or top_k <= 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in vectors]
+        queries = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), self.dim))
+        results = []
+        if nprobe and self.ann is not None:
+            for query in queries:
+                candidates = np.sort(self.ann.candidates(query, nprobe))
+                scores = self._vectors[candidates] @ query
+                best = _top_k(scores, top_k)
+                results.append((candidates[best], scores[best]))
+            return results
+        for row in queries @ self._vectors.T:
+            best = _top_k(row, top_k)
+            results.append((best, row[best]))
+        return results
+
+    def search_ids(self, vectors: Sequence[Sequence[float]], top_k: int, nprobe: Optional[int] = None) -> List[np.ndarray]:
+        return [ids for ids, _ in self.search(vectors, top_k, nprobe=nprobe)]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    if top_k < len(scores):
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def _copy_blob(out: BinaryIO, out_offsets: "array[int]", blob: bytes, offsets: np.ndarray, start: int, stop: int) -> None:
+    base = int(offsets[start])
+    shift = out.tell() - base
+    out.write(blob[base:int(offsets[stop])])
+    out_offsets.extend((np.asarray(offsets[start + 1:stop + 1]) + shift).tolist())
+
+
+class IndexWriter:
+    """Streams entries into a new generation directory published on ``commit``."""
+
+    def __init__(self, path: str, dim: int, embedder: Optional[str] = None):
+        self.path = path
+        self.dim = dim
+        self.embedder = embedder
+        self.count = 0
+        current = _read_current(path)
+        self.generation = int(current.rsplit("-", 1)[-1]) + 1 if current else 1
+        self.generation_path = os.path.join(path, _generation_name(self.generation))
+        os.makedirs(self.generation_path, exist_ok=True)
+        self._vectors = open(os.path.join(self.generation_path, VECTORS_FILE), "wb")
+        self._text = open(os.path.join(self.generation_path, TEXT_FILE), "wb")
+        self._symbols = open(os.path.join(self.generation_path, SYMBOLS_FILE), "wb")
+        self._lines = array("i")
+        self._path_ids = array("i")
+        self._text_offsets = array("q", [0])
+        self._symbol_offsets = array("q", [0])
+        self._path_table: Dict[str, int] = {}
+        self._paths: List[str] = []
+        self._languages: List[str] = []
+
+    def _intern(self, path: str, language: str) -> int:
+        path_id = self._path_table.get(path)
+        if path_id is None:
+            path_id = self._path_table[path] = len(self._paths)
+            self._paths.append(path)
+            self._languages.append(language)
+        return path_id
+
+    def add(self, entry: VectorEntry) -> None:
+        vector = np.asarray(entry.vector, dtype=np.float32)
+        if vector.shape != (self.dim,):
+            raise ValueError(f"Vector dimension mismatch: expected {self.dim}, got {vector.shape}")
+        self._vectors.write(_normalize(vector).tobytes())
+        self._lines.extend((entry.start_line, entry.end_line))
+        self._path_ids.append(self._intern(entry.path, entry.language))
+        self._text.write(entry.text.encode("utf-8"))
+        self._text_offsets.append(self._text.tell())
+        if entry.symbols:
+            self._symbols.write("\n".join(entry.symbols).encode("utf-8"))
+        self._symbol_offsets.append(self._symbols.tell())
+        self.count += 1
+
+    def written_vectors(self) -> np.ndarray:
+        self._vectors.flush()
+        if not self.count:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(
+            os.path.join(self.generation_path, VECTORS_FILE), dtype=np.float32, mode="r", shape=(self.count, self.dim)
+        )
+
+    def copy_rows(self, store: VectorStore, start: int, stop: int) -> None:
+        if stop <= start:
+            return
+        if store.dim != self.dim:
+            raise ValueError(f"Vector dimension mismatch: expected {self.dim}, got {store.dim}")
+        self._vectors.write(np.ascontiguousarray(store._vectors[start:stop]).tobytes())
+        self._lines.extend(np.asarray(store._lines[start:stop]).ravel().tolist())
+        old_ids = np.asarray(store._path_ids[start:stop])
+        present = np.unique(old_ids)
+        new_ids = np.array([self._intern(store.paths[i], store.languages[i]) for i in present.tolist()], dtype=np.int32)
+        self._path_ids.extend(new_ids[np.searchsorted(present, old_ids)].tolist())
+        _copy_blob(self._text, self._text_offsets, store._text, store._text_offsets, start, stop)
+        _copy_blob(self._symbols, self._symbol_offsets, store._symbols, store._symbol_offsets, start, stop)
+        self.count += stop - start
+
+    def commit(self, attachments: Optional[Dict[str, Any]] = None) -> str:
+        """Publish the generation; ``attachments`` are JSON sidecars tagged with the same build id."""
+        self._close()
+        build_id = uuid.uuid4().hex
+        columns = {
+            LINES_FILE: self._lines,
+            PATH_IDS_FILE: self._path_ids,
+            TEXT_OFFSETS_FILE: self._text_offsets,
+            SYMBOLS_OFFSETS_FILE: self._symbol_offsets,
+        }
+        for name, values in columns.items():
+            with open(os.path.join(self.generation_path, name), "wb") as handle:
+                values.tofile(handle)
+        with open(os.path.join(self.generation_path, PATHS_FILE), "w", encoding="utf-8") as handle:
+            json.dump({"paths": self._paths, "languages": self._languages}, handle, ensure_ascii=False)
+        for name, payload in (attachments or {}).items():
+            with open(os.path.join(self.generation_path, name), "w", encoding="utf-8") as handle:
+                json.dump({"build_id": build_id, **payload}, handle, ensure_ascii=False)
+        header = {
+            "version": FORMAT_VERSION,
+            "generation": self.generation,
+            "dim": self.dim,
+            "count": self.count,
+            "build_id": build_id,
+            "embedder": self.embedder,
+        }
+        with open(os.path.join(self.generation_path, HEADER_FILE), "w", encoding="utf-8") as handle:
+            json.dump(header, handle)
+        pointer = os.path.join(self.path, CURRENT_FILE)
+        with open(pointer + ".tmp", "w", encoding="utf-8") as handle:
+            handle.write(_generation_name(self.generation))
+        os.replace(pointer + ".tmp", pointer)
+        self._prune_generations()
+        return build_id
+
+    def _close(self) -> None:
+        self._vectors.close()
+        self._text.close()
+        self._symbols.close()
+
+    def abort(self) -> None:
+        self._close()
+        shutil.rmtree(self.generation_path, ignore_errors=True)
+
+    def _prune_generations(self) -> None:
+        # Keep the previous generation so readers that resolved CURRENT just
+        # before the swap can still open it.
+        keep = {_generation_name(self.generation), _generation_name(self.generation - 1)}
+        for name in os.listdir(self.path):
+            if name.startswith("gen-") and name not in keep:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from app.telemetry.metrics import metrics
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+BLOB_DIRNAME = "blobs"
+# Payloads at or below this size stay inline in their row.
+DEFAULT_THRESHOLD_BYTES = 4096
+PREVIEW_CHARS = 256
+# Starts a column value that refers to a blob. A NUL can't appear in JSON
+# text or in the plain-text summaries stored inline, so no payload is
+# mistaken for a reference.
+REFERENCE_PREFIX = "\x00blob:"
+
+
+def default_threshold() -> int:
+    return int(os.getenv("TOOL_BLOB_THRESHOLD", str(DEFAULT_THRESHOLD_BYTES)))
+
+
+def _blob_dir() -> str:
+    return os.path.join(os.getenv("AGENT_DATA_DIR", "/agent_data"), BLOB_DIRNAME)
+
+
+def _blob_path(digest: str, suffix: str) -> str:
+    return os.path.join(_blob_dir(), digest[:2], digest[2:] + suffix)
+
+
+def _compress(data: bytes) -> Tuple[str, bytes]:
+    if zstandard is not None:
+        return ".zst", zstandard.ZstdCompressor(level=3).compress(data)
+    return ".gz", gzip.compress(data, compresslevel=6)
+
+
+def put(data: bytes) -> str:
+    """Store ``data`` under its sha256 and return the digest; identical data is stored once."""
+    digest = hashlib.sha256(data).hexdigest()
+    if any(os.path.exists(_blob_path(digest, suffix)) for suffix in (".zst", ".gz")):
+        metrics.incr("blobs.dedup_hits")
+        return digest
+    suffix, compressed = _compress(data)
+    path = _blob_path(digest, suffix)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as handle:
+        handle.write(compressed)
+    os.replace(tmp, path)
+    metrics.incr("blobs.written")
+    metrics.incr("blobs.bytes_raw", len(data))
+    metrics.incr("blobs.bytes_stored", len(compressed))
+    return digest
+
+
+def get(digest: str) -> bytes:
+    zst_path = _blob_path(digest, ".zst")
+    if os.path.exists(zst_path):
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        with open(zst_path, "rb") as handle:
+            return zstandard.ZstdDecompressor().decompress(handle.read())
+    try:
+        with open(_blob_path(digest, ".gz"), "rb") as handle:
+            return gzip.decompress(handle.read())
+    except FileNotFoundError as exc:
+        raise LookupError(f"Blob not found: {digest}") from exc
+
+
+def pack(text: str, threshold: Optional[int] = None) -> str:
+    """Column value for ``text``: the text itself, or a blob reference with a preview."""
+    data = text.encode("utf-8")
+    if len(data) <= (default_threshold() if threshold is None else threshold):
+        return text
+    reference = {"blob": put(data), "size": len(data), "preview": text[:PREVIEW_CHARS]}
+    return REFERENCE_PREFIX + json.dumps(reference, ensure_ascii=False)
+
+
+def reference_of(value: str) -> Optional[Dict[str, Any]]:
+    if not value.startswith(REFERENCE_PREFIX):
+        return None
+    return json.loads(value[len(REFERENCE_PREFIX):])
+
+
+def load_text(value: str) -> str:
+    """Inverse of ``pack``: the original text, read from the store if needed."""
+    reference = reference_of(value)
+    if reference is None:
+        return value
+    return get(reference["blob"]).decode("utf-8")
+
+
+def unpack(value: str) -> Any:
+    """The JSON payload packed into ``value``."""
+    return json.loads(load_text(value))
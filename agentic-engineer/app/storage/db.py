@@ -1,9 +1,69 @@
+import atexit
 import os
+import queue
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.telemetry.logger import log_event
+from app.telemetry.metrics import metrics
 
 DB_FILENAME = "agent.db"
 
+# Applied to every connection. WAL lets readers run alongside the writer and,
+# with synchronous=NORMAL, a commit no longer waits for an fsync.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+# Secondary indexes backing lookups by parent id and the keyset-paginated
+# history listings, so their cost does not grow with the size of the tables.
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks (status, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_submitter_created ON tasks (submitter, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks (status, priority DESC, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_status_workspace ON tasks (status, workspace_path)",
+    "CREATE INDEX IF NOT EXISTS idx_runs_task_iter ON runs (task_id, iter, id)",
+    "CREATE INDEX IF NOT EXISTS idx_tool_calls_run ON tool_calls (run_id, started_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_artifacts_task ON artifacts (task_id, created_at)",
+)
+WRITE_BATCH_ROWS = 500
+WRITE_BATCH_WAIT_SEC = 0.05
+# After a failure (e.g. the database can't be opened) the writer waits this
+# long before reconnecting.
+WRITE_RETRY_SEC = 1.0
+
+# Columns added after the first release; ``init_db`` adds them to older databases.
+TASK_COLUMNS = {
+    "priority": "INTEGER DEFAULT 0",
+    "submitter": "TEXT DEFAULT 'anonymous'",
+    "started_at": "TEXT",
+    "finished_at": "TEXT",
+    "attempts": "INTEGER DEFAULT 0",
+    "fast_verify": "INTEGER DEFAULT 0",
+    "speculative": "INTEGER DEFAULT 0",
+    "owner": "TEXT",
+    "queued_at": "TEXT",
+    "heartbeat_at": "TEXT",
+}
+TOOL_CALL_COLUMNS = {
+    "candidate": "INTEGER",
+}
+
+
+def flush_timeout() -> float:
+    return float(os.getenv("DB_FLUSH_TIMEOUT_SEC", "5"))
+
+
+class WriteBehindTimeout(RuntimeError):
+    """Queued writes were not committed within ``DB_FLUSH_TIMEOUT_SEC``."""
+
 
 def _db_path() -> str:
     base_dir = os.getenv("AGENT_DATA_DIR", "/agent_data")
@@ -11,8 +71,16 @@ def _db_path() -> str:
     return os.path.join(base_dir, DB_FILENAME)
 
 
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
 def init_db() -> None:
-    conn = sqlite3.connect(_db_path())
+    conn = _connect(_db_path())
     try:
         cursor = conn.cursor()
         cursor.execute(
@@ -29,6 +97,7 @@ def init_db() -> None:
             )
             """
         )
+        _add_columns(cursor, "tasks", TASK_COLUMNS)
         cursor.execute(
             """
             CREATE TABLE IF NOT EXISTS runs (
@@ -58,6 +127,7 @@ def init_db() -> None:
             )
             """
         )
+        _add_columns(cursor, "tool_calls", TOOL_CALL_COLUMNS)
         cursor.execute(
             """
             CREATE TABLE IF NOT EXISTS artifacts (
@@ -70,16 +140,150 @@ def init_db() -> None:
             )
             """
         )
+        for statement in INDEXES:
+            cursor.execute(statement)
         conn.commit()
     finally:
         conn.close()
 
 
+def _add_columns(cursor: sqlite3.Cursor, table: str, columns: Dict[str, str]) -> None:
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for column, definition in columns.items():
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+_local = threading.local()
+
+
 @contextmanager
-def get_connection():
-    conn = sqlite3.connect(_db_path())
-    conn.row_factory = sqlite3.Row
+def get_connection() -> Iterator[sqlite3.Connection]:
+    """This thread's pooled connection to the current database.
+
+    Connections stay open for the life of the thread, one per database path.
+    A transaction left open by an exception is rolled back.
+    """
+    path = _db_path()
+    connections: Dict[str, sqlite3.Connection] = _local.__dict__.setdefault("connections", {})
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = _connect(path)
     try:
         yield conn
-    finally:
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def close_connections() -> None:
+    for conn in _local.__dict__.pop("connections", {}).values():
         conn.close()
+
+
+class WriteBehind:
+    """Background writer that group-commits append-only rows.
+
+    ``submit`` queues an INSERT and returns immediately; a single thread
+    drains the queue in transactions of up to ``WRITE_BATCH_ROWS`` rows,
+    waiting at most ``WRITE_BATCH_WAIT_SEC`` for a batch to fill. ``flush``
+    blocks until everything submitted before it is committed, for readers
+    that need their own writes. Rows still queued when the process is killed
+    are lost, so only audit-style rows (tool calls, artifacts) go through it.
+    A batch that can't be written at all (the database can't be opened, the
+    disk is full) is dropped and counted; the writer then reconnects.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._queue: "queue.Queue[Tuple[Optional[str], Any]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, sql: str, params: Sequence[Any]) -> None:
+        self._queue.put((sql, params))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait for everything submitted so far to be written; False if ``timeout`` expired first."""
+        done = threading.Event()
+        self._queue.put((None, done))
+        return done.wait(timeout)
+
+    def _run(self) -> None:
+        # Nothing may end this thread: every later submit and flush depends on
+        # it, so failures drop the batch at hand and the writer carries on.
+        conn: Optional[sqlite3.Connection] = None
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + WRITE_BATCH_WAIT_SEC
+            while len(batch) < WRITE_BATCH_ROWS and batch[-1][0] is not None:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            rows = [(sql, params) for sql, params in batch if sql is not None]
+            failed = False
+            try:
+                if rows:
+                    if conn is None:
+                        conn = _connect(self.path)
+                    self._write(conn, rows)
+            except Exception as exc:
+                failed = True
+                self._drop(conn, rows, exc)
+                conn = None
+            finally:
+                for sql, marker in batch:
+                    if sql is None:
+                        marker.set()
+            if failed:
+                time.sleep(WRITE_RETRY_SEC)
+
+    def _drop(self, conn: Optional[sqlite3.Connection], rows: List[Tuple[str, Any]], exc: Exception) -> None:
+        metrics.incr("db.write_behind_failures")
+        metrics.incr("db.write_behind_dropped", len(rows))
+        try:
+            log_event("write_behind_failed", {"path": self.path, "rows": len(rows), "error": repr(exc)})
+            if conn is not None:
+                conn.close()
+        except Exception:
+            pass
+
+    def _write(self, conn: sqlite3.Connection, rows: List[Tuple[str, Any]]) -> None:
+        started = time.perf_counter()
+        try:
+            with conn:
+                for sql, params in rows:
+                    conn.execute(sql, params)
+        except sqlite3.Error:
+            # Retry row by row so one bad row doesn't drop the whole batch.
+            metrics.incr("db.write_behind_errors")
+            for sql, params in rows:
+                try:
+                    with conn:
+                        conn.execute(sql, params)
+                except sqlite3.Error:
+                    metrics.incr("db.write_behind_dropped")
+        metrics.observe("db.write_behind_batch_rows", len(rows))
+        metrics.observe("db.write_behind_commit_ms", (time.perf_counter() - started) * 1000)
+
+
+_writers: Dict[str, WriteBehind] = {}
+_writers_lock = threading.Lock()
+
+
+def write_behind() -> WriteBehind:
+    path = _db_path()
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = WriteBehind(path)
+        return writer
+
+
+@atexit.register
+def flush_writes() -> None:
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.flush(timeout=5)
@@ -1,38 +1,107 @@
+import base64
 import json
+import os
 import uuid
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from app.storage.db import get_connection
+from app.storage import blobs
+from app.storage.db import WriteBehindTimeout, flush_timeout, get_connection, write_behind
+
+
+# Columns returned by the history listings unless a projection asks for more;
+# the long text columns are left out so a page stays small.
+TASK_FIELDS = (
+    "id", "created_at", "status", "instruction", "dod_command", "workspace_path", "max_iters",
+    "timeout_sec", "priority", "submitter", "started_at", "finished_at", "attempts", "fast_verify",
+    "speculative", "owner", "heartbeat_at", "queued_at",
+)
+TASK_SUMMARY_FIELDS = ("id", "created_at", "status", "priority", "submitter", "started_at", "finished_at", "attempts")
+RUN_FIELDS = ("id", "task_id", "iter", "started_at", "ended_at", "result", "summary")
+# summary holds the iteration's whole plan and tool results, so it is only read when asked for.
+RUN_SUMMARY_FIELDS = ("id", "task_id", "iter", "started_at", "ended_at", "result")
+TOOL_CALL_FIELDS = ("id", "run_id", "tool_name", "started_at", "ended_at", "ok", "candidate")
+TOOL_CALL_PAYLOADS = ("input_json", "output_json")
+MAX_PAGE_SIZE = 500
 
 
 def _now() -> str:
     return datetime.utcnow().isoformat()
 
 
+def _encode_cursor(*key: Any) -> str:
+    raw = json.dumps(key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, size: int) -> Tuple[Any, ...]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(key, list) or len(key) != size:
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+
+def _columns(requested: Optional[Iterable[str]], allowed: Sequence[str], default: Sequence[str]) -> List[str]:
+    """Validated projection: ``id`` plus the requested columns, in table order."""
+    if requested is None:
+        return list(default)
+    wanted = set(requested)
+    unknown = wanted - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [column for column in allowed if column == "id" or column in wanted]
+
+
+def _page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _flush_writes() -> None:
+    """Wait for queued rows so a read sees them, at most ``DB_FLUSH_TIMEOUT_SEC``."""
+    if not write_behind().flush(timeout=flush_timeout()):
+        raise WriteBehindTimeout("Pending writes were not committed in time")
+
+
 def create_task(
     instruction: str,
     dod_command: str,
     workspace_path: str,
     max_iters: int,
     timeout_sec: int,
+    priority: int = 0,
+    submitter: str = "anonymous",
+    fast_verify: bool = False,
+    speculative: int = 0,
 ) -> str:
     task_id = str(uuid.uuid4())
+    now = _now()
     with get_connection() as conn:
         conn.execute(
             """
-            INSERT INTO tasks (id, created_at, status, instruction, dod_command, workspace_path, max_iters, timeout_sec)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO tasks (
+                id, created_at, status, instruction, dod_command, workspace_path, max_iters, timeout_sec, priority, submitter,
+                fast_verify, speculative, queued_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 task_id,
-                _now(),
+                now,
                 "queued",
                 instruction,
                 dod_command,
-                workspace_path,
+                # Normalized so the claim query can compare workspaces as strings.
+                os.path.normpath(workspace_path),
                 max_iters,
                 timeout_sec,
+                priority,
+                submitter,
+                1 if fast_verify else 0,
+                speculative,
+                now,
             ),
         )
         conn.commit()
@@ -45,13 +114,232 @@ def update_task_status(task_id: str, status: str) -> None:
         conn.commit()
 
 
+def list_queued_tasks(limit: int = 500) -> List[Dict[str, Any]]:
+    with get_connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT id, created_at, queued_at, workspace_path, priority, submitter FROM tasks
+            WHERE status = 'queued' ORDER BY priority DESC, created_at LIMIT ?
+            """,
+            (limit,),
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def claim_task(task_id: str, owner: Optional[str] = None) -> bool:
+    """Move a queued task to running under ``owner``.
+
+    False if another worker got it first, or if a task for the same
+    workspace is already running, in this process or any other; the check
+    and the claim are one statement, so two processes cannot both win.
+    """
+    now = _now()
+    with get_connection() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE tasks SET status = 'running', started_at = ?, attempts = attempts + 1, owner = ?, heartbeat_at = ?
+            WHERE id = ? AND status = 'queued' AND NOT EXISTS (
+                SELECT 1 FROM tasks AS busy WHERE busy.status = 'running' AND busy.workspace_path = tasks.workspace_path
+            )
+            """,
+            (now, owner, now, task_id),
+        )
+        conn.commit()
+    return cursor.rowcount == 1
+
+
+def heartbeat_tasks(task_ids: Sequence[str], owner: str) -> None:
+    """Mark ``owner``'s running tasks as still alive."""
+    if not task_ids:
+        return
+    placeholders = ", ".join("?" for _ in task_ids)
+    with get_connection() as conn:
+        conn.execute(
+            f"UPDATE tasks SET heartbeat_at = ? WHERE owner = ? AND status = 'running' AND id IN ({placeholders})",
+            (_now(), owner, *task_ids),
+        )
+        conn.commit()
+
+
+def finish_task(task_id: str, fallback_status: str = "failed") -> None:
+    """Stamp ``finished_at``; a task still marked running gets ``fallback_status``."""
+    with get_connection() as conn:
+        conn.execute(
+            "UPDATE tasks SET finished_at = ?, status = CASE WHEN status = 'running' THEN ? ELSE status END WHERE id = ?",
+            (_now(), fallback_status, task_id),
+        )
+        conn.commit()
+
+
+def requeue_stale_tasks(stale_sec: float) -> List[str]:
+    """Return running tasks whose owner stopped heartbeating ``stale_sec`` ago to the queue.
+
+    Tasks of live workers, in this process or another, keep running.
+    """
+    stale_before = (datetime.utcnow() - timedelta(seconds=stale_sec)).isoformat()
+    with get_connection() as conn:
+        # One write transaction, so a heartbeat can't land between finding
+        # the stale tasks and re-queuing them.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id FROM tasks WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (stale_before,),
+            ).fetchall()
+            conn.executemany(
+                """
+                UPDATE tasks SET status = 'queued', queued_at = ?, started_at = NULL, owner = NULL, heartbeat_at = NULL
+                WHERE id = ?
+                """,
+                [(_now(), row["id"]) for row in rows],
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return [row["id"] for row in rows]
+
+
+def count_tasks_by_status() -> Dict[str, int]:
+    with get_connection() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status").fetchall()
+    return {row["status"]: row["n"] for row in rows}
+
+
 def get_task(task_id: str) -> Optional[Dict[str, Any]]:
     with get_connection() as conn:
         row = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
     return dict(row) if row else None
 
 
+def list_tasks(
+    status: Optional[str] = None,
+    submitter: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    fields: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """Newest tasks first, one keyset page at a time.
+
+    The cursor is the (created_at, id) of the last row served, so every page
+    is an index range scan no matter how deep into the history it is.
+    """
+    columns = _columns(fields, TASK_FIELDS, TASK_SUMMARY_FIELDS)
+    select = list(dict.fromkeys(columns + ["created_at"]))
+    where, params = [], []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if submitter:
+        where.append("submitter = ?")
+        params.append(submitter)
+    if cursor:
+        where.append("(created_at, id) < (?, ?)")
+        params.extend(_decode_cursor(cursor, 2))
+    limit = _page_size(limit)
+    sql = f"SELECT {', '.join(select)} FROM tasks"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    with get_connection() as conn:
+        rows = [dict(row) for row in conn.execute(sql, (*params, limit + 1)).fetchall()]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if more else None
+    return {"items": [{column: row[column] for column in columns} for row in rows], "next_cursor": next_cursor}
+
+
+def list_runs(
+    task_id: str, cursor: Optional[str] = None, limit: int = 50, fields: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """Runs of a task in iteration order, paginated on (iter, id); ``fields`` adds ``summary``."""
+    columns = _columns(fields, RUN_FIELDS, RUN_SUMMARY_FIELDS)
+    select = list(dict.fromkeys(columns + ["iter"]))
+    params: List[Any] = [task_id]
+    sql = f"SELECT {', '.join(select)} FROM runs WHERE task_id = ?"
+    if cursor:
+        sql += " AND (iter, id) > (?, ?)"
+        params.extend(_decode_cursor(cursor, 2))
+    limit = _page_size(limit)
+    sql += " ORDER BY iter, id LIMIT ?"
+    with get_connection() as conn:
+        rows = [dict(row) for row in conn.execute(sql, (*params, limit + 1)).fetchall()]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode_cursor(rows[-1]["iter"], rows[-1]["id"]) if more else None
+    for row in rows:
+        if row.get("summary"):
+            row["summary"] = blobs.load_text(row["summary"])
+    return {"items": [{column: row[column] for column in columns} for row in rows], "next_cursor": next_cursor}
+
+
+def list_tool_calls(
+    run_id: str,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    include: Iterable[str] = (),
+) -> Dict[str, Any]:
+    """Tool calls of a run in call order; ``include`` adds ``input_json``/``output_json``.
+
+    The payload columns can be large, so they are only read from disk when
+    asked for.
+    """
+    payloads = _payload_columns(include)
+    params: List[Any] = [run_id]
+    sql = f"SELECT {', '.join(TOOL_CALL_FIELDS + payloads)} FROM tool_calls WHERE run_id = ?"
+    if cursor:
+        sql += " AND (started_at, id) > (?, ?)"
+        params.extend(_decode_cursor(cursor, 2))
+    limit = _page_size(limit)
+    sql += " ORDER BY started_at, id LIMIT ?"
+    _flush_writes()
+    with get_connection() as conn:
+        rows = [_tool_call(row) for row in conn.execute(sql, (*params, limit + 1)).fetchall()]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {"items": rows, "next_cursor": _encode_cursor(rows[-1]["started_at"], rows[-1]["id"]) if more else None}
+
+
+def tool_calls_for_runs(run_ids: Sequence[str], include: Iterable[str] = ()) -> Dict[str, List[Dict[str, Any]]]:
+    """Tool calls grouped by run, for embedding in a page of runs."""
+    payloads = _payload_columns(include)
+    grouped: Dict[str, List[Dict[str, Any]]] = {run_id: [] for run_id in run_ids}
+    if not run_ids:
+        return grouped
+    placeholders = ", ".join("?" for _ in run_ids)
+    _flush_writes()
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT {', '.join(TOOL_CALL_FIELDS + payloads)} FROM tool_calls
+            WHERE run_id IN ({placeholders}) ORDER BY run_id, started_at, id
+            """,
+            tuple(run_ids),
+        ).fetchall()
+    for row in rows:
+        grouped[row["run_id"]].append(_tool_call(row))
+    return grouped
+
+
+def _payload_columns(include: Iterable[str]) -> Tuple[str, ...]:
+    wanted = set(include)
+    unknown = wanted - set(TOOL_CALL_PAYLOADS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(column for column in TOOL_CALL_PAYLOADS if column in wanted)
+
+
+def _tool_call(row: Any) -> Dict[str, Any]:
+    call = dict(row)
+    call["ok"] = bool(call["ok"])
+    for column in TOOL_CALL_PAYLOADS:
+        if call.get(column) is not None:
+            call[column] = blobs.unpack(call[column])
+    return call
+
+
 def list_artifacts(task_id: str) -> List[Dict[str, Any]]:
+    _flush_writes()
     with get_connection() as conn:
         rows = conn.execute("SELECT * FROM artifacts WHERE task_id = ?", (task_id,)).fetchall()
     return [dict(row) for row in rows]
@@ -72,10 +360,11 @@ def create_run(task_id: str, iteration: int) -> str:
 
 
 def finish_run(run_id: str, result: str, summary: str) -> None:
+    """Close a run; a summary over ``TOOL_BLOB_THRESHOLD`` bytes goes to the blob store."""
     with get_connection() as conn:
         conn.execute(
             "UPDATE runs SET ended_at = ?, result = ?, summary = ? WHERE id = ?",
-            (_now(), result, summary, run_id),
+            (_now(), result, blobs.pack(summary), run_id),
         )
         conn.commit()
 
@@ -88,35 +377,36 @@ def record_tool_call(
     ok: bool,
     started_at: str,
     ended_at: str,
+    candidate: Optional[int] = None,
 ) -> None:
-    call_id = str(uuid.uuid4())
-    with get_connection() as conn:
-        conn.execute(
-            """
-            INSERT INTO tool_calls (id, run_id, tool_name, input_json, output_json, started_at, ended_at, ok)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                call_id,
-                run_id,
-                tool_name,
-                json.dumps(input_json, ensure_ascii=False),
-                json.dumps(output_json, ensure_ascii=False),
-                started_at,
-                ended_at,
-                1 if ok else 0,
-            ),
-        )
-        conn.commit()
+    """Queue a tool-call row; payloads over ``TOOL_BLOB_THRESHOLD`` bytes go to the blob store.
+
+    ``candidate`` is the index of the speculative candidate that made the call.
+    """
+    write_behind().submit(
+        """
+        INSERT INTO tool_calls (id, run_id, tool_name, input_json, output_json, started_at, ended_at, ok, candidate)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            str(uuid.uuid4()),
+            run_id,
+            tool_name,
+            blobs.pack(json.dumps(input_json, ensure_ascii=False)),
+            blobs.pack(json.dumps(output_json, ensure_ascii=False)),
+            started_at,
+            ended_at,
+            1 if ok else 0,
+            candidate,
+        ),
+    )
 
 
 def record_artifact(task_id: str, artifact_type: str, path: str) -> None:
-    with get_connection() as conn:
-        conn.execute(
-            """
-            INSERT INTO artifacts (id, task_id, type, path, created_at)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (str(uuid.uuid4()), task_id, artifact_type, path, _now()),
-        )
-        conn.commit()
+    write_behind().submit(
+        """
+        INSERT INTO artifacts (id, task_id, type, path, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (str(uuid.uuid4()), task_id, artifact_type, path, _now()),
+    )
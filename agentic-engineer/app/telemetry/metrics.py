@@ -1,5 +1,6 @@
+import threading
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Dict, Optional
 
 
 @dataclass
@@ -8,3 +9,40 @@ class TokenUsage:
     completion_tokens: int = 0
     total_tokens: int = 0
     cost_usd: Optional[float] = None
+
+
+class Metrics:
+    """Process-wide counters, gauges and summary observations (count/total/max)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._observations: Dict[str, Dict[str, float]] = {}
+        self._gauges: Dict[str, float] = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            stats = self._observations.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0})
+            stats["count"] += 1
+            stats["total"] += value
+            stats["max"] = max(stats["max"], value)
+            stats["last"] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            observations = {
+                name: {**stats, "avg": stats["total"] / stats["count"] if stats["count"] else 0.0}
+                for name, stats in self._observations.items()
+            }
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges), "observations": observations}
+
+
+metrics = Metrics()
@@ -1,39 +1,256 @@
 import os
+import signal
 import subprocess
+import threading
 import time
-from typing import Dict, Optional
+from typing import Any, BinaryIO, Callable, Dict, Optional
 
+from app.telemetry.metrics import metrics
 from app.tools.policy import check_cmd
 
+OutputCallback = Callable[[str, str], None]
 
-def run_cmd(cmd: str, cwd: str, timeout_sec: int, env: Optional[Dict[str, str]] = None) -> Dict:
+READ_CHUNK_BYTES = 64 * 1024
+# Readers get this long to drain the pipes after the command was killed; a
+# background child that inherited them could otherwise keep them open forever.
+DRAIN_TIMEOUT_SEC = 1.0
+# Between SIGTERM and SIGKILL to the command's process group.
+KILL_GRACE_SEC = 2.0
+POLL_INTERVAL_SEC = 0.25
+# rlimits applied to every command, from RUN_CMD_<NAME>; 0 or unset means no limit.
+LIMIT_FLAGS = {"cpu_sec": "-t", "mem_mb": "-v", "nofile": "-n"}
+
+
+def default_tail_bytes() -> int:
+    return int(os.getenv("RUN_CMD_TAIL_KB", "256")) * 1024
+
+
+def default_output_interval() -> float:
+    return int(os.getenv("CMD_OUTPUT_INTERVAL_MS", "250")) / 1000
+
+
+def default_limits() -> Dict[str, int]:
+    return {name: int(os.getenv(f"RUN_CMD_{name.upper()}", "0") or 0) for name in LIMIT_FLAGS}
+
+
+def _with_limits(cmd: str, limits: Dict[str, int]) -> str:
+    # ulimit in the shell that runs the command rather than setrlimit in a
+    # preexec_fn, which is unsafe to run in a forked child of a threaded process.
+    lines = []
+    for name, flag in LIMIT_FLAGS.items():
+        value = limits.get(name)
+        if value:
+            lines.append(f"ulimit {flag} {value * 1024 if name == 'mem_mb' else value} || exit 125")
+    return "\n".join(lines + [cmd])
+
+
+def _signal_group(pgid: int, sig: int) -> None:
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class _Reaper(threading.Thread):
+    """Waits for the child with ``wait4`` to collect its resource usage."""
+
+    def __init__(self, pid: int) -> None:
+        super().__init__(name="run-cmd-reaper", daemon=True)
+        self.pid = pid
+        self.done = threading.Event()
+        self.exit_code: Optional[int] = None
+        self.rusage: Any = None
+
+    def run(self) -> None:
+        _, status, self.rusage = os.wait4(self.pid, 0)
+        self.exit_code = os.waitstatus_to_exitcode(status)
+        self.done.set()
+
+
+class _Tail:
+    """The last ``limit`` bytes written, plus how many bytes were written in total."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.total = 0
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+        self._buffer += data
+        if len(self._buffer) > self.limit:
+            del self._buffer[: len(self._buffer) - self.limit]
+
+    def text(self) -> str:
+        text = self._buffer.decode("utf-8", errors="replace")
+        # A tail cut inside a multi-byte character starts with replacement chars.
+        return text.lstrip("\ufffd") if self.truncated else text
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self._buffer)
+
+
+class _Throttle:
+    """Coalesces output into at most one callback per stream per ``interval``.
+
+    Each callback carries at most ``max_bytes``; anything beyond that within
+    one interval is dropped from the live feed (it still reaches the tail and
+    the log file) and counted in ``dropped``.
+    """
+
+    def __init__(self, callback: OutputCallback, interval: float, max_bytes: int) -> None:
+        self.callback = callback
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pending: Dict[str, bytearray] = {}
+        self._last: Dict[str, float] = {}
+
+    def write(self, stream: str, data: bytes) -> None:
+        with self._lock:
+            pending = self._pending.setdefault(stream, bytearray())
+            room = self.max_bytes - len(pending)
+            pending += data[: max(room, 0)]
+            self.dropped += max(len(data) - max(room, 0), 0)
+            due = time.monotonic() - self._last.get(stream, 0.0) >= self.interval
+        if due:
+            self.flush(stream)
+
+    def flush(self, stream: Optional[str] = None) -> None:
+        with self._lock:
+            streams = [stream] if stream else list(self._pending)
+            ready = {name: bytes(self._pending.pop(name, b"")) for name in streams}
+            for name in streams:
+                self._last[name] = time.monotonic()
+        for name, data in ready.items():
+            if data:
+                self.callback(name, data.decode("utf-8", errors="replace"))
+
+
+def run_cmd(
+    cmd: str,
+    cwd: str,
+    timeout_sec: int,
+    env: Optional[Dict[str, str]] = None,
+    on_output: Optional[OutputCallback] = None,
+    log_path: Optional[str] = None,
+    limits: Optional[Dict[str, int]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Dict:
+    """Run ``cmd`` in a shell, reading stdout and stderr as they are produced.
+
+    Only the last ``RUN_CMD_TAIL_KB`` of each stream is kept in memory and
+    returned; ``log_path``, when given, receives the complete interleaved
+    output. ``on_output(stream, text)`` gets live output, rate limited to one
+    call per stream every ``CMD_OUTPUT_INTERVAL_MS``.
+
+    The command runs in its own session; on timeout or when ``cancel`` is set
+    the whole process group gets SIGTERM, then SIGKILL, and any process left
+    behind after the command exits is killed too. ``limits`` (``cpu_sec``,
+    ``mem_mb``, ``nofile``) override the ``RUN_CMD_*`` rlimit defaults.
+    Peak RSS and CPU time of the command and its reaped children are
+    reported alongside the output.
+    """
     check_cmd(cmd)
     start = time.time()
     merged_env = os.environ.copy()
     if env:
         merged_env.update(env)
+    tail_bytes = default_tail_bytes()
+    tails = {"stdout": _Tail(tail_bytes), "stderr": _Tail(tail_bytes)}
+    throttle = _Throttle(on_output, default_output_interval(), READ_CHUNK_BYTES // 4) if on_output else None
+    log = open(log_path, "wb") if log_path else None
+    log_lock = threading.Lock()
+
+    def pump(stream: str, pipe: BinaryIO) -> None:
+        with pipe:
+            for data in iter(lambda: pipe.read1(READ_CHUNK_BYTES), b""):
+                tails[stream].write(data)
+                if log:
+                    with log_lock:
+                        if not log.closed:
+                            log.write(data)
+                if throttle:
+                    throttle.write(stream, data)
+
     try:
-        result = subprocess.run(
-            cmd,
+        process = subprocess.Popen(
+            _with_limits(cmd, {**default_limits(), **(limits or {})}),
             cwd=cwd,
             shell=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout_sec,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             env=merged_env,
+            start_new_session=True,
         )
-        duration_ms = int((time.time() - start) * 1000)
-        return {
-            "exit_code": result.returncode,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "duration_ms": duration_ms,
-        }
-    except subprocess.TimeoutExpired as exc:
-        duration_ms = int((time.time() - start) * 1000)
-        return {
-            "exit_code": 124,
-            "stdout": exc.stdout or "",
-            "stderr": exc.stderr or "timeout",
-            "duration_ms": duration_ms,
-        }
+    except BaseException:
+        if log:
+            log.close()
+        raise
+    reaper = _Reaper(process.pid)
+    reaper.start()
+    readers = [
+        threading.Thread(target=pump, args=(stream, pipe), name=f"run-cmd-{stream}", daemon=True)
+        for stream, pipe in (("stdout", process.stdout), ("stderr", process.stderr))
+    ]
+    for reader in readers:
+        reader.start()
+    deadline = time.monotonic() + timeout_sec
+    interval = throttle.interval if throttle else POLL_INTERVAL_SEC
+    stopped = None
+    # Wake up every interval to push output left pending by a quiet command
+    # and to notice cancellation.
+    while not reaper.done.wait(max(0.0, min(deadline - time.monotonic(), interval))):
+        if cancel is not None and cancel.is_set():
+            stopped = "cancelled"
+        elif time.monotonic() >= deadline:
+            stopped = "timed_out"
+        if stopped:
+            _signal_group(process.pid, signal.SIGTERM)
+            if not reaper.done.wait(KILL_GRACE_SEC):
+                _signal_group(process.pid, signal.SIGKILL)
+            reaper.done.wait()
+            break
+        if throttle:
+            throttle.flush()
+    # The session is the command's whole process tree: nothing in it may
+    # outlive the command, or it keeps the pipes open and burns CPU for
+    # whatever runs next.
+    _signal_group(process.pid, signal.SIGKILL)
+    process.returncode = reaper.exit_code
+    for reader in readers:
+        reader.join(DRAIN_TIMEOUT_SEC)
+    if throttle:
+        throttle.flush()
+        if throttle.dropped:
+            metrics.incr("run_cmd.output_dropped_bytes", throttle.dropped)
+    if log:
+        with log_lock:
+            log.close()
+
+    duration_ms = int((time.time() - start) * 1000)
+    output_bytes = tails["stdout"].total + tails["stderr"].total
+    metrics.observe("run_cmd.output_bytes", output_bytes)
+    rusage = reaper.rusage
+    exit_code = {"timed_out": 124, "cancelled": 130}.get(stopped, reaper.exit_code)
+    result = {
+        "exit_code": exit_code,
+        "stdout": tails["stdout"].text(),
+        "stderr": tails["stderr"].text(),
+        "duration_ms": duration_ms,
+        "output_bytes": output_bytes,
+        "truncated": tails["stdout"].truncated or tails["stderr"].truncated,
+        "peak_rss_kb": rusage.ru_maxrss,
+        "cpu_user_ms": int(rusage.ru_utime * 1000),
+        "cpu_sys_ms": int(rusage.ru_stime * 1000),
+    }
+    if stopped:
+        reason = "timeout" if stopped == "timed_out" else "cancelled"
+        result["stderr"] = (result["stderr"] + "\n" if result["stderr"] else "") + reason
+        result[stopped] = True
+    if log_path:
+        result["log_path"] = log_path
+    return result
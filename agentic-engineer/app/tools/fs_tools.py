@@ -1,34 +1,22 @@
-import fnmatch
 import os
 import subprocess
 import tempfile
 from typing import Dict, List
 
 from app.tools.policy import check_path
+from app.tools.walker import walk_files
 
 
 def list_tree(root: str, max_depth: int, include_glob: List[str], exclude_glob: List[str]) -> Dict:
     check_path(root)
-    entries = []
-    root = os.path.abspath(root)
-    for dirpath, dirnames, filenames in os.walk(root):
-        depth = os.path.relpath(dirpath, root).count(os.sep)
-        if depth >= max_depth:
-            dirnames[:] = []
-        for filename in filenames:
-            path = os.path.join(dirpath, filename)
-            rel_path = os.path.relpath(path, root)
-            if any(fnmatch.fnmatch(rel_path, pattern) for pattern in exclude_glob):
-                continue
-            if include_glob and not any(fnmatch.fnmatch(rel_path, pattern) for pattern in include_glob):
-                continue
-            entries.append(
-                {
-                    "path": rel_path,
-                    "type": "file",
-                    "size": os.path.getsize(path),
-                }
-            )
+    entries = [
+        {
+            "path": entry.rel_path,
+            "type": "file",
+            "size": entry.size,
+        }
+        for entry in walk_files(root, include_glob, exclude_glob, max_depth=max_depth)
+    ]
     return {"entries": entries}
 
 
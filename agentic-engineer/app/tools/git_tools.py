@@ -1,7 +1,199 @@
+import hashlib
+import os
+import shutil
 import subprocess
-from typing import Dict
+import tempfile
+from stat import S_ISDIR
+from typing import Dict, List, Optional, Sequence
+
+# Entries statted per ignored directory when fingerprinting the work tree.
+IGNORED_DIR_ENTRIES = 1000
 
 
 def git_diff(cwd: str) -> Dict:
     result = subprocess.run(["git", "diff"], cwd=cwd, capture_output=True, text=True)
     return {"diff": result.stdout}
+
+
+def clean_blob_hashes(cwd: str) -> Dict[str, str]:
+    """Blob ids of tracked files whose working copy matches the git index.
+
+    Paths are relative to ``cwd``. Returns an empty mapping outside a git
+    work tree.
+    """
+    staged = subprocess.run(["git", "ls-files", "-s", "-z"], cwd=cwd, capture_output=True)
+    if staged.returncode != 0:
+        return {}
+    dirty = subprocess.run(["git", "diff", "--name-only", "--relative", "-z"], cwd=cwd, capture_output=True)
+    if dirty.returncode != 0:
+        return {}
+    dirty_paths = set(dirty.stdout.decode("utf-8", errors="surrogateescape").split("\0"))
+    hashes = {}
+    for record in staged.stdout.decode("utf-8", errors="surrogateescape").split("\0"):
+        if not record:
+            continue
+        info, path = record.split("\t", 1)
+        _mode, blob, stage = info.split(" ")
+        if stage == "0" and path not in dirty_paths:
+            hashes[path] = blob
+    return hashes
+
+
+def _git(args: List[str], cwd: str, env: Optional[Dict[str, str]] = None) -> Optional[str]:
+    result = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, env=env)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def git_toplevel(cwd: str) -> Optional[str]:
+    return _git(["rev-parse", "--show-toplevel"], cwd)
+
+
+def snapshot_tree(cwd: str, exclude_dirs: Sequence[str] = ()) -> Optional[str]:
+    """Tree id of the whole working tree, untracked files included; None outside git.
+
+    The files are staged into a copy of the real index, so only modified
+    files are re-read and the user's index is never touched; their blobs are
+    written to the object database so the tree can be checked out. Ignored
+    files are left out, as are directories named in ``exclude_dirs``.
+    """
+    index = _git(["rev-parse", "--git-path", "index"], cwd)
+    top = git_toplevel(cwd)
+    if index is None or top is None:
+        return None
+    index = os.path.join(cwd, index)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "GIT_INDEX_FILE": os.path.join(tmp, "index")}
+        if os.path.exists(index):
+            # copy2 keeps the index mtime, which git needs to spot entries
+            # modified within the same second as they were staged.
+            shutil.copy2(index, env["GIT_INDEX_FILE"])
+        excludes = [f":(exclude,glob)**/{name}/**" for name in exclude_dirs]
+        if _git(["add", "-A", "--", ".", *excludes], top, env) is None:
+            return None
+        return _git(["write-tree"], top, env)
+
+
+def _git_paths(args: List[str], cwd: str) -> Optional[List[str]]:
+    result = subprocess.run(["git", args[0], "-z", *args[1:]], cwd=cwd, capture_output=True)
+    if result.returncode != 0:
+        return None
+    return [path for path in result.stdout.decode("utf-8", errors="surrogateescape").split("\0") if path]
+
+
+def ignored_paths(cwd: str, exclude_dirs: Sequence[str] = ()) -> Optional[List[str]]:
+    """Ignored files and directories under ``cwd``, relative to it; None outside git.
+
+    Wholly ignored directories are listed once, with a trailing slash,
+    rather than file by file. Paths inside directories named in
+    ``exclude_dirs`` are left out.
+    """
+    paths = _git_paths(["ls-files", "--others", "--ignored", "--exclude-standard", "--directory"], cwd)
+    if paths is None:
+        return None
+    return [path for path in paths if not set(path.rstrip("/").split("/")) & set(exclude_dirs)]
+
+
+def _ignored_stats(path: str) -> List[str]:
+    """Size and mtime of ``path`` and, breadth first, of up to ``IGNORED_DIR_ENTRIES`` entries below it."""
+    stats = []
+    pending = [path]
+    while pending and len(stats) < IGNORED_DIR_ENTRIES:
+        current = pending.pop(0)
+        try:
+            stat = os.lstat(current)
+        except OSError:
+            continue
+        stats.append(f"{os.path.relpath(current, path)} {stat.st_size} {stat.st_mtime_ns}")
+        if S_ISDIR(stat.st_mode):
+            try:
+                pending.extend(sorted(entry.path for entry in os.scandir(current)))
+            except OSError:
+                pass
+    return stats
+
+
+def worktree_fingerprint(cwd: str, exclude_dirs: Sequence[str] = ()) -> Optional[str]:
+    """Hash of everything in the working tree, ignored files included; None outside git.
+
+    Clean tracked files contribute their index entry; modified and untracked
+    files a ``git hash-object`` of the working copy; ignored files (``.env``,
+    local config, generated data) their path, size and mtime. Wholly ignored
+    directories (``.venv``, ``node_modules``) are listed once and only their
+    first ``IGNORED_DIR_ENTRIES`` entries, breadth first, are statted, so an
+    edit deep inside one goes unnoticed unless it changes a directory near
+    the top, as installing or removing a package does. Nothing is written to
+    the object database or the index.
+    """
+    top = git_toplevel(cwd)
+    if top is None:
+        return None
+    excludes = [f":(exclude,glob)**/{name}/**" for name in exclude_dirs]
+    staged = _git_paths(["ls-files", "-s"], top)
+    dirty = _git_paths(["diff", "--name-only", "--no-renames"], top)
+    untracked = _git_paths(["ls-files", "--others", "--exclude-standard", "--", ".", *excludes], top)
+    ignored = ignored_paths(top, exclude_dirs)
+    if staged is None or dirty is None or untracked is None or ignored is None:
+        return None
+    changed = set(dirty) | set(untracked)
+    digest = hashlib.blake2b(digest_size=20)
+    for record in staged:
+        info, path = record.split("\t", 1)
+        if path not in changed:
+            digest.update(f"{path}\0{info}\n".encode("utf-8", errors="surrogateescape"))
+    present = [path for path in sorted(changed) if os.path.lexists(os.path.join(top, path))]
+    blobs: Dict[str, str] = {}
+    if present:
+        hashed = subprocess.run(
+            ["git", "hash-object", "--stdin-paths"],
+            cwd=top,
+            input="\n".join(present).encode("utf-8", errors="surrogateescape"),
+            capture_output=True,
+        )
+        if hashed.returncode != 0:
+            return None
+        blobs = dict(zip(present, hashed.stdout.decode("ascii").split()))
+    for path in sorted(changed):
+        digest.update(f"{path}\0changed {blobs.get(path, 'deleted')}\n".encode("utf-8", errors="surrogateescape"))
+    # Ignored trees (virtualenvs, node_modules) can be large, so they are
+    # fingerprinted by stat rather than content.
+    for path in sorted(ignored):
+        for stat in _ignored_stats(os.path.join(top, path)):
+            digest.update(f"{path}\0ignored {stat}\n".encode("utf-8", errors="surrogateescape"))
+    return digest.hexdigest()
+
+
+def snapshot_commit(cwd: str, tree: str) -> Optional[str]:
+    """A dangling commit of ``tree`` on top of HEAD, for checking the snapshot out elsewhere."""
+    env = {
+        **os.environ,
+        "GIT_AUTHOR_NAME": "agent",
+        "GIT_AUTHOR_EMAIL": "agent@localhost",
+        "GIT_COMMITTER_NAME": "agent",
+        "GIT_COMMITTER_EMAIL": "agent@localhost",
+    }
+    parent = ["-p", "HEAD"] if _git(["rev-parse", "--verify", "-q", "HEAD"], cwd) else []
+    return _git(["commit-tree", tree, *parent, "-m", "workspace snapshot"], cwd, env)
+
+
+def add_worktree(cwd: str, path: str, commit: str) -> bool:
+    return _git(["worktree", "add", "--detach", "-q", path, commit], cwd) is not None
+
+
+def remove_worktree(cwd: str, path: str) -> None:
+    _git(["worktree", "remove", "--force", path], cwd)
+    shutil.rmtree(path, ignore_errors=True)
+    _git(["worktree", "prune"], cwd)
+
+
+def diff_trees(cwd: str, old_tree: str, new_tree: str) -> str:
+    result = subprocess.run(["git", "diff", "--binary", old_tree, new_tree], cwd=cwd, capture_output=True, text=True)
+    return result.stdout
+
+
+def apply_diff(cwd: str, diff: str) -> bool:
+    """Apply a diff made by ``diff_trees`` to the working tree at the repository root."""
+    top = git_toplevel(cwd)
+    if top is None:
+        return False
+    result = subprocess.run(["git", "apply", "--binary", "-"], cwd=top, input=diff, capture_output=True, text=True)
+    return result.returncode == 0
@@ -1,5 +1,6 @@
 import os
-from typing import List
+from dataclasses import dataclass
+from typing import Any, Dict, List
 
 def _safe_prefixes() -> List[str]:
     return [
@@ -36,3 +37,61 @@ def check_cmd(cmd: str) -> None:
         raise ValueError(f"Blocked command: {cmd}")
     if not any(lowered.startswith(prefix) for prefix in ALLOWED_COMMAND_PREFIXES):
         raise ValueError(f"Command not allowed: {cmd}")
+
+
+# Arguments naming files or directories, per tool.
+PATH_ARGS = {
+    "list_tree": ("root",),
+    "read_file": ("path",),
+    "write_file": ("path",),
+    "apply_patch": ("root",),
+    "run_cmd": ("cwd", "log_path"),
+    "git_diff": ("cwd",),
+}
+# Tools that touch no files of their own, only read the shared index.
+READ_ONLY_TOOLS = frozenset({"rag_query", "rag_query_batch", "rag_fetch"})
+
+
+def check_confined(path: str, root: str) -> None:
+    real = os.path.realpath(path)
+    base = os.path.realpath(root)
+    if real != base and not real.startswith(base + os.sep):
+        raise ValueError(f"Access denied for path outside {root}: {path}")
+
+
+def _patch_paths(patch: str) -> List[str]:
+    paths = []
+    for line in patch.splitlines():
+        if line.startswith(("--- ", "+++ ")):
+            path = line[4:].split("\t", 1)[0].strip()
+            if path != "/dev/null":
+                paths.append(path[2:] if path.startswith(("a/", "b/")) else path)
+    return paths
+
+
+@dataclass(frozen=True)
+class Confinement:
+    """Keeps tool calls inside ``root``; commands always run in ``cwd``.
+
+    Tools whose effects can't be kept inside ``root`` (rebuilding the shared
+    index, anything unknown) are rejected.
+    """
+
+    root: str
+    cwd: str
+
+    def apply(self, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        if tool in READ_ONLY_TOOLS:
+            return args
+        if tool not in PATH_ARGS:
+            raise ValueError(f"Tool {tool} cannot be confined to {self.root}")
+        args = dict(args)
+        if tool == "run_cmd":
+            args["cwd"] = self.cwd
+        for name in PATH_ARGS[tool]:
+            if args.get(name) is not None:
+                check_confined(args[name], self.root)
+        if tool == "apply_patch":
+            for path in _patch_paths(args.get("patch") or ""):
+                check_confined(os.path.join(args["root"], path), self.root)
+        return args
@@ -1,14 +1,53 @@
-from typing import Dict, List
+from dataclasses import asdict
+from typing import Dict, List, Optional
 
+from app.rag.index_cache import index_cache
 from app.rag.indexer import build_index
-from app.rag.retriever import query_index
+from app.rag.namespaces import list_namespaces, resolve_namespace
+from app.rag.retriever import fetch_chunk, query_index_batch, query_page
 
 
-def rag_rebuild(root: str, include_glob: List[str], exclude_glob: List[str]) -> Dict:
-    indexed_files, chunks = build_index(root, include_glob, exclude_glob)
-    return {"indexed_files": indexed_files, "chunks": chunks}
+# Tools whose index namespace defaults to the one of the task's workspace.
+WORKSPACE_SCOPED_TOOLS = frozenset({"rag_rebuild", "rag_query", "rag_fetch", "rag_query_batch"})
 
 
-def rag_query(query: str, top_k: int) -> Dict:
-    hits = query_index(query, top_k)
-    return {"hits": hits}
+def rag_rebuild(
+    root: str,
+    include_glob: List[str],
+    exclude_glob: List[str],
+    incremental: bool = True,
+    namespace: Optional[str] = None,
+    workspace: Optional[str] = None,
+) -> Dict:
+    """Without ``namespace`` the index belongs to ``workspace``, or to the default namespace."""
+    namespace = resolve_namespace(namespace, workspace)
+    return asdict(build_index(root, include_glob, exclude_glob, incremental=incremental, namespace=namespace))
+
+
+def rag_query(
+    query: str,
+    top_k: int,
+    nprobe: Optional[int] = None,
+    mode: str = "hybrid",
+    namespace: Optional[str] = None,
+    cursor: Optional[str] = None,
+    snippet_lines: Optional[int] = None,
+    workspace: Optional[str] = None,
+) -> Dict:
+    namespace = resolve_namespace(namespace, workspace)
+    return query_page(query, top_k, nprobe=nprobe, mode=mode, namespace=namespace, cursor=cursor, snippet_lines=snippet_lines)
+
+
+def rag_fetch(chunk_id: str, namespace: Optional[str] = None, workspace: Optional[str] = None) -> Dict:
+    return fetch_chunk(chunk_id, namespace=resolve_namespace(namespace, workspace))
+
+
+def rag_query_batch(
+    queries: List[str], top_k: int, mode: str = "hybrid", namespace: Optional[str] = None, workspace: Optional[str] = None
+) -> Dict:
+    results = query_index_batch(queries, top_k, mode=mode, namespace=resolve_namespace(namespace, workspace))
+    return {"results": [{"query": query, "hits": hits} for query, hits in zip(queries, results)]}
+
+
+def rag_stats() -> Dict:
+    return {"namespaces": list_namespaces(), "index_cache": index_cache.stats()}
@@ -13,6 +13,8 @@ TOOLS: Dict[str, ToolFunc] = {
     "git_diff": git_tools.git_diff,
     "rag_rebuild": rag_tools.rag_rebuild,
     "rag_query": rag_tools.rag_query,
+    "rag_query_batch": rag_tools.rag_query_batch,
+    "rag_fetch": rag_tools.rag_fetch,
 }
 
 
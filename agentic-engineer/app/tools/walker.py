@@ -0,0 +1,191 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+ALWAYS_PRUNE = frozenset({".git", ".hg", ".svn"})
+_PRUNE_PROBE = "__walker_probe__/__probe__"
+
+
+@dataclass(slots=True)
+class WalkEntry:
+    path: str
+    rel_path: str
+    size: int
+    mtime_ns: int
+
+
+def _glob_to_regex(pattern: str, slash_wildcards: bool) -> str:
+    """Translate a glob into a regex body.
+
+    ``**/`` matches zero or more directories and ``**`` anything. With
+    ``slash_wildcards`` a single ``*``/``?`` may also cross ``/`` (fnmatch
+    semantics, used for include/exclude globs); otherwise they stay within one
+    path segment (gitignore semantics).
+    """
+    star, any_char = (".*", ".") if slash_wildcards else ("[^/]*", "[^/]")
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append(star)
+            i += 1
+        elif c == "?":
+            out.append(any_char)
+            i += 1
+        elif c == "[":
+            j = i + 1
+            if j < n and pattern[j] == "!":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            end = pattern.find("]", j)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1:end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+class GlobMatcher:
+    """Include/exclude globs compiled once into a single alternation regex."""
+
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = list(patterns)
+        self._regex = (
+            re.compile("|".join(f"(?:{_glob_to_regex(p, slash_wildcards=True)})" for p in self.patterns))
+            if self.patterns
+            else None
+        )
+
+    def __bool__(self) -> bool:
+        return self._regex is not None
+
+    def match(self, rel_path: str) -> bool:
+        return self._regex is not None and self._regex.fullmatch(rel_path) is not None
+
+    def covers_dir(self, rel_dir: str) -> bool:
+        # True when every path below ``rel_dir`` matches, so the walk can skip it.
+        return self.match(f"{rel_dir}/") and self.match(f"{rel_dir}/{_PRUNE_PROBE}")
+
+
+class GitIgnore:
+    """Rules from the ``.gitignore`` files seen so far, evaluated last-match-wins."""
+
+    def __init__(self, rules: Optional[List[Tuple[str, "re.Pattern[str]", bool, bool]]] = None):
+        self.rules = rules or []
+
+    def extend(self, base: str, gitignore_path: str) -> "GitIgnore":
+        try:
+            with open(gitignore_path, "r", encoding="utf-8", errors="replace") as handle:
+                lines = handle.read().splitlines()
+        except OSError:
+            return self
+        rules = list(self.rules)
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate or line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            body = _glob_to_regex(line.lstrip("/"), slash_wildcards=False)
+            regex = re.compile(body if anchored else f"(?:.*/)?{body}")
+            rules.append((base, regex, negate, dir_only))
+        return GitIgnore(rules)
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        result = False
+        for base, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + "/"):
+                    continue
+                candidate = rel_path[len(base) + 1:]
+            else:
+                candidate = rel_path
+            if regex.fullmatch(candidate):
+                result = not negate
+        return result
+
+
+def walk_files(
+    root: str,
+    include_glob: Sequence[str] = (),
+    exclude_glob: Sequence[str] = (),
+    max_depth: Optional[int] = None,
+    gitignore: bool = True,
+) -> Iterator[WalkEntry]:
+    """Lazily yield files under ``root`` using ``os.scandir``.
+
+    Directories that are VCS metadata, fully covered by ``exclude_glob`` or
+    ignored by ``.gitignore`` are pruned before descending. ``max_depth``
+    limits how many directory levels below ``root`` are visited (0 = only
+    files directly in ``root``). Size and mtime come from the ``DirEntry``
+    stat cache.
+    """
+    include = GlobMatcher(include_glob)
+    exclude = GlobMatcher(exclude_glob)
+    root = os.path.abspath(root)
+    stack: List[Tuple[str, str, int, GitIgnore]] = [(root, "", 0, GitIgnore())]
+    while stack:
+        dirpath, rel_dir, depth, ignore = stack.pop()
+        if gitignore:
+            ignore = ignore.extend(rel_dir, os.path.join(dirpath, ".gitignore"))
+        try:
+            with os.scandir(dirpath) as iterator:
+                entries = sorted(iterator, key=lambda item: item.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                is_file = not is_dir and entry.is_file()
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in ALWAYS_PRUNE or (max_depth is not None and depth >= max_depth):
+                    continue
+                if exclude and exclude.covers_dir(rel_path):
+                    continue
+                if gitignore and ignore.ignored(rel_path, is_dir=True):
+                    continue
+                subdirs.append((entry.path, rel_path, depth + 1, ignore))
+                continue
+            if not is_file:
+                continue
+            if exclude and exclude.match(rel_path):
+                continue
+            if include and not include.match(rel_path):
+                continue
+            if gitignore and ignore.ignored(rel_path, is_dir=False):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            yield WalkEntry(path=entry.path, rel_path=rel_path, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        stack.extend(reversed(subdirs))
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.storage import models  # noqa: E402
+from app.storage.db import DB_FILENAME, init_db, write_behind  # noqa: E402
+
+
+def _legacy_iteration(path: str, task_id: str, iteration: int, steps: int) -> None:
+    """One task iteration the way storage worked before pooling: a connection and commit per call."""
+
+    def execute(sql: str, params: tuple) -> None:
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute(sql, params)
+            conn.commit()
+        finally:
+            conn.close()
+
+    run_id = str(uuid.uuid4())
+    execute("INSERT INTO runs (id, task_id, iter, started_at, result, summary) VALUES (?, ?, ?, ?, ?, ?)", (run_id, task_id, iteration, "t", "running", ""))
+    for step in range(steps):
+        execute(
+            "INSERT INTO tool_calls (id, run_id, tool_name, input_json, output_json, started_at, ended_at, ok) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(uuid.uuid4()), run_id, "read_file", "{}", "{}", "t", "t", 1),
+        )
+    execute("UPDATE runs SET ended_at = ?, result = ?, summary = ? WHERE id = ?", ("t", "fail", "", run_id))
+    execute("UPDATE tasks SET status = ? WHERE id = ?", ("running", task_id))
+
+
+def _pooled_iteration(path: str, task_id: str, iteration: int, steps: int) -> None:
+    run_id = models.create_run(task_id, iteration)
+    for step in range(steps):
+        models.record_tool_call(run_id, "read_file", {}, {}, True, "t", "t")
+    models.finish_run(run_id, "fail", "")
+    models.update_task_status(task_id, "running")
+
+
+def run(mode: str, tasks: int, iterations: int, steps: int) -> None:
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["AGENT_DATA_DIR"] = data_dir
+        init_db()
+        if mode == "legacy":
+            # init_db() switches the file to WAL; go back to the old default rollback journal.
+            conn = sqlite3.connect(os.path.join(data_dir, DB_FILENAME))
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.close()
+        path = os.path.join(data_dir, DB_FILENAME)
+        task_ids = [models.create_task("bench", "true", f"/ws/{n}", iterations, 10) for n in range(tasks)]
+        iteration = _legacy_iteration if mode == "legacy" else _pooled_iteration
+        errors = []
+
+        def worker(task_id: str) -> None:
+            for i in range(iterations):
+                try:
+                    iteration(path, task_id, i, steps)
+                except sqlite3.OperationalError as exc:
+                    errors.append(str(exc))
+
+        threads = [threading.Thread(target=worker, args=(task_id,)) for task_id in task_ids]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if mode == "pooled":
+            write_behind().flush()
+        elapsed = time.perf_counter() - started
+
+        rows = tasks * iterations * (steps + 3)
+        locked = sum("locked" in error for error in errors)
+        print(f"{mode:>7}: {rows / elapsed:>10,.0f} rows/sec  {elapsed:6.2f}s  errors={len(errors)} (database is locked: {locked})")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark task-storage writes under concurrent tasks.")
+    parser.add_argument("--tasks", type=int, default=32, help="concurrent tasks (threads)")
+    parser.add_argument("--iterations", type=int, default=5, help="iterations per task")
+    parser.add_argument("--steps", type=int, default=10, help="tool calls per iteration")
+    parser.add_argument("--mode", choices=["legacy", "pooled", "both"], default="both")
+    args = parser.parse_args()
+    for mode in (["legacy", "pooled"] if args.mode == "both" else [args.mode]):
+        run(mode, args.tasks, args.iterations, args.steps)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
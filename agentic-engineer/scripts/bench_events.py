@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.api.events import EventBus, LoopEmitter  # noqa: E402
+from app.telemetry.metrics import metrics  # noqa: E402
+
+
+async def run(tasks: int, events: int, subscribers: int) -> None:
+    # Buffers hold a whole stream so slow readers never skip events.
+    bus = EventBus(buffer_size=events + 1)
+    emitter = LoopEmitter(bus)
+    emitter.bind(asyncio.get_running_loop())
+
+    async def consume(topic: str) -> int:
+        return sum([1 async for _ in bus.stream(topic)])
+
+    consumers = [asyncio.create_task(consume(f"task-{n}")) for n in range(tasks) for _ in range(subscribers)]
+    await asyncio.sleep(0)
+    emit_seconds = []
+
+    def produce(topic: str) -> None:
+        started = time.perf_counter()
+        for i in range(events - 1):
+            emitter.emit(topic, "tick", {"i": i})
+        emitter.emit(topic, "task_finished", {})
+        emit_seconds.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=produce, args=(f"task-{n}",)) for n in range(tasks)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    received = sum(await asyncio.gather(*consumers))
+    elapsed = time.perf_counter() - started
+    for thread in threads:
+        thread.join()
+
+    batches = metrics.snapshot()["observations"]["events.batch_size"]
+    print(f"tasks={tasks} events/task={events} subscribers/task={subscribers}")
+    print(f"published {tasks * events / elapsed:,.0f} events/sec, delivered {received / elapsed:,.0f} events/sec ({elapsed:.3f}s)")
+    print(f"emit() avg {sum(emit_seconds) / len(emit_seconds) / events * 1e6:.2f} us/event")
+    print(f"loop wakeups {int(batches['count'])}, avg batch {batches['avg']:.1f}, max batch {int(batches['max'])}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark thread -> event loop event delivery.")
+    parser.add_argument("--tasks", type=int, default=64, help="concurrent emitting threads")
+    parser.add_argument("--events", type=int, default=5000, help="events per thread")
+    parser.add_argument("--subscribers", type=int, default=1, help="SSE subscribers per task")
+    args = parser.parse_args()
+    asyncio.run(run(args.tasks, args.events, args.subscribers))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,58 @@
+import numpy as np
+
+from app.rag.ann import IVFIndex, build_ivf, recall_report, remap_from_copies
+from app.rag.indexer import build_index
+from app.rag.index_cache import index_cache
+from app.rag.namespaces import index_path
+from app.rag.retriever import query_index
+from app.rag.vector_store import VectorEntry, VectorStore
+
+
+def _clustered(count, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, size=count)] + 0.1 * rng.normal(size=(count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_ivf_recall_and_incremental_remap(tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_ANN_NLIST", "16")
+    vectors = _clustered(2000)
+    store = VectorStore(str(tmp_path / "index"))
+    store.upsert([VectorEntry(path=str(i), start_line=1, end_line=1, language="txt", text="", vector=v) for i, v in enumerate(vectors)])
+    store.ann = build_ivf(store.vectors)
+    assert len(store.ann) == 2000
+
+    report = recall_report(store, nprobes=(1, 16), top_k=10, samples=50)
+    assert report["settings"][-1]["recall"] == 1.0
+    assert report["settings"][0]["recall"] > 0.5
+
+    # Drop the first 100 rows and append 50 new ones without retraining.
+    old_to_new = remap_from_copies(2000, [(100, 0, 1900)])
+    grown = np.concatenate([vectors[100:], _clustered(50, seed=1)])
+    updated = build_ivf(grown, store.ann, old_to_new)
+    assert np.array_equal(updated.centroids, store.ann.centroids)
+    assert sorted(np.asarray(updated.ids).tolist()) == list(range(1950))
+
+
+def test_rag_query_uses_ann_above_threshold(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    monkeypatch.setenv("RAG_ANN_MIN_CHUNKS", "3")
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for i in range(4):
+        (repo / f"m{i}.py").write_text(f"def symbol_{i}():\n    return {i}\n", encoding="utf-8")
+
+    build_index(str(repo), ["*.py"], [])
+    store = index_cache.get(index_path())
+    assert store.ann is not None and len(store.ann) == 4
+    monkeypatch.setenv("RAG_ANN_NPROBE", str(store.ann.nlist))
+    probes = []
+    candidates = IVFIndex.candidates
+    monkeypatch.setattr(IVFIndex, "candidates", lambda self, query, nprobe: probes.append(nprobe) or candidates(self, query, nprobe))
+    assert query_index("symbol_2", 1, mode="vector")[0]["path"].endswith("m2.py")
+    assert probes == [store.ann.nlist]
+
+    (repo / "m4.py").write_text("def symbol_4():\n    return 4\n", encoding="utf-8")
+    build_index(str(repo), ["*.py"], [])
+    assert len(index_cache.get(index_path()).ann) == 5
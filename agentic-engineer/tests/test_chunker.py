@@ -0,0 +1,91 @@
+from app.rag.chunker import chunk_text
+
+PY_SOURCE = '''import os
+
+CONSTANT = 1
+
+
+# helper comment
+def helper(x):
+    return x + 1
+
+
+class Service:
+    """Docstring."""
+
+    def start(self):
+        return "start"
+
+    @property
+    def name(self):
+        return "svc"
+'''
+
+
+def test_python_chunks_follow_definitions():
+    chunks = chunk_text("mod.py", PY_SOURCE)
+    assert [chunk.symbols for chunk in chunks] == [[], ["helper"], ["Service"]]
+    helper = chunks[1]
+    assert helper.text.startswith("# helper comment\ndef helper")
+    assert (helper.start_line, helper.end_line) == (6, 8)
+    assert all(chunk.content_hash for chunk in chunks)
+
+
+def test_large_python_class_is_split_into_methods():
+    chunks = chunk_text("mod.py", PY_SOURCE, max_lines=6)
+    symbols = [chunk.symbols for chunk in chunks]
+    assert ["Service"] in symbols
+    assert ["Service.start"] in symbols
+    assert ["Service.name"] in symbols
+    name = next(chunk for chunk in chunks if chunk.symbols == ["Service.name"])
+    assert name.text.lstrip().startswith("@property")
+    assert all(chunk.end_line - chunk.start_line < 6 for chunk in chunks)
+
+
+def test_oversized_function_falls_back_to_windows():
+    body = "\n".join(f"    x{i} = {i}" for i in range(30))
+    chunks = chunk_text("big.py", f"def big():\n{body}\n", max_lines=10)
+    assert len(chunks) == 4
+    assert all(chunk.symbols == ["big"] for chunk in chunks)
+
+
+def test_syntax_error_uses_fixed_windows():
+    text = "\n".join(["def broken(:"] + [f"line {i}" for i in range(24)])
+    chunks = chunk_text("bad.py", text, max_lines=10)
+    assert [(chunk.start_line, chunk.end_line) for chunk in chunks] == [(1, 10), (11, 20), (21, 25)]
+
+
+def test_javascript_splits_on_top_level_definitions():
+    source = "\n".join(
+        [
+            "import x from 'x';",
+            "",
+            "// adds",
+            "export function add(a, b) {",
+            "  return a + b;",
+            "}",
+            "",
+            "const mul = (a, b) => a * b;",
+            "export default class Calc {",
+            "  run() {}",
+            "}",
+        ]
+    )
+    chunks = chunk_text("calc.js", source)
+    assert [chunk.symbols for chunk in chunks] == [[], ["add"], ["mul"], ["Calc"]]
+    assert chunks[1].text.startswith("// adds")
+
+
+def test_overlap_extends_following_chunks():
+    chunks = chunk_text("mod.py", PY_SOURCE, overlap=2)
+    assert chunks[0].start_line == 1
+    assert chunks[1].start_line == 4
+    assert chunks[1].content_hash != chunk_text("mod.py", PY_SOURCE)[1].content_hash
+
+
+def test_overlap_stays_within_max_lines():
+    text = "\n".join(f"line {n}" for n in range(100))
+    for overlap in (0, 3, 10, 50):
+        chunks = chunk_text("notes.txt", text, max_lines=10, overlap=overlap)
+        assert max(chunk.end_line - chunk.start_line + 1 for chunk in chunks) <= 10
+        assert chunks[-1].end_line == 100
@@ -0,0 +1,65 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.rag import embedder
+from app.telemetry.metrics import metrics
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_hashing_embedder_is_stable_across_processes():
+    script = "from app.rag.embedder import HashingEmbedder; print(HashingEmbedder().embed(['def parse_plan(x)'])[0].tolist())"
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True, env={"PYTHONHASHSEED": seed}
+        ).stdout
+        for seed in ("1", "2")
+    }
+    assert len(outputs) == 1
+
+    vectors = embedder.HashingEmbedder().embed(["alpha beta", "", "alpha alpha"])
+    assert vectors.shape == (3, embedder.VECTOR_SIZE)
+    assert np.allclose(np.linalg.norm(vectors[[0, 2]], axis=1), 1.0)
+    assert not vectors[1].any()
+
+
+def test_embedders_must_implement_embed():
+    with pytest.raises(TypeError):
+        embedder.Embedder()
+
+    class Incomplete(embedder.Embedder):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+class _CountingEmbedder(embedder.Embedder):
+    name = "counting"
+    dim = 4
+    cacheable = True
+
+    def __init__(self):
+        self.seen = []
+
+    def embed(self, texts):
+        self.seen.extend(texts)
+        return np.array([[len(text), 1.0, 0.0, 0.0] for text in texts], dtype=np.float32)
+
+
+def test_embed_reuses_persistent_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path))
+    fake = _CountingEmbedder()
+    monkeypatch.setattr(embedder, "get_embedder", lambda: fake)
+
+    first = embedder.embed(["a", "bb"])
+    second = embedder.embed(["bb", "ccc", "a"])
+
+    assert fake.seen == ["a", "bb", "ccc"]
+    assert np.array_equal(second[0], first[1])
+    assert np.array_equal(second[2], first[0])
+    assert metrics.snapshot()["observations"]["embed.batch_size"]["last"] == 3
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+from app.api.events import EventBus, LoopEmitter
+
+
+async def _collect(bus, topic, last_event_id=None):
+    return [message async for message in bus.stream(topic, last_event_id)]
+
+
+def test_emitter_delivers_events_from_threads_in_order():
+    async def scenario():
+        bus = EventBus(buffer_size=1000)
+        emitter = LoopEmitter(bus)
+        emitter.bind(asyncio.get_running_loop())
+
+        def produce(topic):
+            for i in range(500):
+                emitter.emit(topic, "tick", {"i": i})
+            emitter.emit(topic, "task_finished", {})
+
+        readers = [asyncio.create_task(_collect(bus, f"task-{n}")) for n in range(4)]
+        threads = [threading.Thread(target=produce, args=(f"task-{n}",)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        return await asyncio.wait_for(asyncio.gather(*readers), 5)
+
+    for messages in asyncio.run(scenario()):
+        assert [message["data"]["i"] for message in messages[:-1]] == list(range(500))
+
+
+def test_emitter_drops_events_without_a_loop():
+    bus = EventBus()
+    emitter = LoopEmitter(bus)
+    emitter.emit("task", "tick", {})
+    loop = asyncio.new_event_loop()
+    emitter.bind(loop)
+    loop.close()
+    emitter.emit("task", "tick", {})
+    assert bus.replay("task") == []
+
+
+def test_bus_fans_out_and_replays_after_last_event_id():
+    async def scenario():
+        bus = EventBus()
+        first = asyncio.create_task(_collect(bus, "t"))
+        second = asyncio.create_task(_collect(bus, "t"))
+        await asyncio.sleep(0)
+        for i in range(3):
+            bus.publish_nowait("t", "tick", {"i": i})
+        bus.publish_nowait("t", "task_finished", {"status": "succeeded"})
+        streams = await asyncio.wait_for(asyncio.gather(first, second), 1)
+        resumed = await asyncio.wait_for(_collect(bus, "t", last_event_id="2"), 1)
+        return streams, resumed
+
+    (first, second), resumed = asyncio.run(scenario())
+    assert first == second
+    assert [message["id"] for message in first] == ["1", "2", "3", "4"]
+    assert [message["event"] for message in resumed] == ["tick", "task_finished"]
+
+
+def test_bus_buffers_are_bounded_and_collected():
+    bus = EventBus(buffer_size=10, retention_sec=60, max_closed=5)
+    for n in range(20):
+        for i in range(50):
+            bus.publish_nowait(f"task-{n}", "tick", {"i": i})
+        bus.publish_nowait(f"task-{n}", "task_finished", {})
+    assert len(bus) == 5
+    assert len(bus.replay("task-19")) == 10
+    assert bus.replay("task-0") == []
+    bus.collect(now=float("inf"))
+    assert len(bus) == 0
+
+
+def test_idle_open_topics_expire():
+    async def scenario():
+        bus = EventBus(idle_ttl_sec=0.2)
+        bus.publish_nowait("crashed", "iter_started", {})
+        # The stream ends once the topic expires, though nothing is published.
+        events = await asyncio.wait_for(_collect(bus, "crashed"), 2)
+        bus.publish_nowait("live", "iter_started", {})
+        return events, len(bus)
+
+    events, remaining = asyncio.run(scenario())
+    assert [message["event"] for message in events] == ["iter_started"]
+    assert remaining == 1
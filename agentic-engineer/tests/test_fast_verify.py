@@ -0,0 +1,81 @@
+import subprocess
+
+from app.core.impact import ImportGraph, targeted_command
+from app.core.orchestrator import run_task
+from app.core.schemas import LLMPlan
+from app.storage import models
+from app.storage.db import init_db
+
+
+def _write(root, rel_path, text):
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_import_graph_finds_transitively_impacted_tests(tmp_path):
+    _write(tmp_path, "src/pkg/__init__.py", "")
+    _write(tmp_path, "src/pkg/core.py", "def f():\n    return 1\n")
+    _write(tmp_path, "src/pkg/api.py", "from .core import f\n")
+    _write(tmp_path, "src/other.py", "import os\n")
+    _write(tmp_path, "tests/test_api.py", "from pkg.api import f\n")
+    _write(tmp_path, "tests/test_core.py", "from pkg import core\n")
+    _write(tmp_path, "tests/test_other.py", "import other\n")
+    graph = ImportGraph(str(tmp_path))
+
+    assert graph.impacted_tests(["src/pkg/core.py"]) == ["tests/test_api.py", "tests/test_core.py"]
+    assert graph.impacted_tests(["src/other.py", "tests/test_api.py"]) == ["tests/test_api.py", "tests/test_other.py"]
+    assert graph.impacted_tests(["README.md"]) is None
+    assert graph.impacted_tests(["tests/conftest.py"]) is None
+
+    _write(tmp_path, "src/pkg/api.py", "import os\n")
+    assert graph.impacted_tests(["src/pkg/core.py"]) == ["tests/test_core.py"]
+
+
+def test_targeted_command_keeps_the_pytest_invocation():
+    assert targeted_command("python -m pytest -q tests", ["tests/test_a.py"]) == "python -m pytest -q -x tests/test_a.py"
+    assert targeted_command("pytest", ["t/test a.py"]) == "pytest -x -q 't/test a.py'"
+    assert targeted_command("make test", ["tests/test_a.py"]) is None
+    assert targeted_command("pytest && npm test", ["tests/test_a.py"]) is None
+
+
+def test_targeted_command_keeps_options_and_replaces_only_paths():
+    tests = ["tests/unit/test_a.py", "tests/integration/test_b.py"]
+    assert (
+        targeted_command("pytest -k 'not slow' -m unit --cov=pkg tests/unit -p no:cacheprovider", tests)
+        == "pytest -k 'not slow' -m unit --cov=pkg -p no:cacheprovider -x -q tests/unit/test_a.py"
+    )
+    assert targeted_command("pytest --maxfail 3 -v", tests) == "pytest --maxfail 3 -v " + " ".join(tests)
+    assert targeted_command("pytest tests/unit", ["tests/integration/test_b.py"]) is None
+    assert targeted_command("pytest tests/unit/test_a.py::test_one", tests) is None
+
+
+def test_run_task_runs_impacted_tests_before_the_full_dod(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    workspace = tmp_path / "workspace"
+    _write(workspace, "calc.py", "def add(a, b):\n    return a - b\n")
+    _write(workspace, "strings.py", "def shout(s):\n    return s.upper()\n")
+    _write(workspace, "test_calc.py", "from calc import add\n\ndef test_add():\n    assert add(1, 2) == 3\n")
+    _write(workspace, "test_strings.py", "from strings import shout\n\ndef test_shout():\n    assert shout('a') == 'A'\n")
+    git = ["git", "-c", "user.name=t", "-c", "user.email=t@t"]
+    subprocess.run(["git", "init", "-q"], cwd=workspace, check=True)
+    subprocess.run(git + ["add", "."], cwd=workspace, check=True)
+    subprocess.run(git + ["commit", "-qm", "init"], cwd=workspace, check=True)
+
+    fixes = iter(["def add(a, b):\n    return a * b\n", "def add(a, b):\n    return a + b\n"])
+
+    def planner(context, evidence):
+        (workspace / "calc.py").write_text(next(fixes))
+        return LLMPlan(plan_summary="fix", steps=[], risk_notes=[], done_when="tests pass")
+
+    init_db()
+    task_id = models.create_task("fix add", "python -m pytest -q", str(workspace), 3, 60, fast_verify=True)
+    events = []
+    run_task(task_id, emit=lambda event_type, payload: events.append((event_type, payload)), planner=planner)
+
+    assert models.get_task(task_id)["status"] == "succeeded"
+    fast = [payload for event_type, payload in events if event_type == "fast_verify"]
+    assert [(payload["iter"], payload["tests"], payload["exit_code"] == 0) for payload in fast] == [
+        (1, ["test_calc.py"], False),
+        (2, ["test_calc.py"], True),
+    ]
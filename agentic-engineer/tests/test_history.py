@@ -0,0 +1,78 @@
+import pytest
+
+from app.storage import models
+from app.storage.db import get_connection, init_db
+
+
+@pytest.fixture()
+def db(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    init_db()
+
+
+def test_tasks_page_newest_first_with_keyset_cursor(db):
+    created = [models.create_task(f"task {n}", "true", f"/ws/{n}", 1, 10, submitter="ci" if n % 2 else "dev") for n in range(7)]
+    models.update_task_status(created[0], "succeeded")
+
+    seen, cursor = [], None
+    while True:
+        page = models.list_tasks(limit=3, cursor=cursor)
+        seen.extend(task["id"] for task in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == created[::-1]
+    assert set(page["items"][0]) == set(models.TASK_SUMMARY_FIELDS)
+
+    assert [task["id"] for task in models.list_tasks(status="succeeded")["items"]] == [created[0]]
+    assert len(models.list_tasks(submitter="ci")["items"]) == 3
+    only = models.list_tasks(limit=1, fields=["instruction"])["items"][0]
+    assert only == {"id": created[-1], "instruction": "task 6"}
+    with pytest.raises(ValueError):
+        models.list_tasks(fields=["nope"])
+    with pytest.raises(ValueError):
+        models.list_tasks(cursor="garbage")
+
+
+def test_runs_and_tool_calls_load_payloads_only_on_request(db):
+    task_id = models.create_task("x", "true", "/ws", 3, 10)
+    run_ids = [models.create_run(task_id, i) for i in range(3)]
+    for n in range(5):
+        models.record_tool_call(run_ids[1], "read_file", {"n": n}, {"content": "x" * 100}, True, f"t{n}", f"t{n}")
+
+    runs = models.list_runs(task_id, limit=2)
+    assert [run["iter"] for run in runs["items"]] == [0, 1]
+    assert [run["iter"] for run in models.list_runs(task_id, cursor=runs["next_cursor"])["items"]] == [2]
+    assert "summary" not in runs["items"][0]
+    narrow = models.list_runs(task_id, limit=2, fields=["result"])
+    assert narrow["items"][0] == {"id": run_ids[0], "result": "running"}
+    assert [run["id"] for run in models.list_runs(task_id, cursor=narrow["next_cursor"])["items"]] == [run_ids[2]]
+    with pytest.raises(ValueError):
+        models.list_runs(task_id, fields=["input_json"])
+
+    calls = models.list_tool_calls(run_ids[1], limit=4)
+    assert len(calls["items"]) == 4 and "output_json" not in calls["items"][0]
+    rest = models.list_tool_calls(run_ids[1], cursor=calls["next_cursor"], include=["output_json"])
+    assert rest["items"][0]["output_json"] == {"content": "x" * 100}
+    assert rest["next_cursor"] is None
+
+    grouped = models.tool_calls_for_runs(run_ids, include=["input_json"])
+    assert [call["input_json"] for call in grouped[run_ids[1]]] == [{"n": n} for n in range(5)]
+    assert grouped[run_ids[0]] == []
+
+
+@pytest.mark.parametrize(
+    "sql, index",
+    [
+        ("SELECT id FROM tasks WHERE status = 'queued' AND (created_at, id) < ('z', 'z') ORDER BY created_at DESC, id DESC LIMIT 50", "idx_tasks_status_created"),
+        ("SELECT id FROM tasks WHERE (created_at, id) < ('z', 'z') ORDER BY created_at DESC, id DESC LIMIT 50", "idx_tasks_created"),
+        ("SELECT id FROM runs WHERE task_id = 'x' ORDER BY iter, id", "idx_runs_task_iter"),
+        ("SELECT id FROM tool_calls WHERE run_id = 'x' ORDER BY started_at, id", "idx_tool_calls_run"),
+        ("SELECT id FROM artifacts WHERE task_id = 'x'", "idx_artifacts_task"),
+    ],
+)
+def test_history_queries_use_indexes(db, sql, index):
+    with get_connection() as conn:
+        plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql))
+    assert index in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,60 @@
+import os
+import subprocess
+
+from app.rag import indexer
+from app.rag.retriever import query_index
+
+
+def _embed_counter(monkeypatch):
+    calls = []
+    original = indexer.embed
+
+    def counting_embed(texts, hashes=None):
+        calls.append(len(texts))
+        return original(texts, hashes)
+
+    monkeypatch.setattr(indexer, "embed", counting_embed)
+    return calls
+
+
+def test_incremental_rebuild_only_embeds_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for name in ("a", "b", "c"):
+        (repo / f"{name}.py").write_text(f"def func_{name}():\n    return '{name}'\n", encoding="utf-8")
+    calls = _embed_counter(monkeypatch)
+
+    first = indexer.build_index(str(repo), ["*.py"], [])
+    assert (first.indexed_files, first.chunks, first.changed_files) == (3, 3, 3)
+    assert sum(calls) == 3
+
+    second = indexer.build_index(str(repo), ["*.py"], [])
+    assert (second.changed_files, second.removed_files) == (0, 0)
+    assert sum(calls) == 3
+
+    (repo / "b.py").write_text("def renamed_symbol():\n    return 'b'\n", encoding="utf-8")
+    (repo / "c.py").unlink()
+    (repo / "d.py").write_text("def func_d():\n    return 'd'\n", encoding="utf-8")
+    third = indexer.build_index(str(repo), ["*.py"], [])
+    assert (third.indexed_files, third.chunks, third.changed_files, third.removed_files) == (3, 3, 2, 1)
+    assert sum(calls) == 5
+
+    paths = {os.path.basename(hit["path"]) for hit in query_index("func_a renamed_symbol func_d", 10)}
+    assert paths == {"a.py", "b.py", "d.py"}
+
+
+def test_incremental_rebuild_uses_git_blob_ids(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "a.py").write_text("def a():\n    pass\n", encoding="utf-8")
+    subprocess.run(["git", "init"], cwd=repo, check=True, capture_output=True)
+    subprocess.run(["git", "add", "a.py"], cwd=repo, check=True, capture_output=True)
+    calls = _embed_counter(monkeypatch)
+
+    indexer.build_index(str(repo), ["*.py"], [])
+    os.utime(repo / "a.py", ns=(0, 0))
+    result = indexer.build_index(str(repo), ["*.py"], [])
+    assert result.changed_files == 0
+    assert sum(calls) == 1
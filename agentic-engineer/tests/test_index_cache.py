@@ -0,0 +1,45 @@
+from app.rag.index_cache import IndexCache
+from app.rag.vector_store import VectorEntry, VectorStore
+
+
+def _write(path: str, count: int) -> None:
+    entries = [VectorEntry(path=f"{i}.py", start_line=1, end_line=1, language="py", text="x", vector=[1.0, float(i)]) for i in range(count)]
+    VectorStore(path).upsert(entries)
+
+
+def test_index_cache_hits_and_reloads(tmp_path):
+    path = str(tmp_path / "index")
+    _write(path, 2)
+    cache = IndexCache()
+
+    first = cache.get(path)
+    assert cache.get(path) is first
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 1
+
+    _write(path, 3)
+    assert len(cache.get(path)) == 3
+    assert cache.stats()["reloads"] == 1
+
+    cache.invalidate()
+    cache.get(path)
+    assert cache.stats()["reloads"] == 2
+    assert cache.stats()["generation"] == 1
+
+
+def test_index_cache_evicts_least_recently_used(tmp_path):
+    paths = [str(tmp_path / name) for name in ("a", "b", "c")]
+    for path in paths:
+        _write(path, 4)
+    cache = IndexCache()
+    cache.budget_bytes = cache.get(paths[0]).nbytes * 2
+
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert sorted(stats["indexes"]) == [paths[0], paths[2]]
+
+    cache.invalidate(paths[2])
+    assert list(cache.stats()["indexes"]) == [paths[0]]
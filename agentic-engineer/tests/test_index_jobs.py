@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from app.rag.indexer import IndexBuildCancelled, _build_lock, build_index
+from app.rag.jobs import IndexJobManager
+from app.rag.namespaces import index_path
+from app.rag.retriever import query_index
+
+
+def _wait(manager, job_id, timeout=10.0, pending=("queued", "waiting", "running")):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job.status not in pending:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"index job is still {job.status}")
+
+
+def test_index_job_runs_in_background_and_publishes_progress(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "sample.py").write_text("def background_job():\n    return 1\n", encoding="utf-8")
+    events = []
+    manager = IndexJobManager()
+
+    job = manager.submit(str(repo), ["**/*.py"], [], publish=lambda topic, et, pl: events.append((topic, et, pl)))
+    finished = _wait(manager, job.id)
+
+    assert finished.status == "succeeded"
+    assert finished.result["chunks"] == 1
+    types = [event_type for _, event_type, _ in events]
+    assert types[0] == "index_job_started"
+    assert "index_progress" in types
+    assert types[-1] == "index_job_finished"
+    assert all(topic == job.id for topic, _, _ in events)
+    assert query_index("background_job", 1)
+
+
+def test_cancelled_build_keeps_previous_generation(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "old.py").write_text("def old_symbol():\n    pass\n", encoding="utf-8")
+    build_index(str(repo), ["*.py"], [])
+    (repo / "new.py").write_text("def new_symbol():\n    pass\n", encoding="utf-8")
+
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(IndexBuildCancelled):
+        build_index(str(repo), ["*.py"], [], cancel=cancel)
+
+    hits = query_index("new_symbol old_symbol", 5)
+    assert [hit["path"].rsplit("/", 1)[-1] for hit in hits] == ["old.py"]
+    assert sorted(p.name for p in (tmp_path / "agent_data" / "rag_index").iterdir()) == ["CURRENT", "gen-000001"]
+
+
+def test_index_job_waits_for_a_build_of_its_namespace(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "sample.py").write_text("def waiting_job():\n    return 1\n", encoding="utf-8")
+    events = []
+    manager = IndexJobManager()
+
+    with _build_lock(index_path()):
+        queued = manager.submit(str(repo), ["*.py"], [], publish=lambda topic, et, pl: events.append((topic, et)))
+        cancelled = manager.submit(str(repo), ["*.py"], [])
+        assert _wait(manager, queued.id, pending=("queued",)).status == "waiting"
+        assert _wait(manager, cancelled.id, pending=("queued",)).status == "waiting"
+        assert queued.started_at is None and not events
+        manager.cancel(cancelled.id)
+        assert _wait(manager, cancelled.id).status == "cancelled"
+
+    finished = _wait(manager, queued.id)
+    assert finished.status == "succeeded" and finished.started_at
+    assert [event_type for _, event_type in events][0] == "index_job_started"
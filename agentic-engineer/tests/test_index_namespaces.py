@@ -0,0 +1,88 @@
+import asyncio
+import os
+
+import pytest
+
+from app.api.index import query_index, rebuild_index
+from app.core.agent import build_context, exec_plan
+from app.core.schemas import IndexQuery, IndexRebuild, LLMPlan
+from app.rag.namespaces import index_path, list_namespaces, resolve_namespace, workspace_namespace
+from app.tools.rag_tools import rag_query, rag_rebuild
+
+
+def test_namespaces_keep_workspaces_apart(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    for name in ("alpha", "beta"):
+        repo = tmp_path / name
+        repo.mkdir()
+        (repo / f"{name}.py").write_text(f"def {name}_handler():\n    return '{name}'\n", encoding="utf-8")
+        rag_rebuild(str(repo), ["**/*.py"], [], namespace=name)
+
+    alpha_hits = rag_query("handler", 5, namespace="alpha")["hits"]
+    beta_hits = rag_query("handler", 5, namespace="beta")["hits"]
+    assert [hit["path"].rsplit("/", 1)[-1] for hit in alpha_hits] == ["alpha.py"]
+    assert [hit["path"].rsplit("/", 1)[-1] for hit in beta_hits] == ["beta.py"]
+    assert list_namespaces() == ["alpha", "beta"]
+    assert index_path("alpha") != index_path()
+
+
+def test_plain_rebuild_and_query_share_the_default_namespace(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "mod.py").write_text("def plain_handler():\n    return 1\n", encoding="utf-8")
+
+    rebuilt = rebuild_index(IndexRebuild(path=str(repo), include_glob=["*.py"], exclude_glob=[], background=False))
+    assert asyncio.run(rebuilt)["indexed_files"] == 1
+    hits = query_index(IndexQuery(query="plain_handler", top_k=1))["hits"]
+    assert [hit["path"] for hit in hits] == [str(repo / "mod.py")]
+    assert rag_query("plain_handler", 1)["hits"][0]["chunk_id"] == hits[0]["chunk_id"]
+    assert list_namespaces() == ["default"]
+
+
+def test_invalid_namespace_is_rejected():
+    assert resolve_namespace(None) == "default"
+    assert resolve_namespace("repo@3f2c1ab") == "repo@3f2c1ab"
+    with pytest.raises(ValueError):
+        resolve_namespace("../escape")
+
+
+def test_namespace_defaults_to_the_workspace(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    monkeypatch.delenv("RAG_PIN_COMMIT", raising=False)
+    repos = []
+    for parent in ("one", "two"):
+        repo = tmp_path / parent / "repo"
+        repo.mkdir(parents=True)
+        (repo / "mod.py").write_text(f"def {parent}_handler():\n    return '{parent}'\n", encoding="utf-8")
+        rag_rebuild(str(repo), ["**/*.py"], [], workspace=str(repo))
+        repos.append(str(repo))
+
+    # Same directory name, different paths: two indexes.
+    assert workspace_namespace(repos[0]) != workspace_namespace(repos[1])
+    assert workspace_namespace(repos[0]).startswith("repo-")
+    assert sorted(list_namespaces()) == sorted(workspace_namespace(repo) for repo in repos)
+    hits = rag_query("handler", 5, workspace=repos[1])["hits"]
+    assert [hit["path"] for hit in hits] == [os.path.join(repos[1], "mod.py")]
+
+
+def test_exec_plan_scopes_index_tools_to_the_workspace(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "mod.py").write_text("def scoped_handler():\n    return 1\n", encoding="utf-8")
+    plan = LLMPlan(
+        plan_summary="look up the handler",
+        risk_notes=[],
+        done_when="the handler is found",
+        steps=[
+            {"tool": "rag_rebuild", "args": {"root": str(repo), "include_glob": ["*.py"], "exclude_glob": []}, "why": "index"},
+            {"tool": "rag_query", "args": {"query": "scoped_handler", "top_k": 1}, "why": "find"},
+        ],
+    )
+    recorded = []
+    results = exec_plan(plan, "run", lambda name, args, *_: recorded.append(args), str(repo))
+
+    assert results[1]["output"]["hits"][0]["path"].endswith("mod.py")
+    assert recorded[1]["workspace"] == str(repo)
+    assert build_context({"id": "t"}, str(repo))["rag_namespace"] == workspace_namespace(str(repo))
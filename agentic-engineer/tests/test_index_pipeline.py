@@ -0,0 +1,56 @@
+import pytest
+
+from app.rag import indexer
+from app.rag.indexer import build_index
+from app.rag.pipeline import chunk_files
+
+
+def test_chunk_files_process_pool_matches_inline(tmp_path):
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"mod_{i}.py"
+        path.write_text("\n".join(f"value_{i}_{n} = {n}" for n in range(250)), encoding="utf-8")
+        paths.append(str(path))
+    (tmp_path / "blob.bin").write_bytes(b"\xff\xfe\x00")
+    paths.append(str(tmp_path / "blob.bin"))
+
+    inline = list(chunk_files(((path, None) for path in paths), workers=1))
+    pooled = list(chunk_files(((path, None) for path in paths), workers=2))
+    assert pooled == inline
+    assert [len(chunks) for _, chunks in inline] == [2] * 6 + [0]
+
+
+def test_build_index_reports_throughput(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for i in range(5):
+        (repo / f"m{i}.py").write_text(f"def f{i}():\n    return {i}\n", encoding="utf-8")
+
+    result = build_index(str(repo), ["*.py"], [], batch_size=2)
+    assert result.chunks == 5
+    assert result.files_per_sec > 0
+    assert result.chunks_per_sec > 0
+
+
+def test_embedding_errors_abort_the_build(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for i in range(6):
+        (repo / f"m{i}.py").write_text(f"def f{i}():\n    return {i}\n", encoding="utf-8")
+    build_index(str(repo), ["*.py"], [])
+    (repo / "m6.py").write_text("def f6():\n    return 6\n", encoding="utf-8")
+    calls = []
+
+    def failing_embed(texts, hashes):
+        calls.append(len(texts))
+        raise RuntimeError("embedder down")
+
+    monkeypatch.setattr(indexer, "embed", failing_embed)
+    with pytest.raises(RuntimeError, match="embedder down"):
+        build_index(str(repo), ["*.py"], [], incremental=False, batch_size=2)
+    assert calls == [2]
+    monkeypatch.undo()
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    assert build_index(str(repo), ["*.py"], []).changed_files == 1
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from app.rag.indexer import build_index
+from app.rag.index_cache import index_cache
+from app.rag.lexical import LexicalBuilder, LexicalIndex, reciprocal_rank_fusion, tokenize
+from app.rag.namespaces import index_path
+from app.rag.retriever import query_index
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("raise PlanParseError(parse_plan)") == [
+        "raise", "planparseerror", "plan", "parse", "error", "parse_plan", "parse", "plan",
+    ]
+
+
+def test_bm25_postings_roundtrip(tmp_path, monkeypatch):
+    texts = ["def load_config(): pass", "class ConfigError(Exception): pass", "config config config"]
+    builder = LexicalBuilder()
+    for row, text in enumerate(texts):
+        builder.add(row, text)
+    builder.save(str(tmp_path), 3)
+    reductions = []
+    monkeypatch.setattr(np.memmap, "mean", lambda self, *args, **kwargs: reductions.append(len(self)))
+    index = LexicalIndex.load(str(tmp_path))
+
+    docs, _ = index.postings("configerror")
+    assert docs.tolist() == [1]
+    ids, scores = index.search("ConfigError", 3)
+    assert ids[0] == 1
+    assert list(scores) == sorted(scores, reverse=True)
+
+    # Loading reads avgdl from lex.json and a lookup is a view into the
+    # mapped postings: neither touches the whole corpus.
+    docs, tfs = index.postings("load_config")
+    assert np.shares_memory(docs, index.docs) and np.shares_memory(tfs, index.tfs)
+    assert reductions == []
+    assert index.avgdl == pytest.approx(sum(len(tokenize(text)) for text in texts) / 3)
+
+
+def test_rrf_prefers_documents_ranked_by_both():
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 1]])[0][0] == 1
+
+
+def test_hybrid_query_finds_exact_identifier_after_incremental_rebuild(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for i in range(30):
+        (repo / f"mod_{i}.py").write_text(f"def helper_{i}(value):\n    return value + {i}\n", encoding="utf-8")
+    (repo / "errors.py").write_text("class WorkspaceLockedError(RuntimeError):\n    pass\n", encoding="utf-8")
+    build_index(str(repo), ["*.py"], [])
+
+    (repo / "mod_3.py").write_text("def rotate_credentials(value):\n    return value\n", encoding="utf-8")
+    (repo / "mod_4.py").unlink()
+    build_index(str(repo), ["*.py"], [])
+
+    assert query_index("WorkspaceLockedError", 1)[0]["path"].endswith("errors.py")
+    assert query_index("rotate_credentials", 1, mode="lexical")[0]["path"].endswith("mod_3.py")
+    assert query_index("helper_7", 1, mode="lexical")[0]["path"].endswith("mod_7.py")
+    assert not any(hit["path"].endswith("mod_4.py") for hit in query_index("helper_4", 40, mode="lexical"))
+    lexical = index_cache.get(index_path()).lexical
+    assert lexical.count == 30
@@ -0,0 +1,73 @@
+import pytest
+
+from app.rag.indexer import build_index
+from app.rag.retriever import ranking_cache, snippet_window
+from app.tools.rag_tools import rag_fetch, rag_query
+
+
+def test_snippet_window_centres_on_matching_lines():
+    text = "\n".join(f"line {i}" for i in range(40)) + "\nneedle_here = 1\n" + "\n".join(f"tail {i}" for i in range(20))
+    window = snippet_window(text, 100, "needle_here", 5)
+    assert "needle_here = 1" in window["snippet"]
+    assert window["snippet_end_line"] - window["snippet_start_line"] == 4
+    assert window["snippet_start_line"] <= 140 <= window["snippet_end_line"]
+    assert window["truncated"]
+
+    head = snippet_window("a\nb\nc", 1, "missing", 5)
+    assert (head["snippet"], head["truncated"]) == ("a\nb\nc", False)
+
+
+def test_query_pages_and_fetch(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for i in range(5):
+        body = "\n".join(f"    value_{j} = {j}" for j in range(60))
+        (repo / f"mod_{i}.py").write_text(f"def shared_name_{i}():\n{body}\n    return shared\n", encoding="utf-8")
+    build_index(str(repo), ["*.py"], [])
+
+    first = rag_query("shared", 2, mode="lexical", snippet_lines=6)
+    assert len(first["hits"]) == 2 and first["next_cursor"]
+    assert all(hit["snippet"].count("\n") <= 5 for hit in first["hits"])
+    second = rag_query("shared", 2, mode="lexical", cursor=first["next_cursor"])
+    third = rag_query("shared", 2, mode="lexical", cursor=second["next_cursor"])
+    assert third["next_cursor"] is None
+    paths = [hit["path"] for page in (first, second, third) for hit in page["hits"]]
+    assert len(paths) == len(set(paths)) == 5
+
+    hit = first["hits"][0]
+    full = rag_fetch(hit["chunk_id"])
+    assert full["text"].count("\n") == hit["end_line"] - hit["start_line"]
+    assert hit["snippet"] != full["text"]
+
+    (repo / "mod_0.py").write_text("def replaced():\n    pass\n", encoding="utf-8")
+    build_index(str(repo), ["*.py"], [])
+    with pytest.raises(ValueError):
+        rag_query("shared", 2, cursor=first["next_cursor"])
+    with pytest.raises(LookupError):
+        rag_fetch(hit["chunk_id"])
+
+
+def test_cursors_continue_only_their_own_query(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for i in range(30):
+        (repo / f"mod_{i}.py").write_text(f"def shared_{i}():\n    return shared + {'extra ' * (i % 4)}{i}\n", encoding="utf-8")
+    build_index(str(repo), ["*.py"], [])
+
+    pages = [rag_query("shared extra", 4)]
+    while pages[-1]["next_cursor"]:
+        pages.append(rag_query("shared extra", 4, cursor=pages[-1]["next_cursor"]))
+    chunk_ids = [hit["chunk_id"] for page in pages for hit in page["hits"]]
+    assert len(chunk_ids) == len(set(chunk_ids)) == 30
+    assert chunk_ids[:4] == [hit["chunk_id"] for hit in rag_query("shared extra", 4)["hits"]]
+
+    cursor = pages[0]["next_cursor"]
+    with pytest.raises(ValueError, match="different query"):
+        rag_query("other", 4, cursor=cursor)
+    with pytest.raises(ValueError, match="different query"):
+        rag_query("shared extra", 4, mode="lexical", cursor=cursor)
+    ranking_cache.clear()
+    with pytest.raises(ValueError, match="expired"):
+        rag_query("shared extra", 4, cursor=cursor)
@@ -1,3 +1,7 @@
+import os
+import threading
+import time
+
 from app.tools.cmd_tools import run_cmd
 
 
@@ -5,3 +9,66 @@ def test_run_cmd_echo(tmp_path):
     result = run_cmd("echo hello", cwd=str(tmp_path), timeout_sec=5)
     assert result["exit_code"] == 0
     assert "hello" in result["stdout"]
+
+
+def test_run_cmd_streams_output_and_keeps_only_a_tail(tmp_path, monkeypatch):
+    monkeypatch.setenv("RUN_CMD_TAIL_KB", "1")
+    monkeypatch.setenv("CMD_OUTPUT_INTERVAL_MS", "20")
+    chunks = []
+    log_path = tmp_path / "verify.log"
+    script = "import sys, time\nfor i in range(1, 2001): print('line', i)\nsys.stdout.flush()\nprint('oops', file=sys.stderr, flush=True)\ntime.sleep(0.1)\nprint('done')"
+    cmd = f"python -c \"{script}\""
+    result = run_cmd(cmd, cwd=str(tmp_path), timeout_sec=10, on_output=lambda stream, text: chunks.append((stream, text)), log_path=str(log_path))
+
+    assert result["exit_code"] == 0
+    assert result["truncated"] and len(result["stdout"]) <= 1024
+    assert result["stdout"].endswith("line 2000\ndone\n")
+    assert result["stderr"] == "oops\n"
+    assert result["output_bytes"] == log_path.stat().st_size
+    assert log_path.read_text().startswith("line 1\nline 2\n")
+    assert "".join(text for stream, text in chunks if stream == "stderr") == "oops\n"
+    streamed = "".join(text for stream, text in chunks if stream == "stdout")
+    assert streamed.startswith("line 1\nline 2\n") and streamed.endswith("done\n")
+
+
+def test_run_cmd_timeout_returns_text(tmp_path):
+    result = run_cmd("echo started; sleep 5", cwd=str(tmp_path), timeout_sec=1)
+    assert result["exit_code"] == 124
+    assert result["timed_out"]
+    assert result["stdout"] == "started\n"
+    assert result["stderr"] == "timeout"
+
+
+def _alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as handle:
+            return handle.read().split(")")[-1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_run_cmd_kills_the_whole_process_group(tmp_path):
+    spawn = "import subprocess; p = subprocess.Popen(['sleep', '30']); print(p.pid, flush=True); p.wait()"
+    result = run_cmd(f'python -c "{spawn}"', cwd=str(tmp_path), timeout_sec=1)
+    assert result["timed_out"] and result["duration_ms"] < 5000
+    grandchild = int(result["stdout"])
+    time.sleep(0.2)
+    assert not _alive(grandchild)
+
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    result = run_cmd(f'python -c "{spawn}"', cwd=str(tmp_path), timeout_sec=30, cancel=cancel)
+    assert result["exit_code"] == 130 and result["cancelled"]
+
+
+def test_run_cmd_applies_limits_and_reports_usage(tmp_path, monkeypatch):
+    script = "import os; [os.open(os.devnull, os.O_RDONLY) for _ in range(64)]"
+    result = run_cmd(f'python -c "{script}"', cwd=str(tmp_path), timeout_sec=10, limits={"nofile": 32})
+    assert result["exit_code"] != 0 and "Too many open files" in result["stderr"]
+
+    monkeypatch.setenv("RUN_CMD_NOFILE", "32")
+    assert run_cmd(f'python -c "{script}"', cwd=str(tmp_path), timeout_sec=10)["exit_code"] != 0
+    result = run_cmd(f'python -c "{script}"', cwd=str(tmp_path), timeout_sec=10, limits={"nofile": 0})
+    assert result["exit_code"] == 0
+    assert result["peak_rss_kb"] > 1000
+    assert result["cpu_user_ms"] + result["cpu_sys_ms"] > 0
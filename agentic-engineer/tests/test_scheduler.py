@@ -0,0 +1,160 @@
+import threading
+import time
+
+from app.core.scheduler import TaskScheduler
+from app.storage import models
+from app.storage.db import init_db
+
+
+def _create(workspace: str, priority: int = 0, submitter: str = "anonymous") -> str:
+    return models.create_task(
+        instruction="x",
+        dod_command="true",
+        workspace_path=workspace,
+        max_iters=1,
+        timeout_sec=10,
+        priority=priority,
+        submitter=submitter,
+    )
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_scheduler_orders_by_priority_then_fair_share(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    init_db()
+    order = []
+
+    def runner(task_id, emit):
+        order.append(task_id)
+        models.update_task_status(task_id, "succeeded")
+
+    low = _create("/ws/a", priority=0, submitter="alice")
+    alice = [_create(f"/ws/alice{i}", priority=5, submitter="alice") for i in range(2)]
+    bob = _create("/ws/bob", priority=5, submitter="bob")
+    scheduler = TaskScheduler(workers=1, runner=runner)
+    scheduler.start()
+    _wait_for(lambda: len(order) == 4)
+    scheduler.stop()
+
+    assert order[-1] == low
+    assert set(order[:3]) == {*alice, bob}
+    assert all(models.get_task(task_id)["finished_at"] for task_id in order)
+
+
+def test_scheduler_serializes_tasks_per_workspace(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    init_db()
+    lock = threading.Lock()
+    active = {}
+    overlaps = []
+
+    def runner(task_id, emit):
+        workspace = models.get_task(task_id)["workspace_path"]
+        with lock:
+            if active.get(workspace):
+                overlaps.append(workspace)
+            active[workspace] = True
+        time.sleep(0.05)
+        with lock:
+            active[workspace] = False
+        models.update_task_status(task_id, "succeeded")
+
+    ids = [_create("/ws/shared") for _ in range(3)] + [_create("/ws/other/") for _ in range(2)]
+    scheduler = TaskScheduler(workers=4, runner=runner)
+    scheduler.start()
+    _wait_for(lambda: all(models.get_task(task_id)["status"] == "succeeded" for task_id in ids))
+    scheduler.stop()
+    assert overlaps == []
+
+
+def test_scheduler_recovers_orphans_and_marks_crashes(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    init_db()
+    orphan = _create("/ws/a")
+    live = _create("/ws/b")
+    # Both were claimed by schedulers in other processes; only "alive" keeps beating.
+    assert models.claim_task(orphan, "dead")
+    assert models.claim_task(live, "alive")
+    beating = threading.Event()
+
+    def beat():
+        while not beating.wait(0.05):
+            models.heartbeat_tasks([live], "alive")
+
+    beater = threading.Thread(target=beat)
+    beater.start()
+
+    def runner(task_id, emit):
+        raise RuntimeError("boom")
+
+    events = []
+    emitter = lambda task_id: lambda event_type, payload: events.append((event_type, payload))  # noqa: E731
+    scheduler = TaskScheduler(workers=1, runner=runner, emitter=emitter, heartbeat_sec=0.05, stale_sec=0.3)
+    try:
+        assert scheduler.start() == []
+        _wait_for(lambda: models.get_task(orphan)["status"] == "failed")
+    finally:
+        scheduler.stop()
+        beating.set()
+        beater.join()
+    assert models.get_task(orphan)["attempts"] == 2
+    # Its wait is measured from the re-queue, not from its creation.
+    assert models.get_task(orphan)["queued_at"] > models.get_task(orphan)["created_at"]
+    assert models.get_task(orphan)["owner"] == scheduler.owner
+    assert events == [("task_finished", {"task_id": orphan, "status": "failed", "error": "boom"})]
+    assert models.get_task(live)["status"] == "running" and models.get_task(live)["owner"] == "alive"
+
+
+def test_running_tasks_are_heartbeated(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    init_db()
+    task_id = _create("/ws/a")
+    release = threading.Event()
+    scheduler = TaskScheduler(workers=1, runner=lambda task_id, emit: release.wait(5), heartbeat_sec=0.05, stale_sec=0.3)
+    scheduler.start()
+    try:
+        _wait_for(lambda: models.get_task(task_id)["status"] == "running")
+        first = models.get_task(task_id)["heartbeat_at"]
+        _wait_for(lambda: models.get_task(task_id)["heartbeat_at"] > first)
+        time.sleep(0.5)
+        # Still its own: a fresh heartbeat keeps it from being recovered.
+        assert models.get_task(task_id)["attempts"] == 1
+    finally:
+        release.set()
+        scheduler.stop()
+    assert models.get_task(task_id)["status"] == "failed"
+
+
+def test_schedulers_in_separate_processes_share_workspaces_safely(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    init_db()
+    lock = threading.Lock()
+    active = []
+    overlaps = []
+
+    def runner(task_id, emit):
+        with lock:
+            if active:
+                overlaps.append(task_id)
+            active.append(task_id)
+        time.sleep(0.05)
+        with lock:
+            active.remove(task_id)
+        models.update_task_status(task_id, "succeeded")
+
+    ids = [_create("/ws/shared" + "/" * (n % 2)) for n in range(6)]
+    # Two schedulers stand in for two processes: neither sees the other's busy workspaces.
+    schedulers = [TaskScheduler(workers=2, runner=runner) for _ in range(2)]
+    for scheduler in schedulers:
+        scheduler.start()
+    _wait_for(lambda: all(models.get_task(task_id)["status"] == "succeeded" for task_id in ids))
+    for scheduler in schedulers:
+        scheduler.stop()
+    assert overlaps == []
+    assert not models.claim_task(_create("/ws/other"), "a") or not models.claim_task(_create("/ws/other/"), "b")
@@ -0,0 +1,120 @@
+import subprocess
+
+from app.core.orchestrator import run_task
+from app.core.schemas import LLMPlan, ToolStep
+from app.storage import models
+from app.storage.db import init_db
+
+FIXES = ["def add(a, b):\n    return a * b\n", "def add(a, b):\n    return a + b\n", "def add(a, b):\n    return b - a\n"]
+
+
+def test_speculative_candidates_promote_the_passing_plan(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    monkeypatch.setenv("WORKSPACE_ROOT", str(tmp_path / "repo"))
+    monkeypatch.setenv("SPECULATIVE_WORKERS", "3")
+    workspace = tmp_path / "repo" / "project"
+    workspace.mkdir(parents=True)
+    (workspace / "calc.py").write_text("def add(a, b):\n    return a - b\n")
+    (workspace / "test_calc.py").write_text("from calc import add\n\ndef test_add():\n    assert add(1, 2) == 3\n")
+    subprocess.run(["git", "init", "-q"], cwd=workspace.parent, check=True)
+    (workspace / "notes.txt").write_text("uncommitted\n")
+    seen = []
+
+    def planner(context, evidence):
+        seen.append((context["candidate"], context["workspace"]))
+        step = ToolStep(
+            tool="write_file",
+            args={"path": f"{context['workspace']}/calc.py", "content": FIXES[context["candidate"]]},
+            why="fix add",
+        )
+        return LLMPlan(plan_summary="fix", steps=[step], risk_notes=[], done_when="tests pass")
+
+    init_db()
+    task_id = models.create_task("fix add", "python -m pytest -q", str(workspace), 2, 60, speculative=3)
+    events = []
+    run_task(task_id, emit=lambda event_type, payload: events.append((event_type, payload)), planner=planner)
+
+    assert models.get_task(task_id)["status"] == "succeeded"
+    assert sorted(candidate for candidate, _ in seen) == [0, 1, 2]
+    assert all(path.startswith(str(tmp_path / "agent_data")) and path.endswith("/project") for _, path in seen)
+    promoted = next(payload for event_type, payload in events if event_type == "candidate_promoted")
+    assert promoted["candidate"] == 1 and promoted["passed"] and promoted["applied"]
+    assert (workspace / "calc.py").read_text() == FIXES[1]
+    assert (workspace / "notes.txt").read_text() == "uncommitted\n"
+    assert [event_type for event_type, _ in events].count("verify_cached") == 1
+    worktrees = subprocess.run(["git", "worktree", "list"], cwd=workspace, capture_output=True, text=True).stdout
+    assert len(worktrees.splitlines()) == 1
+
+
+def test_candidate_tools_are_confined_to_their_worktree(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    monkeypatch.setenv("WORKSPACE_ROOT", str(tmp_path))
+    workspace = tmp_path / "repo"
+    workspace.mkdir()
+    (workspace / "calc.py").write_text("def add(a, b):\n    return a - b\n")
+    (workspace / "test_calc.py").write_text("from calc import add\n\ndef test_add():\n    assert add(1, 2) == 3\n")
+    subprocess.run(["git", "init", "-q"], cwd=workspace, check=True)
+    escapes = [
+        {"tool": "write_file", "args": {"path": str(tmp_path / "shared" / "calc.py"), "content": FIXES[1]}},
+        {"tool": "write_file", "args": {"path": "{root}/../../../../../repo/calc.py", "content": FIXES[1]}},
+        {"tool": "rag_rebuild", "args": {"root": "{root}", "include_glob": ["*.py"], "exclude_glob": []}},
+        {"tool": "run_cmd", "args": {"cmd": "python -c \"open('calc.py', 'a').close()\"", "cwd": str(tmp_path), "timeout_sec": 10}},
+    ]
+
+    def planner(context, evidence):
+        steps = [
+            ToolStep(
+                tool=step["tool"],
+                args={
+                    name: value.format(root=context["workspace"]) if isinstance(value, str) else value
+                    for name, value in step["args"].items()
+                },
+                why="escape",
+            )
+            for step in escapes
+        ]
+        return LLMPlan(plan_summary="escape", steps=steps, risk_notes=[], done_when="never")
+
+    init_db()
+    task_id = models.create_task("fix add", "python -m pytest -q", str(workspace), 1, 60, speculative=2)
+    run_task(task_id, planner=planner)
+
+    assert (workspace / "calc.py").read_text() == "def add(a, b):\n    return a - b\n"
+    assert not (tmp_path / "shared").exists() and not (tmp_path / "calc.py").exists()
+    run_id = models.list_runs(task_id)["items"][0]["id"]
+    calls = models.list_tool_calls(run_id, include=["input_json", "output_json"])["items"]
+    assert sorted(call["candidate"] for call in calls) == [0, 0, 0, 0, 1, 1, 1, 1]
+    assert [call["ok"] for call in calls if call["tool_name"] != "run_cmd"] == [False] * 6
+    commands = [call for call in calls if call["tool_name"] == "run_cmd"]
+    assert all(call["ok"] and call["input_json"]["cwd"].startswith(str(tmp_path / "agent_data")) for call in commands)
+
+
+def test_candidates_share_ignored_paths_and_stop_planning_after_a_win(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    monkeypatch.setenv("WORKSPACE_ROOT", str(tmp_path))
+    monkeypatch.setenv("SPECULATIVE_WORKERS", "1")
+    workspace = tmp_path / "repo"
+    (workspace / "vendor").mkdir(parents=True)
+    (workspace / ".gitignore").write_text("vendor/\n")
+    (workspace / "vendor" / "expected.py").write_text("VALUE = 3\n")
+    (workspace / "calc.py").write_text("def add(a, b):\n    return a - b\n")
+    (workspace / "test_calc.py").write_text(
+        "import sys\nsys.path.insert(0, 'vendor')\nfrom calc import add\nfrom expected import VALUE\n\n"
+        "def test_add():\n    assert add(1, 2) == VALUE\n"
+    )
+    subprocess.run(["git", "init", "-q"], cwd=workspace, check=True)
+    planned = []
+
+    def planner(context, evidence):
+        planned.append(context["candidate"])
+        step = ToolStep(tool="write_file", args={"path": f"{context['workspace']}/calc.py", "content": FIXES[1]}, why="fix add")
+        return LLMPlan(plan_summary="fix", steps=[step], risk_notes=[], done_when="tests pass")
+
+    init_db()
+    task_id = models.create_task("fix add", "python -m pytest -q", str(workspace), 2, 60, speculative=3)
+    run_task(task_id, planner=planner)
+
+    assert models.get_task(task_id)["status"] == "succeeded"
+    assert planned == [0]
+    assert (workspace / "calc.py").read_text() == FIXES[1]
+    assert (workspace / "vendor").is_dir() and not (workspace / "vendor").is_symlink()
@@ -0,0 +1,107 @@
+import json
+import threading
+
+import pytest
+
+from app.storage import blobs, db, models
+from app.storage.db import WriteBehind, WriteBehindTimeout, get_connection, init_db, write_behind
+
+
+def test_connections_are_pooled_per_thread_in_wal_mode(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    init_db()
+    with get_connection() as first, get_connection() as second:
+        assert first is second
+        assert first.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    other = []
+    thread = threading.Thread(target=lambda: other.append(get_connection().__enter__()))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+
+
+def test_tool_calls_and_artifacts_are_group_committed(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    init_db()
+    task_id = models.create_task("x", "true", "/ws", 1, 10)
+    run_id = models.create_run(task_id, 0)
+    for i in range(50):
+        models.record_tool_call(run_id, "read_file", {"i": i}, {"ok": True}, True, "a", "b")
+    models.record_artifact(task_id, "log", "/tmp/verify.log")
+
+    assert [artifact["path"] for artifact in models.list_artifacts(task_id)] == ["/tmp/verify.log"]
+    assert write_behind().flush(timeout=5)
+    with get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM tool_calls WHERE run_id = ?", (run_id,)).fetchone()[0] == 50
+
+
+def test_large_tool_payloads_are_stored_once_out_of_line(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    init_db()
+    task_id = models.create_task("x", "true", "/ws", 1, 10)
+    run_id = models.create_run(task_id, 0)
+    content = "def f():\n    return 1\n" * 2000
+    for _ in range(3):
+        models.record_tool_call(run_id, "read_file", {"path": "a.py"}, {"content": content}, True, "a", "b")
+
+    assert write_behind().flush(timeout=5)
+    with get_connection() as conn:
+        stored = [row[0] for row in conn.execute("SELECT output_json FROM tool_calls WHERE run_id = ?", (run_id,))]
+        assert conn.execute("SELECT input_json FROM tool_calls LIMIT 1").fetchone()[0] == '{"path": "a.py"}'
+    reference = blobs.reference_of(stored[0])
+    assert reference["size"] > 40000 and reference["preview"].startswith('{"content": "def f()')
+    assert len(stored[0]) < 400 and len(set(stored)) == 1
+    files = list((tmp_path / "agent_data" / "blobs").rglob("*.*"))
+    assert len(files) == 1 and files[0].stat().st_size < 2000
+
+    calls = models.list_tool_calls(run_id, include=["output_json"])["items"]
+    assert calls[0]["output_json"] == {"content": content}
+
+
+def test_blob_references_cannot_be_forged_and_summaries_are_packed(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    init_db()
+    task_id = models.create_task("x", "true", "/ws", 1, 10)
+    run_id = models.create_run(task_id, 0)
+    lookalike = {"$blob": "0" * 64, "size": 1, "preview": ""}
+    models.record_tool_call(run_id, "read_file", lookalike, {}, True, "a", "b")
+    summary = json.dumps({"plan": {"steps": ["x" * 100] * 100}, "results": []})
+    models.finish_run(run_id, "fail", summary)
+
+    calls = models.list_tool_calls(run_id, include=["input_json"])["items"]
+    assert calls[0]["input_json"] == lookalike
+    with get_connection() as conn:
+        stored = conn.execute("SELECT summary FROM runs WHERE id = ?", (run_id,)).fetchone()[0]
+    assert blobs.reference_of(stored)["size"] == len(summary) and len(stored) < 400
+    assert models.list_runs(task_id, fields=["summary"])["items"][0]["summary"] == summary
+
+
+def test_write_behind_survives_failures(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "WRITE_RETRY_SEC", 0)
+    # The database can't be opened: the batch is dropped, the flush still returns.
+    writer = WriteBehind(str(tmp_path / "missing" / "agent.db"))
+    writer.submit("INSERT INTO t VALUES (?)", (1,))
+    assert writer.flush(timeout=5)
+
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    init_db()
+    task_id = models.create_task("x", "true", "/ws", 1, 10)
+    writer = write_behind()
+    write = WriteBehind._write
+    failures = iter([RuntimeError("boom")])
+
+    def flaky_write(self, conn, rows):
+        failure = next(failures, None)
+        if failure:
+            raise failure
+        write(self, conn, rows)
+
+    monkeypatch.setattr(WriteBehind, "_write", flaky_write)
+    models.record_artifact(task_id, "log", "/tmp/lost.log")
+    assert writer.flush(timeout=5)
+    models.record_artifact(task_id, "log", "/tmp/kept.log")
+    assert [artifact["path"] for artifact in models.list_artifacts(task_id)] == ["/tmp/kept.log"]
+
+    monkeypatch.setattr(writer, "flush", lambda timeout=None: False)
+    with pytest.raises(WriteBehindTimeout):
+        models.list_artifacts(task_id)
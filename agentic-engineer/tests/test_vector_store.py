@@ -0,0 +1,76 @@
+from app.rag.vector_store import VectorEntry, VectorStore
+
+
+def _entry(path: str, vector):
+    return VectorEntry(path=path, start_line=1, end_line=2, language="py", text=f"text of {path}", vector=vector)
+
+
+def test_vector_store_roundtrip(tmp_path):
+    index_dir = str(tmp_path / "index")
+    store = VectorStore(index_dir)
+    store.upsert([_entry("a.py", [1.0, 0.0, 0.0]), _entry("b.py", [0.0, 1.0, 0.0]), _entry("c.py", [0.6, 0.8, 0.0])])
+
+    reopened = VectorStore(index_dir)
+    reopened.load()
+    assert len(reopened) == 3
+    assert reopened.entry(1).text == "text of b.py"
+
+    hits = reopened.query([0.0, 1.0, 0.0], 2)
+    assert [entry.path for _, entry in hits] == ["b.py", "c.py"]
+    assert abs(hits[0][0] - 1.0) < 1e-6
+
+
+def test_vector_store_empty(tmp_path):
+    store = VectorStore(str(tmp_path / "missing"))
+    store.load()
+    assert store.query([1.0], 3) == []
+    store.upsert([])
+    assert len(store) == 0
+
+
+def test_vector_store_query_batch(tmp_path):
+    store = VectorStore(str(tmp_path / "index"))
+    store.upsert([_entry(f"{i}.py", [float(i), 1.0]) for i in range(10)])
+
+    results = store.query_batch([[1.0, 0.0], [0.0, 1.0]], 3)
+    assert [entry.path for _, entry in results[0]] == ["9.py", "8.py", "7.py"]
+    assert [entry.path for _, entry in results[1]] == ["0.py", "1.py", "2.py"]
+    assert results[0][0][0] >= results[0][1][0] >= results[0][2][0]
+    assert len(store.query([1.0, 1.0], 50)) == 10
+
+
+def test_vector_store_columnar_layout(tmp_path):
+    index_dir = tmp_path / "index"
+    store = VectorStore(str(index_dir))
+    entries = [_entry("a.py", [1.0, 0.0]), _entry("a.py", [0.0, 1.0]), _entry("b.md", [1.0, 1.0])]
+    entries[0].symbols = ["Foo", "Foo.bar"]
+    entries[2].language = "md"
+    store.upsert(entries)
+
+    generation = index_dir / "gen-000001"
+    assert not hasattr(store.entry(0), "__dict__")
+    assert store.paths == ["a.py", "b.md"]
+    assert store.entry(0).symbols == ["Foo", "Foo.bar"]
+    assert store.entry(1).symbols == []
+    assert store.entry(2).language == "md"
+    column_files = ["vectors.f32", "lines.i32", "path_ids.i32", "text.dat", "text.idx", "symbols.dat", "symbols.idx"]
+    on_disk = sum((generation / name).stat().st_size for name in column_files)
+    assert abs(store.nbytes - on_disk) <= sum(len(path) for path in store.paths)
+
+
+def test_copy_rows_reinterns_paths(tmp_path):
+    from app.rag.vector_store import IndexWriter
+
+    index_dir = str(tmp_path / "index")
+    store = VectorStore(index_dir)
+    store.upsert([_entry("a.py", [1.0, 0.0]), _entry("b.py", [0.0, 1.0]), _entry("b.py", [1.0, 1.0])])
+
+    writer = IndexWriter(index_dir, 2)
+    writer.add(_entry("c.py", [1.0, 0.0]))
+    writer.copy_rows(store, 1, 3)
+    writer.commit()
+    store.load()
+
+    assert store.paths == ["c.py", "b.py"]
+    assert [store.entry(i).path for i in range(3)] == ["c.py", "b.py", "b.py"]
+    assert store.entry(2).text == "text of b.py"
@@ -0,0 +1,95 @@
+import subprocess
+
+from app.core.orchestrator import run_task
+from app.core.schemas import LLMPlan
+from app.core.verify_cache import VerifyCache, tree_hash
+from app.storage import models
+from app.storage.db import init_db
+from app.telemetry.metrics import metrics
+from app.tools import git_tools
+
+
+def _git_repo(path):
+    path.mkdir()
+    (path / "a.py").write_text("x = 1\n")
+    subprocess.run(["git", "init", "-q"], cwd=path, check=True)
+    subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "--allow-empty", "-m", "init"], cwd=path, check=True)
+
+
+def test_tree_hash_tracks_content_but_not_test_caches(tmp_path):
+    repo = tmp_path / "repo"
+    _git_repo(repo)
+    before = tree_hash(str(repo))
+    assert before.startswith("git:")
+    (repo / "__pycache__").mkdir()
+    (repo / "__pycache__" / "a.cpython-311.pyc").write_bytes(b"\0")
+    assert tree_hash(str(repo)) == before
+    (repo / "a.py").write_text("x = 2\n")
+    assert tree_hash(str(repo)) != before
+    assert subprocess.run(["git", "status", "--porcelain"], cwd=repo, capture_output=True, text=True).stdout.startswith("?? ")
+
+    (repo / ".gitignore").write_text(".env\n")
+    (repo / ".env").write_text("MODE=a\n")
+    ignored = tree_hash(str(repo))
+    (repo / ".env").write_text("MODE=bb\n")
+    assert tree_hash(str(repo)) != ignored
+    objects = sorted(p for p in (repo / ".git" / "objects").rglob("*") if p.is_file())
+    (repo / "b.py").write_text("y = 1\n")
+    tree_hash(str(repo))
+    assert sorted(p for p in (repo / ".git" / "objects").rglob("*") if p.is_file()) == objects
+
+    plain = tmp_path / "plain"
+    plain.mkdir()
+    (plain / "a.py").write_text("x = 1\n")
+    assert tree_hash(str(plain)).startswith("stat:")
+
+
+def test_cache_skips_timeouts_and_evicts_oldest(tmp_path):
+    cache = VerifyCache(max_entries=2)
+    keys = [cache.key(str(tmp_path), f"cmd {n}") for n in range(3)]
+    cache.put(keys[0], {"exit_code": 124, "timed_out": True})
+    assert cache.get(keys[0]) is None
+    for key in keys:
+        cache.put(key, {"exit_code": 1, "log_path": "/tmp/verify.log"})
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == {"exit_code": 1, "cached": True}
+    assert cache.key(str(tmp_path), "cmd 0", {"A": "1"}) != keys[0]
+
+
+def test_run_task_reuses_result_while_workspace_is_unchanged(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "agent_data"))
+    workspace = tmp_path / "workspace"
+    _git_repo(workspace)
+    (workspace / "test_a.py").write_text("from a import x\n\ndef test_x():\n    assert x == 2\n")
+    init_db()
+    task_id = models.create_task("fix", "python -m pytest -q", str(workspace), 3, 60)
+    events = []
+    hits = metrics.snapshot()["counters"].get("verify.cache_hits", 0)
+
+    def planner(context, evidence):
+        return LLMPlan(plan_summary="nothing to do", steps=[], risk_notes=[], done_when="tests pass")
+
+    run_task(task_id, emit=lambda event_type, payload: events.append(event_type), planner=planner)
+
+    assert models.get_task(task_id)["status"] == "failed"
+    assert events.count("verify_cached") == 2
+    assert metrics.snapshot()["counters"]["verify.cache_hits"] - hits == 2
+
+
+def test_tree_hash_stats_ignored_directories_within_a_budget(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    _git_repo(repo)
+    (repo / ".gitignore").write_text(".venv/\n")
+    site = repo / ".venv" / "lib" / "site-packages"
+    site.mkdir(parents=True)
+    for n in range(200):
+        (site / f"mod_{n}.py").write_text("x = 1\n")
+    monkeypatch.setattr(git_tools, "IGNORED_DIR_ENTRIES", 50)
+    statted = []
+    lstat = git_tools.os.lstat
+    monkeypatch.setattr(git_tools.os, "lstat", lambda path: statted.append(path) or lstat(path))
+
+    before = tree_hash(str(repo))
+    assert len([path for path in statted if ".venv" in str(path)]) == 50
+    (site / "new_package").mkdir()
+    assert tree_hash(str(repo)) != before
@@ -0,0 +1,53 @@
+import os
+
+from app.tools.walker import GlobMatcher, walk_files
+
+
+def _touch(root, rel, content="x"):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+
+
+def test_glob_matcher_double_star_matches_top_level():
+    matcher = GlobMatcher(["**/*.py"])
+    assert matcher.match("sample.py")
+    assert matcher.match("pkg/sub/sample.py")
+    assert not matcher.match("sample.pyc")
+    assert GlobMatcher(["**/.git/**"]).covers_dir(".git")
+    assert not GlobMatcher(["docs/*.md"]).covers_dir("docs")
+
+
+def test_walk_files_prunes_and_honors_gitignore(tmp_path, monkeypatch):
+    _touch(tmp_path, "main.py")
+    _touch(tmp_path, "pkg/mod.py", "abcd")
+    _touch(tmp_path, "pkg/generated.py")
+    _touch(tmp_path, "pkg/.gitignore", "generated.py\n")
+    _touch(tmp_path, "build/out.py")
+    _touch(tmp_path, "logs/keep.log")
+    _touch(tmp_path, "logs/drop.log")
+    _touch(tmp_path, ".gitignore", "build/\n*.log\n!keep.log\n")
+    _touch(tmp_path, "node_modules/lib/index.py")
+    _touch(tmp_path, ".git/config.py")
+
+    scanned = []
+    real_scandir = os.scandir
+
+    def tracking_scandir(path):
+        scanned.append(os.path.relpath(path, tmp_path))
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", tracking_scandir)
+    entries = list(walk_files(str(tmp_path), ["**/*.py", "**/*.log"], ["**/node_modules/**"]))
+
+    assert [entry.rel_path for entry in entries] == ["main.py", "logs/keep.log", "pkg/mod.py"]
+    assert entries[-1].size == 4
+    assert not any(path.startswith(("node_modules", "build", ".git")) for path in scanned)
+
+
+def test_walk_files_max_depth(tmp_path):
+    _touch(tmp_path, "a.txt")
+    _touch(tmp_path, "one/b.txt")
+    _touch(tmp_path, "one/two/c.txt")
+    assert [entry.rel_path for entry in walk_files(str(tmp_path), max_depth=0)] == ["a.txt"]
+    assert [entry.rel_path for entry in walk_files(str(tmp_path), max_depth=1)] == ["a.txt", "one/b.txt"]